@@ -0,0 +1,83 @@
+"""
+Csúcs memória (peak RSS) mérése nagy API válaszok feldolgozásánál:
+teljes resp.json() vs. darabonkénti (streaming) feldolgozás.
+
+Futtatás a repó gyökeréből:
+    python -m benchmarks.bench_json_stream --rows 200000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import iter_json_array, CHUNK_SIZE
+
+def write_payload(path, rows):
+    """
+    TM /players/{id}/stats-szerű szintetikus válasz kiírása fájlba.
+    """
+    with open(path, 'w') as f:
+        f.write('{"id": "1", "stats": [')
+        for i in range(rows):
+            if i:
+                f.write(', ')
+            json.dump({
+                'competitionId': 'GB1', 'competitionName': 'Premier League',
+                'seasonId': f"{i % 100:02d}/{(i + 1) % 100:02d}", 'clubId': str(i % 500),
+                'appearances': i % 38, 'goals': i % 20, 'assists': i % 15,
+                'yellowCards': i % 10, 'redCards': i % 2, 'minutesPlayed': i % 3420,
+            }, f)
+        f.write(']}')
+
+def peak_rss_mb():
+    # Linuxon a ru_maxrss kB-ban van
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_mode(mode, path):
+    base = peak_rss_mb()
+    total = 0
+    if mode == 'buffered':
+        with open(path, 'rb') as f:
+            data = json.loads(f.read())
+        for entry in data['stats']:
+            total += entry['goals']
+    else:
+        with open(path, 'rb') as f:
+            chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+            for entry in iter_json_array(chunks, 'stats'):
+                total += entry['goals']
+    print(json.dumps({'mode': mode, 'base_mb': base, 'peak_mb': peak_rss_mb(), 'checksum': total}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming JSON feldolgozás memória benchmark.")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--mode', choices=['buffered', 'streaming'])
+    parser.add_argument('--path')
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'payload.json')
+        write_payload(path, args.rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"Payload: {args.rows} sor, {size_mb:.1f} MB")
+
+        # Külön folyamatban futtatjuk, hogy a csúcs memória ne keveredjen
+        for mode in ('buffered', 'streaming'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--path', path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            res = json.loads(out)
+            print(f"{mode:10s} peak RSS: {res['peak_mb']:.1f} MB (+{res['peak_mb'] - res['base_mb']:.1f} MB), checksum={res['checksum']}")
+
+if __name__ == "__main__":
+    main()
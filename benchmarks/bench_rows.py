@@ -0,0 +1,78 @@
+"""
+Könnyű sor típusok (rows.py) vs. ORM objektumok:
+memória 100k sorra és beszúrási sebesség (in-memory SQLite).
+
+Futtatás a repó gyökeréből:
+    python -m benchmarks.bench_rows --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models import Base, FactMarketValue
+from rows import market_value_row, bulk_insert
+
+def payload(n):
+    start = date(2000, 1, 1)
+    return [
+        {'date': (start + timedelta(days=i % 9000)).isoformat(), 'marketValue': 100000 + i, 'clubId': str(i % 500)}
+        for i in range(n)
+    ]
+
+def build_orm(entries):
+    return [
+        FactMarketValue(
+            player_id=i % 5000 + 1,
+            date_recorded=date.fromisoformat(e['date']),
+            market_value_eur=e['marketValue'],
+            team_id=int(e['clubId']) + 1,
+        )
+        for i, e in enumerate(entries)
+    ]
+
+def build_rows(entries):
+    return [market_value_row(e, i % 5000 + 1, int(e['clubId']) + 1) for i, e in enumerate(entries)]
+
+def measure_memory(builder, entries):
+    tracemalloc.start()
+    objs = builder(entries)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    return current / 1024 / 1024
+
+def measure_insert(mode, entries):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        t0 = time.perf_counter()
+        if mode == 'orm':
+            session.add_all(build_orm(entries))
+        else:
+            bulk_insert(session, FactMarketValue, build_rows(entries))
+        session.commit()
+        elapsed = time.perf_counter() - t0
+    engine.dispose()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Sor típusok vs. ORM benchmark.")
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    entries = payload(args.rows)
+    print(f"{args.rows} FactMarketValue sor")
+    for mode, builder in (('orm', build_orm), ('rows', build_rows)):
+        mem = measure_memory(builder, entries)
+        elapsed = measure_insert(mode, entries)
+        print(f"{mode:5s} memória: {mem:7.1f} MB   beszúrás: {elapsed:6.2f} s ({args.rows / elapsed:,.0f} sor/s)")
+
+if __name__ == "__main__":
+    main()
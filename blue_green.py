@@ -0,0 +1,206 @@
+import argparse
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine, LIVE_SCHEMA, DB_READ_ROLE
+from change_feed import TRACKED_TABLES
+from init_db import init_db
+from utils import logger
+
+# --- BLUE/GREEN ÚJRATÖLTÉS ---
+# A teljes újratöltés nem az élő sémát dobja el: egy shadow sémába tölt
+# (DB_SCHEMA=public_shadow a betöltő folyamatoknak), amíg a riport az élő sémát
+# olvassa. Betöltés után a shadow sorszámait és kulcsait összevetjük az élővel,
+# majd egy tranzakcióban átnevezzük a sémákat: public -> public_old_<idő>,
+# public_shadow -> public. A régi séma visszaállításig megmarad (rollback).
+# Az API keret (etl_api_usage) mindig az élő sémában van, csere előtt átmásoljuk.
+# A shadow run_id-i az élő utolsó futása után folytatódnak, így a változás feed
+# fogyasztói a csere után minden újratöltött sort változásként látnak.
+
+SHADOW_SCHEMA = f"{LIVE_SCHEMA}_shadow"
+OLD_SCHEMA_PREFIX = f"{LIVE_SCHEMA}_old_"
+
+# A shadow táblánként legalább az élő sorok ennyi részét tartalmazza
+MIN_ROW_RATIO = 0.98
+
+# Természetes kulcsok: az élő séma egyik kulcsa sem hiányozhat a shadow-ból
+VALIDATION_KEYS = {
+    'dim_seasons': 'name',
+    'dim_competitions': 'fd_id',
+    'dim_teams': 'tm_id',
+    'dim_players': 'tm_id',
+    'fact_matches': 'fd_match_id',
+}
+
+def _admin_session():
+    return Session(get_db_engine(LIVE_SCHEMA))
+
+def schema_exists(session, schema):
+    return session.execute(
+        text("SELECT 1 FROM information_schema.schemata WHERE schema_name = :schema"), {'schema': schema}
+    ).first() is not None
+
+def table_exists(session, schema, table):
+    return session.execute(text("SELECT to_regclass(:name)"), {'name': f"{schema}.{table}"}).scalar() is not None
+
+def grant_read(session, schema):
+    """
+    Az élő public séma alapjogai, és ha meg van adva, a DB_READ_ROLE olvasási joga.
+    """
+    session.execute(text(f"GRANT USAGE ON SCHEMA {schema} TO PUBLIC"))
+    if DB_READ_ROLE:
+        session.execute(text(f"GRANT USAGE ON SCHEMA {schema} TO {DB_READ_ROLE}"))
+        session.execute(text(f"GRANT SELECT ON ALL TABLES IN SCHEMA {schema} TO {DB_READ_ROLE}"))
+        session.execute(text(f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT SELECT ON TABLES TO {DB_READ_ROLE}"))
+
+def prepare_shadow(shadow=SHADOW_SCHEMA, live=LIVE_SCHEMA):
+    """
+    Üres shadow séma a teljes táblakészlettel; a futás azonosítók az élő után folytatódnak.
+    """
+    init_db(shadow)
+    with _admin_session() as session:
+        if table_exists(session, live, 'etl_runs'):
+            last_run_id = session.execute(text(f"SELECT MAX(run_id) FROM {live}.etl_runs")).scalar()
+            if last_run_id:
+                session.execute(
+                    text("SELECT setval(pg_get_serial_sequence(:table, 'run_id'), :last_run_id)"),
+                    {'table': f"{shadow}.etl_runs", 'last_run_id': last_run_id}
+                )
+        grant_read(session, shadow)
+        session.commit()
+    logger.info(f"Shadow séma előkészítve: {shadow}. Betöltés: DB_SCHEMA={shadow} környezeti változóval.")
+
+def _key_stats(session, schema, table, key):
+    return session.execute(text(
+        f"SELECT md5(string_agg({key}::text, ',' ORDER BY {key})) FROM {schema}.{table} WHERE {key} IS NOT NULL"
+    )).scalar()
+
+def validate(session, shadow=SHADOW_SCHEMA, live=LIVE_SCHEMA, min_ratio=MIN_ROW_RATIO):
+    """
+    Táblánként: sorszám arány és a természetes kulcsok lefedettsége (hiányzó kulcs
+    nem lehet). A kulcs checksum egyezése tájékoztató (új entitások megjelenhetnek).
+    Visszaad: (rendben, [(tábla, élő sorok, shadow sorok, hiányzó kulcsok, checksum egyezik), ...])
+    """
+    ok = True
+    report = []
+    for table in TRACKED_TABLES:
+        if not table_exists(session, shadow, table):
+            logger.error(f"Hiányzó tábla a shadow sémában: {table}")
+            ok = False
+            continue
+        shadow_rows = session.execute(text(f"SELECT COUNT(*) FROM {shadow}.{table}")).scalar()
+        if not table_exists(session, live, table):
+            report.append((table, None, shadow_rows, 0, None))
+            continue
+        live_rows = session.execute(text(f"SELECT COUNT(*) FROM {live}.{table}")).scalar()
+
+        missing, same_checksum = 0, None
+        key = VALIDATION_KEYS.get(table)
+        if key:
+            missing = session.execute(text(
+                f"SELECT COUNT(*) FROM {live}.{table} l WHERE l.{key} IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {shadow}.{table} s WHERE s.{key} = l.{key})"
+            )).scalar()
+            same_checksum = _key_stats(session, live, table, key) == _key_stats(session, shadow, table, key)
+
+        table_ok = shadow_rows >= live_rows * min_ratio and missing == 0
+        if not table_ok:
+            logger.error(f"{table}: élő {live_rows} sor, shadow {shadow_rows} sor, hiányzó kulcs: {missing}")
+        ok = ok and table_ok
+        report.append((table, live_rows, shadow_rows, missing, same_checksum))
+    return ok, report
+
+def print_report(report):
+    for table, live_rows, shadow_rows, missing, same_checksum in report:
+        checksum = '-' if same_checksum is None else ('azonos' if same_checksum else 'eltér')
+        print(f"{table:<28} élő: {live_rows if live_rows is not None else '-':>9}  shadow: {shadow_rows:>9}  "
+              f"hiányzó kulcs: {missing:>6}  kulcs checksum: {checksum}")
+
+SQL_CARRY_OVER_USAGE = """
+    INSERT INTO {shadow}.etl_api_usage (host, window_kind, window_start, calls)
+    SELECT host, window_kind, window_start, calls FROM {live}.etl_api_usage
+    WHERE window_start >= CURRENT_DATE
+    ON CONFLICT (host, window_kind, window_start) DO UPDATE SET
+        calls = GREATEST({shadow}.etl_api_usage.calls, EXCLUDED.calls)
+"""
+
+def swap(shadow=SHADOW_SCHEMA, live=LIVE_SCHEMA, force=False):
+    """
+    Validálás után a sémák atomikus cseréje. Visszaadja a régi (élő) séma új nevét.
+    A futó lekérdezések a régi táblákon befejeződnek, az újak már a cserélt sémát látják.
+    """
+    with _admin_session() as session:
+        if not schema_exists(session, shadow):
+            raise ValueError(f"Nincs shadow séma: {shadow}")
+        ok, report = validate(session, shadow, live)
+        print_report(report)
+        if not ok and not force:
+            raise ValueError("A shadow séma validálása sikertelen, a csere elmarad (--force felülírja).")
+
+        old = f"{OLD_SCHEMA_PREFIX}{datetime.now():%Y%m%d%H%M%S}"
+        session.execute(text("SET LOCAL lock_timeout = '10s'"))
+        if table_exists(session, live, 'etl_api_usage'):
+            session.execute(text(SQL_CARRY_OVER_USAGE.format(shadow=shadow, live=live)))
+        session.execute(text(f"ALTER SCHEMA {live} RENAME TO {old}"))
+        session.execute(text(f"ALTER SCHEMA {shadow} RENAME TO {live}"))
+        session.commit()
+    logger.info(f"Sémák cserélve: {shadow} -> {live}, a korábbi élő séma: {old}")
+    return old
+
+def rollback(old, live=LIVE_SCHEMA):
+    """
+    Visszaállás egy korábbi élő sémára; a cserélt séma {live}_failed_<idő> néven marad.
+    """
+    failed = f"{live}_failed_{datetime.now():%Y%m%d%H%M%S}"
+    with _admin_session() as session:
+        if not schema_exists(session, old):
+            raise ValueError(f"Nincs ilyen séma: {old}")
+        session.execute(text("SET LOCAL lock_timeout = '10s'"))
+        session.execute(text(f"ALTER SCHEMA {live} RENAME TO {failed}"))
+        session.execute(text(f"ALTER SCHEMA {old} RENAME TO {live}"))
+        session.commit()
+    logger.info(f"Visszaállítva: {old} -> {live}, a cserélt séma: {failed}")
+    return failed
+
+def drop_old(keep=1):
+    """
+    A régi élő sémák törlése, a legutóbbi `keep` darab kivételével.
+    """
+    with _admin_session() as session:
+        schemas = [
+            name for (name,) in session.execute(text(
+                "SELECT schema_name FROM information_schema.schemata WHERE schema_name LIKE :prefix ORDER BY schema_name DESC"
+            ), {'prefix': f"{OLD_SCHEMA_PREFIX}%"})
+        ]
+        for name in schemas[keep:]:
+            session.execute(text(f"DROP SCHEMA {name} CASCADE"))
+            logger.info(f"Régi séma törölve: {name}")
+        session.commit()
+    return schemas[keep:]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blue/green újratöltés: shadow séma előkészítése, validálása és cseréje.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('prepare', help="Üres shadow séma létrehozása (a régi shadow törlődik).")
+    subparsers.add_parser('validate', help="A shadow összevetése az élő sémával (sorszám, kulcsok).")
+    swap_parser = subparsers.add_parser('swap', help="Validálás és a sémák atomikus cseréje.")
+    swap_parser.add_argument('--force', action='store_true', help="Csere sikertelen validálás esetén is.")
+    rollback_parser = subparsers.add_parser('rollback', help="Visszaállás egy korábbi élő sémára.")
+    rollback_parser.add_argument('schema', help=f"A korábbi élő séma neve ({OLD_SCHEMA_PREFIX}...).")
+    drop_parser = subparsers.add_parser('drop-old', help="Régi élő sémák törlése.")
+    drop_parser.add_argument('--keep', type=int, default=1, help="Ennyi legutóbbi régi séma megmarad.")
+    args = parser.parse_args()
+
+    if args.command == 'prepare':
+        prepare_shadow()
+    elif args.command == 'validate':
+        with _admin_session() as session:
+            ok, report = validate(session)
+        print_report(report)
+        exit(0 if ok else 1)
+    elif args.command == 'swap':
+        swap(force=args.force)
+    elif args.command == 'rollback':
+        rollback(args.schema)
+    elif args.command == 'drop-old':
+        drop_old(args.keep)
@@ -0,0 +1,151 @@
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql import text
+from config import ETL_RUN_EXPIRY_SECONDS
+from models import Base, EtlRun, EtlRunChange, RunStamped
+
+# --- VÁLTOZÁS FEED ---
+# Minden dim_* / fact_* sor run_id / updated_at oszlopát egy BEFORE INSERT OR UPDATE
+# trigger tölti az 'etl.run_id' session beállításból. A beállítást a folyamat aktuális
+# ETL futása alapján minden pool checkoutnál igazítjuk, így az ORM, a pg_insert és a
+# COPY + INSERT...SELECT írások is megkapják. Futáson kívüli írás megtartja a sor
+# korábbi run_id-ját. A törlések (pl. compaction) nem jelennek meg a feedben.
+
+TRACKED_TABLES = tuple(sorted(
+    mapper.class_.__tablename__ for mapper in Base.registry.mappers if issubclass(mapper.class_, RunStamped)
+))
+
+SQL_STAMP_FUNCTION = """
+    CREATE OR REPLACE FUNCTION etl_stamp_run() RETURNS trigger AS $$
+    BEGIN
+        NEW.run_id := COALESCE(NULLIF(current_setting('etl.run_id', true), '')::int, NEW.run_id);
+        NEW.updated_at := now();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+_current_run_id = None
+
+def set_current_run(run_id):
+    """
+    A folyamat további DB írásai ezzel a run_id-val kapnak bélyeget (None: futáson kívül).
+    """
+    global _current_run_id
+    _current_run_id = run_id
+
+def current_run():
+    return _current_run_id
+
+@event.listens_for(Pool, 'checkout')
+def _apply_run_id(dbapi_connection, connection_record, connection_proxy):
+    # Kapcsolatonként csak változáskor állítjuk (a pool újrahasznosítja a kapcsolatokat)
+    run_id = _current_run_id
+    if connection_record.info.get('etl_run_id', '') == run_id:
+        return
+    if not hasattr(dbapi_connection, 'get_dsn_parameters'): # csak PostgreSQL (psycopg2)
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SELECT set_config('etl.run_id', %s, false)", ('' if run_id is None else str(run_id),))
+    cursor.close()
+    # Saját tranzakcióban, hogy a hívó egy későbbi rollbackje ne vonja vissza
+    dbapi_connection.commit()
+    connection_record.info['etl_run_id'] = run_id
+
+def install_change_tracking(session):
+    """
+    Oszlopok, indexek és triggerek felvétele a követett táblákra (meglévő DB-n is futtatható).
+    """
+    session.execute(text("ALTER TABLE etl_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP"))
+    session.execute(text(SQL_STAMP_FUNCTION))
+    for table in TRACKED_TABLES:
+        session.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS run_id INTEGER"))
+        session.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+        session.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_run_id ON {table} (run_id)"))
+        session.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_stamp_run ON {table}"))
+        session.execute(text(
+            f"CREATE TRIGGER trg_{table}_stamp_run BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION etl_stamp_run()"
+        ))
+    session.commit()
+
+def summarize_run(session, run_id):
+    """
+    A futás által érintett sorok száma táblánként, az etl_run_changes táblába (commit nélkül).
+    """
+    summary = {}
+    for table in TRACKED_TABLES:
+        rows = session.execute(text(f"SELECT COUNT(*) FROM {table} WHERE run_id = :run_id"), {'run_id': run_id}).scalar()
+        if rows:
+            summary[table] = rows
+            session.add(EtlRunChange(run_id=run_id, table_name=table, rows=rows))
+    return summary
+
+def run_expiry_cutoff():
+    """
+    Az ennél régebbi heartbeat-ű (vagy heartbeat nélkül ennél régebben indult)
+    'running' futás árva: a folyamata meghalt (SIGKILL, OOM, leállt gép).
+    """
+    return datetime.now() - timedelta(seconds=ETL_RUN_EXPIRY_SECONDS)
+
+def change_watermark(session):
+    """
+    A legnagyobb run_id, ameddig minden futás lezárult. Párhuzamos futásoknál egy
+    korábban indult, még futó futás később is írhat kisebb run_id-val, ezért az
+    inkrementális fogyasztó csak eddig léptesse a saját pozícióját. Az árva
+    (lejárt heartbeat-ű) futások nem tartják vissza.
+    """
+    running = session.query(func.min(EtlRun.run_id)).filter(
+        EtlRun.status == 'running',
+        func.coalesce(EtlRun.heartbeat_at, EtlRun.started_at) >= run_expiry_cutoff()
+    ).scalar()
+    if running is not None:
+        return running - 1
+    return session.query(func.max(EtlRun.run_id)).scalar() or 0
+
+def changes_since(session, since_run_id, until_run_id=None):
+    """
+    A (since_run_id, until_run_id] futások összesítője táblánként: {tábla: érintett sorok}.
+    until_run_id alapból a change_watermark.
+    """
+    until_run_id = change_watermark(session) if until_run_id is None else until_run_id
+    rows = session.query(EtlRunChange.table_name, func.sum(EtlRunChange.rows)).filter(
+        EtlRunChange.run_id > since_run_id, EtlRunChange.run_id <= until_run_id
+    ).group_by(EtlRunChange.table_name)
+    return {table: int(count) for table, count in rows}
+
+def changed_rows(session, table, since_run_id, until_run_id=None, batch_size=5000):
+    """
+    Egy tábla (since_run_id, until_run_id] között beszúrt / módosított sorai, dict-ként streamelve.
+    """
+    if table not in TRACKED_TABLES:
+        raise ValueError(f"Nem követett tábla: {table}")
+    until_run_id = change_watermark(session) if until_run_id is None else until_run_id
+    result = session.execute(
+        text(f"SELECT * FROM {table} WHERE run_id > :since AND run_id <= :until ORDER BY run_id"),
+        {'since': since_run_id, 'until': until_run_id},
+        execution_options={'yield_per': batch_size}
+    )
+    for row in result:
+        yield dict(row._mapping)
+
+if __name__ == "__main__":
+    from config import get_db_engine
+    from sqlalchemy.orm import Session
+
+    parser = argparse.ArgumentParser(description="Változás feed: trigger telepítés vagy a N. futás óta változott sorok összesítője.")
+    parser.add_argument('--install', action='store_true', help="run_id / updated_at oszlopok és triggerek felvétele meglévő DB-re.")
+    parser.add_argument('--since', type=int, default=0, help="Ennél nagyobb run_id-jú futások változásai.")
+    args = parser.parse_args()
+
+    with Session(get_db_engine()) as session:
+        if args.install:
+            install_change_tracking(session)
+            print(f"Változáskövetés telepítve: {len(TRACKED_TABLES)} tábla.")
+        else:
+            until = change_watermark(session)
+            print(f"Változások a {args.since}. futás után (lezárt futásokig: {until}):")
+            for table, rows in sorted(changes_since(session, args.since, until).items()):
+                print(f"  {table}: {rows} sor")
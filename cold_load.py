@@ -0,0 +1,418 @@
+import csv
+import io
+from itertools import islice
+from typing import NamedTuple, Optional
+from datetime import date
+from sqlalchemy.sql import text
+from models import FactMatch, FactMarketValue, FactTransfer, FactPlayerSeasonStat, DimPlayer
+from utils import (
+    logger, get_season_registry, get_or_create_team_by_tm_id, get_or_create_competition_by_tm_id
+)
+from rows import int_or_raw, date_or_raw
+from validation import validate_table_rows, quarantine
+from change_feed import current_run
+
+# --- HIDEG (ELSŐ) BETÖLTÉS COPY-VAL ---
+# Első betöltésnél a sorok nem ORM-en át, hanem PostgreSQL COPY FROM STDIN-nel
+# mennek UNLOGGED staging táblákba, természetes kulcsokkal (TM / FD azonosítók).
+# A surrogate kulcsokat utána set-based INSERT ... SELECT oldja fel, a cél
+# táblák másodlagos indexei a betöltés alatt nincsenek, a végén ANALYZE fut.
+
+COPY_BUFFER_SIZE = 1 << 16
+
+STAGING_TABLES = {
+    'stg_market_values': """
+        player_tm_id INTEGER, club_tm_id INTEGER, club_name TEXT,
+        date_recorded DATE, market_value_eur BIGINT
+    """,
+    'stg_transfers': """
+        player_tm_id INTEGER, from_tm_id INTEGER, from_name TEXT, to_tm_id INTEGER, to_name TEXT,
+        season_tm TEXT, date_recorded DATE, market_value_eur BIGINT, fee_eur BIGINT
+    """,
+    'stg_player_season_stats': """
+        player_tm_id INTEGER, club_tm_id INTEGER, season_tm TEXT,
+        competition_tm_id TEXT, competition_name TEXT,
+        appearances INTEGER, goals INTEGER, assists INTEGER,
+        yellow_cards INTEGER, red_cards INTEGER, minutes_played INTEGER
+    """,
+    'stg_players': """
+        tm_id INTEGER, name TEXT, position TEXT, position_name TEXT, nationality TEXT,
+        age INTEGER, shirt_number TEXT, current_team_id INTEGER
+    """,
+    'stg_matches': """
+        fd_match_id INTEGER, date TIMESTAMP, home_fd_id INTEGER, away_fd_id INTEGER,
+        home_score INTEGER, away_score INTEGER, status TEXT
+    """,
+    'stg_season_map': """
+        season_tm TEXT, season_id INTEGER
+    """,
+}
+
+# A staging sorok (a COPY oszlop sorrendjében); a validálás oszlop nevek szerint ellenőrzi őket
+
+class StgMarketValueRow(NamedTuple):
+    player_tm_id: int
+    club_tm_id: Optional[int]
+    club_name: Optional[str]
+    date_recorded: date
+    market_value_eur: Optional[int]
+
+class StgTransferRow(NamedTuple):
+    player_tm_id: int
+    from_tm_id: Optional[int]
+    from_name: Optional[str]
+    to_tm_id: Optional[int]
+    to_name: Optional[str]
+    season_tm: str
+    date_recorded: date
+    market_value_eur: Optional[int]
+    fee_eur: Optional[int]
+
+class StgSeasonStatRow(NamedTuple):
+    player_tm_id: int
+    club_tm_id: Optional[int]
+    season_tm: str
+    competition_tm_id: str
+    competition_name: Optional[str]
+    appearances: Optional[int]
+    goals: Optional[int]
+    assists: Optional[int]
+    yellow_cards: Optional[int]
+    red_cards: Optional[int]
+    minutes_played: Optional[int]
+
+class StgPlayerRow(NamedTuple):
+    tm_id: int
+    name: str
+    position: Optional[str]
+    position_name: Optional[str]
+    nationality: Optional[str]
+    age: Optional[int]
+    shirt_number: Optional[str]
+    current_team_id: Optional[int]
+
+class StgMatchRow(NamedTuple):
+    fd_match_id: int
+    date: str # ISO időbélyeg, a COPY értelmezi
+    home_fd_id: int
+    away_fd_id: int
+    home_score: Optional[int]
+    away_score: Optional[int]
+    status: str
+
+STAGING_COLUMNS = {
+    'stg_market_values': StgMarketValueRow._fields,
+    'stg_transfers': StgTransferRow._fields,
+    'stg_player_season_stats': StgSeasonStatRow._fields,
+    'stg_players': StgPlayerRow._fields,
+    'stg_matches': StgMatchRow._fields,
+}
+
+def prepare_staging(session, tables=STAGING_TABLES):
+    """
+    Létrehozza (ha kell) és kiüríti a staging táblákat (commit nélkül).
+    """
+    for table in tables:
+        session.execute(text(f"CREATE UNLOGGED TABLE IF NOT EXISTS {table} ({STAGING_TABLES[table]})"))
+        session.execute(text(f"TRUNCATE {table}"))
+
+# --- COPY FROM STDIN ---
+
+class CopyBuffer:
+    """
+    Fájlszerű olvasó egy sor-iterátor fölött: a COPY darabonként olvassa,
+    így a teljes CSV sosem áll elő a memóriában.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.count += 1
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+COPY_CHUNK_ROWS = 10000
+
+def copy_rows(session, table, rows):
+    """
+    Sorok (tuple-ök a STAGING_COLUMNS sorrendjében) betöltése COPY-val
+    a session tranzakciójában. None -> NULL. Visszaadja a sorok számát.
+    """
+    cursor = session.connection().connection.cursor()
+    buffer = CopyBuffer(rows)
+    columns = ', '.join(STAGING_COLUMNS[table])
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer, size=COPY_BUFFER_SIZE)
+    return buffer.count
+
+def copy_valid_rows(session, table, rows):
+    """
+    copy_rows a staging tábla szabályaival validált sorokra (validation.py): a hibás
+    sorok a karantén táblába kerülnek (a COPY-val egy tranzakcióban), a számok az
+    adatminőség metrikákba. A sorok COPY_CHUNK_ROWS darabokban mennek, így a
+    streamelt forrás sem áll elő egyben. Visszaadja a betöltött sorok számát.
+    """
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, COPY_CHUNK_ROWS))
+        if not chunk:
+            return count
+        valid, rejected = validate_table_rows(table, chunk)
+        quarantine(session, rejected)
+        if valid:
+            count += copy_rows(session, table, valid)
+
+# --- API bejegyzések -> staging sorok (DB lookup nélkül) ---
+# Mint a rows.py sor építői: a nem értelmezhető érték nyersen marad, a validálás teszi karanténba.
+
+def market_value_staging_rows(tm_id, entries):
+    for entry in entries:
+        yield StgMarketValueRow(
+            tm_id, int_or_raw(entry.get('clubId')), entry.get('clubName'),
+            date_or_raw(entry.get('date')), int_or_raw(entry.get('marketValue')),
+        )
+
+def transfer_staging_rows(tm_id, entries):
+    for entry in entries:
+        club_from = entry.get('clubFrom') or {}
+        club_to = entry.get('clubTo') or {}
+        yield StgTransferRow(
+            tm_id, int_or_raw(club_from.get('id')), club_from.get('name'),
+            int_or_raw(club_to.get('id')), club_to.get('name'),
+            entry.get('season'), date_or_raw(entry.get('date')),
+            int_or_raw(entry.get('marketValue')), int_or_raw(entry.get('fee')),
+        )
+
+def season_stat_staging_rows(tm_id, entries):
+    for entry in entries:
+        yield StgSeasonStatRow(
+            tm_id, int_or_raw(entry.get('clubId')), entry.get('seasonId'),
+            entry.get('competitionId'), entry.get('competitionName'),
+            int_or_raw(entry.get('appearances')), int_or_raw(entry.get('goals')), int_or_raw(entry.get('assists')),
+            int_or_raw(entry.get('yellowCards')), int_or_raw(entry.get('redCards')),
+            int_or_raw(entry.get('minutesPlayed')),
+        )
+
+def player_staging_row(player):
+    """
+    build_player / player_from_fields által összerakott (nem mentett) DimPlayer -> staging sor.
+    """
+    return StgPlayerRow(
+        player.tm_id, player.name, player.position, player.position_name, player.nationality,
+        int_or_raw(player.age), player.shirt_number, player.current_team_id,
+    )
+
+def match_staging_row(match):
+    full_time = (match.get('score') or {}).get('fullTime') or {}
+    return StgMatchRow(
+        match['id'], match.get('utcDate'), (match.get('homeTeam') or {}).get('id'), (match.get('awayTeam') or {}).get('id'),
+        int_or_raw(full_time.get('home')), int_or_raw(full_time.get('away')), match.get('status'),
+    )
+
+# --- HIÁNYZÓ DIMENZIÓK: egyedi kulcsonként egyszer ---
+
+SQL_MISSING_TEAMS = """
+    SELECT club_tm_id, MAX(club_name) AS club_name
+    FROM (
+        SELECT club_tm_id, club_name FROM stg_market_values
+        UNION ALL SELECT from_tm_id, from_name FROM stg_transfers
+        UNION ALL SELECT to_tm_id, to_name FROM stg_transfers
+        UNION ALL SELECT club_tm_id, NULL FROM stg_player_season_stats
+    ) c
+    WHERE club_tm_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM dim_teams t WHERE t.tm_id = c.club_tm_id)
+    GROUP BY club_tm_id
+"""
+
+SQL_MISSING_COMPETITIONS = """
+    SELECT competition_tm_id, MAX(competition_name) AS competition_name
+    FROM stg_player_season_stats s
+    WHERE competition_tm_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM dim_competitions c WHERE c.tm_id = s.competition_tm_id)
+    GROUP BY competition_tm_id
+"""
+
+SQL_SEASON_NAMES = """
+    SELECT season_tm FROM stg_transfers WHERE season_tm IS NOT NULL
+    UNION SELECT season_tm FROM stg_player_season_stats WHERE season_tm IS NOT NULL
+"""
+
+def create_missing_dimensions(session):
+    """
+    A staging táblákban hivatkozott, de még nem létező csapatok / bajnokságok
+    felvétele (TM hívással, kulcsonként egyszer) és a szezon nevek leképezése.
+    """
+    missing_teams = session.execute(text(SQL_MISSING_TEAMS)).all()
+    logger.info(f"{len(missing_teams)} hiányzó csapat felvétele...")
+    for tm_id, name in missing_teams:
+        get_or_create_team_by_tm_id(tm_id, name)
+
+    missing_comps = session.execute(text(SQL_MISSING_COMPETITIONS)).all()
+    logger.info(f"{len(missing_comps)} hiányzó bajnokság felvétele...")
+    for tm_id, name in missing_comps:
+        get_or_create_competition_by_tm_id(tm_id, name)
+
+    # A hiányzó szezonok egy commitban jönnek létre, utána a leképezés memóriából megy
+    season_codes = [season_tm for (season_tm,) in session.execute(text(SQL_SEASON_NAMES))]
+    registry = get_season_registry()
+    registry.ensure(session, season_codes)
+    season_map = []
+    for season_tm in season_codes:
+        season = registry.get(session, season_tm)
+        if season:
+            season_map.append({'season_tm': season_tm, 'season_id': season.season_id})
+    prepare_staging(session, ['stg_season_map'])
+    if season_map:
+        session.execute(text("INSERT INTO stg_season_map (season_tm, season_id) VALUES (:season_tm, :season_id)"), season_map)
+
+# --- SET-BASED FELOLDÁS A CÉL TÁBLÁKBA ---
+# A duplikációkat a cél táblák unique kulcsai szűrik: (játékos, dátum), ill. (játékos, szezon, bajnokság).
+
+SQL_LOAD_MARKET_VALUES = """
+    INSERT INTO fact_market_values (player_id, team_id, date_recorded, market_value_eur)
+    SELECT DISTINCT ON (p.player_id, s.date_recorded) p.player_id, t.team_id, s.date_recorded, s.market_value_eur
+    FROM stg_market_values s
+    JOIN dim_players p ON p.tm_id = s.player_tm_id
+    LEFT JOIN dim_teams t ON t.tm_id = s.club_tm_id
+    ORDER BY p.player_id, s.date_recorded
+    ON CONFLICT DO NOTHING
+"""
+
+SQL_LOAD_TRANSFERS = """
+    INSERT INTO fact_transfers (player_id, "teamFrom_id", "teamTo_id", season_id, date_recorded, market_value_eur, fee_eur)
+    SELECT DISTINCT ON (p.player_id, s.date_recorded)
+        p.player_id, tf.team_id, tt.team_id, sm.season_id, s.date_recorded, s.market_value_eur, s.fee_eur
+    FROM stg_transfers s
+    JOIN dim_players p ON p.tm_id = s.player_tm_id
+    LEFT JOIN dim_teams tf ON tf.tm_id = s.from_tm_id
+    LEFT JOIN dim_teams tt ON tt.tm_id = s.to_tm_id
+    LEFT JOIN stg_season_map sm ON sm.season_tm = s.season_tm
+    ORDER BY p.player_id, s.date_recorded
+    ON CONFLICT DO NOTHING
+"""
+
+SQL_LOAD_SEASON_STATS = """
+    INSERT INTO fact_player_season_stats (player_id, team_id, season_id, competition_id,
+        appearances, goals, assists, yellow_cards, red_cards, minutes_played)
+    SELECT DISTINCT ON (p.player_id, sm.season_id, c.competition_id)
+        p.player_id, t.team_id, sm.season_id, c.competition_id,
+        s.appearances, s.goals, s.assists, s.yellow_cards, s.red_cards, s.minutes_played
+    FROM stg_player_season_stats s
+    JOIN dim_players p ON p.tm_id = s.player_tm_id
+    JOIN stg_season_map sm ON sm.season_tm = s.season_tm
+    JOIN dim_competitions c ON c.tm_id = s.competition_tm_id
+    LEFT JOIN dim_teams t ON t.tm_id = s.club_tm_id
+    ORDER BY p.player_id, sm.season_id, c.competition_id
+    ON CONFLICT DO NOTHING
+"""
+
+# A szezonhoz / bajnoksághoz nem köthető statisztikák a fenti JOIN-on kiesnének: LEFT JOIN-nal
+# megkeresve a karantén táblába kerülnek (a szabály nevek a feloldatlan staging oszlopok).
+SQL_QUARANTINE_SEASON_STATS = """
+    INSERT INTO etl_quarantine (run_id, table_name, entity_key, reasons, payload, quarantined_at)
+    SELECT :run_id, 'stg_player_season_stats', s.player_tm_id::text,
+        concat_ws(',',
+            CASE WHEN sm.season_id IS NULL THEN 'season_tm_unresolved' END,
+            CASE WHEN c.competition_id IS NULL THEN 'competition_tm_id_unresolved' END),
+        to_jsonb(s), now()
+    FROM stg_player_season_stats s
+    JOIN dim_players p ON p.tm_id = s.player_tm_id
+    LEFT JOIN stg_season_map sm ON sm.season_tm = s.season_tm
+    LEFT JOIN dim_competitions c ON c.tm_id = s.competition_tm_id
+    WHERE sm.season_id IS NULL OR c.competition_id IS NULL
+"""
+
+SQL_LOAD_PLAYERS = """
+    INSERT INTO dim_players (tm_id, name, position, position_name, nationality, age, shirt_number, current_team_id)
+    SELECT DISTINCT ON (tm_id) tm_id, name, position, position_name, nationality, age, shirt_number, current_team_id
+    FROM stg_players
+    ORDER BY tm_id
+    ON CONFLICT (tm_id) DO NOTHING
+"""
+
+SQL_LOAD_MATCHES = """
+    INSERT INTO fact_matches (fd_match_id, date, season_id, competition_id,
+        home_team_id, away_team_id, home_score, away_score, status)
+    SELECT DISTINCT ON (s.fd_match_id) s.fd_match_id, s.date, :season_id, :competition_id,
+        h.team_id, a.team_id, s.home_score, s.away_score, s.status
+    FROM stg_matches s
+    JOIN dim_teams h ON h.fd_id = s.home_fd_id
+    JOIN dim_teams a ON a.fd_id = s.away_fd_id
+    WHERE s.status = 'FINISHED'
+    ORDER BY s.fd_match_id
+    ON CONFLICT (fd_match_id) DO NOTHING
+"""
+
+def drop_secondary_indexes(session, models):
+    """
+    A cél táblák másodlagos (nem PK / unique) indexeinek eldobása a betöltés idejére.
+    """
+    for model in models:
+        for index in model.__table__.indexes:
+            session.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+
+def create_secondary_indexes(session, models):
+    connection = session.connection()
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+def analyze(session, models):
+    for model in models:
+        session.execute(text(f"ANALYZE {model.__tablename__}"))
+
+def load_from_staging(session, statements, models, params=None):
+    """
+    Indexek eldobása, set-based betöltés, indexek újraépítése és ANALYZE (commit nélkül).
+    Visszaadja táblánként a beszúrt sorok számát.
+    """
+    drop_secondary_indexes(session, models)
+    counts = {}
+    for model, sql in zip(models, statements):
+        counts[model.__tablename__] = session.execute(text(sql), params or {}).rowcount
+    create_secondary_indexes(session, models)
+    analyze(session, models)
+    return counts
+
+PLAYER_DETAIL_MODELS = (FactMarketValue, FactTransfer, FactPlayerSeasonStat)
+PLAYER_DETAIL_STATEMENTS = (SQL_LOAD_MARKET_VALUES, SQL_LOAD_TRANSFERS, SQL_LOAD_SEASON_STATS)
+
+def quarantine_unresolved_season_stats(session):
+    """
+    A feloldatlan szezonú / bajnokságú statisztikák karanténba helyezése (commit nélkül).
+    """
+    count = session.execute(text(SQL_QUARANTINE_SEASON_STATS), {'run_id': current_run()}).rowcount
+    if count:
+        logger.warning(f"Karantén - {count} szezon statisztika feloldatlan szezonnal / bajnoksággal.")
+    return count
+
+def load_player_details_from_staging(session):
+    create_missing_dimensions(session)
+    session.commit()
+    quarantined = quarantine_unresolved_season_stats(session)
+    counts = load_from_staging(session, PLAYER_DETAIL_STATEMENTS, PLAYER_DETAIL_MODELS)
+    counts['etl_quarantine'] = quarantined
+    return counts
+
+def load_players_from_staging(session):
+    return load_from_staging(session, (SQL_LOAD_PLAYERS,), (DimPlayer,))
+
+def load_matches_from_staging(session, competition_id, season_id):
+    return load_from_staging(
+        session, (SQL_LOAD_MATCHES,), (FactMatch,), {'competition_id': competition_id, 'season_id': season_id}
+    )
@@ -0,0 +1,204 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from models import FactMarketValue, FactTransfer, FactPlayerSeasonStat
+from utils import logger
+from etl_runs import etl_run
+
+# --- DUPLIKÁLT TÉNY SOROK ÖSSZEVONÁSA ---
+# A régi SELECT-then-INSERT deduplikáció párhuzamos / ismételt futásnál duplikált
+# sorokat hagyhatott. Ez az egyszeri job a modellekben definiált unique kulcs
+# szerint szezononkénti darabokban (rövid zárolásokkal, párhuzamosan) összevonja
+# őket, majd felteszi a unique constraintet. Az összevont sor a legutóbb beszúrt,
+# a hiányzó (NULL) mezőit a régebbi duplikátumokból tölti ki.
+
+COMPACTED_MODELS = (FactMarketValue, FactTransfer, FactPlayerSeasonStat)
+
+def _quote(name):
+    return f'"{name}"'
+
+def unique_key(model):
+    return next(c for c in model.__table__.constraints if isinstance(c, UniqueConstraint))
+
+def compaction_chunks(session, model):
+    """
+    A tábla darabjai: dátum alapú kulcsnál szezononként (júl. 1 - júl. 1),
+    szezon alapúnál season_id-nként. Visszaad: [(feltétel, paraméterek, címke), ...]
+    """
+    table = model.__tablename__
+    key = [c.name for c in unique_key(model).columns]
+    if 'season_id' in key:
+        season_ids = session.execute(text(f"SELECT DISTINCT season_id FROM {table} WHERE season_id IS NOT NULL"))
+        return [("season_id = :season_id", {'season_id': season_id}, f"season_id={season_id}")
+                for (season_id,) in season_ids]
+
+    first, last = session.execute(text(
+        f"SELECT EXTRACT(YEAR FROM MIN(date_recorded))::int, EXTRACT(YEAR FROM MAX(date_recorded))::int FROM {table}"
+    )).one()
+    if first is None:
+        return []
+    return [
+        ("date_recorded >= make_date(:year, 7, 1) AND date_recorded < make_date(:year + 1, 7, 1)",
+         {'year': year}, f"{year}/{year + 1}")
+        for year in range(first - 1, last + 1)
+    ]
+
+def remainder_chunk(model, chunks):
+    """
+    A darabokon kívüli sorok (pl. a felosztás után beszúrt új szezon vagy dátum) darabja:
+    a constraint előtti utolsó ellenőrzés így nem a teljes táblát vonja össze egy tranzakcióban.
+    """
+    key = [c.name for c in unique_key(model).columns]
+    if 'season_id' in key:
+        season_ids = [params['season_id'] for _, params, _ in chunks]
+        return ("NOT (season_id = ANY(:season_ids))", {'season_ids': season_ids}, "maradék")
+    if not chunks:
+        # A felosztáskor üres volt a tábla: csak a közben beszúrt sorok vannak benne
+        return ("TRUE", {}, "maradék")
+    years = [params['year'] for _, params, _ in chunks]
+    return (
+        "NOT (date_recorded >= make_date(:first, 7, 1) AND date_recorded < make_date(:last + 1, 7, 1))",
+        {'first': min(years), 'last': max(years)}, "maradék"
+    )
+
+def merge_statements(model, condition):
+    """
+    Egy darab összevonása: ideiglenes táblába gyűjtjük a duplikált kulcsokat
+    a megtartott sor azonosítójával és oszloponként a legfrissebb nem NULL értékkel.
+    """
+    table = model.__tablename__
+    pk = _quote(model.__table__.primary_key.columns.values()[0].name)
+    key = [_quote(c.name) for c in unique_key(model).columns]
+    columns = [
+        _quote(c.name) for c in model.__table__.columns
+        if not c.primary_key and _quote(c.name) not in key
+    ]
+
+    aggregates = ", ".join(
+        f"(ARRAY_AGG({col} ORDER BY {pk} DESC) FILTER (WHERE {col} IS NOT NULL))[1] AS {col}" for col in columns
+    )
+    key_list = ", ".join(key)
+    key_not_null = " AND ".join(f"{col} IS NOT NULL" for col in key)
+    key_join = " AND ".join(f"t.{col} = d.{col}" for col in key)
+    assignments = ", ".join(f"{col} = d.{col}" for col in columns)
+
+    collect = f"""
+        CREATE TEMP TABLE compaction_dups ON COMMIT DROP AS
+        SELECT {key_list}, MAX({pk}) AS keep_id, {aggregates}
+        FROM {table}
+        WHERE {condition} AND {key_not_null}
+        GROUP BY {key_list}
+        HAVING COUNT(*) > 1
+    """
+    merge = f"UPDATE {table} t SET {assignments} FROM compaction_dups d WHERE t.{pk} = d.keep_id"
+    delete = f"DELETE FROM {table} t USING compaction_dups d WHERE {key_join} AND t.{pk} <> d.keep_id"
+    return collect, merge, delete
+
+def merge_chunk(session, model, condition, params):
+    """
+    Egy darab összevonása a megadott sessionben (commit nélkül). Visszaadja a törölt sorok számát.
+    """
+    collect, merge, delete = merge_statements(model, condition)
+    session.execute(text(collect), params)
+    session.execute(text(merge))
+    return session.execute(text(delete)).rowcount
+
+def compact_chunk(engine, model, condition, params, label):
+    """
+    Egy darab összevonása saját tranzakcióban. Visszaadja a törölt sorok számát.
+    """
+    with Session(engine) as session:
+        deleted = merge_chunk(session, model, condition, params)
+        session.commit()
+    if deleted:
+        logger.info(f"{model.__tablename__} [{label}]: {deleted} duplikált sor összevonva.")
+    return deleted
+
+def install_unique_key(session, model):
+    """
+    A unique constraint felvétele, ha még nincs (commit nélkül).
+    """
+    constraint = unique_key(model)
+    exists = session.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {'name': constraint.name}).first()
+    if exists:
+        return False
+    columns = ", ".join(_quote(c.name) for c in constraint.columns)
+    session.execute(text(f"ALTER TABLE {model.__tablename__} ADD CONSTRAINT {constraint.name} UNIQUE ({columns})"))
+    return True
+
+def finish_table(engine, model, chunks):
+    """
+    A felosztás óta a darabokon kívülre beszúrt sorok összevonása és a unique constraint
+    felvétele egy tranzakcióban, SHARE ROW EXCLUSIVE zár alatt: a kettő között más
+    nem szúrhat be új duplikátumot (az olvasás közben is mehet). Visszaadja a törölt sorok számát.
+    """
+    condition, params, label = remainder_chunk(model, chunks)
+    with Session(engine) as session:
+        session.execute(text(f"LOCK TABLE {model.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+        deleted = merge_chunk(session, model, condition, params)
+        installed = install_unique_key(session, model)
+        session.commit()
+    if deleted:
+        logger.info(f"{model.__tablename__} [{label}]: {deleted} duplikált sor összevonva.")
+    if installed:
+        logger.info(f"{model.__tablename__}: {unique_key(model).name} unique constraint felvéve.")
+    return deleted
+
+def table_size(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pg_total_relation_size(:table)"), {'table': model.__tablename__}).scalar()
+
+def vacuum(engine, model, full=False):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM {'FULL ' if full else ''}ANALYZE {model.__tablename__}"))
+
+def compact_table(engine, model, workers=4, vacuum_full=False):
+    """
+    Egy tábla teljes összevonása: párhuzamos darabok, unique constraint, VACUUM.
+    Visszaad: (törölt sorok, méret előtte, méret utána) bájtban.
+    """
+    size_before = table_size(engine, model)
+    with Session(engine) as session:
+        chunks = compaction_chunks(session, model)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        deleted = sum(pool.map(lambda chunk: compact_chunk(engine, model, *chunk), chunks))
+
+    deleted += finish_table(engine, model, chunks)
+
+    vacuum(engine, model, full=vacuum_full)
+    return deleted, size_before, table_size(engine, model)
+
+def _mb(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+def run_compaction(models=COMPACTED_MODELS, workers=4, vacuum_full=False):
+    engine = get_db_engine()
+    total_deleted, total_before, total_after = 0, 0, 0
+    # Az összevont (felülírt) sorok a compaction futás run_id-ját kapják
+    with Session(engine) as run_session, etl_run(run_session, 'compaction'):
+        for model in models:
+            deleted, size_before, size_after = compact_table(engine, model, workers, vacuum_full)
+            total_deleted += deleted
+            total_before += size_before
+            total_after += size_after
+            logger.info(f"{model.__tablename__}: {deleted} sor törölve, méret {_mb(size_before)} -> {_mb(size_after)}")
+
+    # A unique constraint indexe kiváltja a régi (player_id, date_recorded) indexet
+    with Session(engine) as session:
+        session.execute(text("DROP INDEX IF EXISTS ix_fact_market_values_player_date"))
+        session.commit()
+
+    logger.info(f"Összesen {total_deleted} sor törölve, méret {_mb(total_before)} -> {_mb(total_after)}")
+    return total_deleted, total_before, total_after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Duplikált tény sorok összevonása és unique constraintek felvétele.")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="Párhuzamosan feldolgozott szezon darabok száma.")
+    parser.add_argument('--vacuum-full', action='store_true', help="VACUUM FULL a végén (visszaadja a helyet, de zárolja a táblát).")
+    args = parser.parse_args()
+
+    run_compaction(workers=args.workers, vacuum_full=args.vacuum_full)
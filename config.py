@@ -15,12 +15,46 @@ DB_NAME = os.getenv("DB_NAME")
 # Connection String összeállítása
 DATABASE_URI = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
+# Blue/green újratöltés: az élő séma, és ha meg van adva, az ETL ebbe a (shadow) sémába ír
+LIVE_SCHEMA = "public"
+DB_SCHEMA = os.getenv("DB_SCHEMA")
+# Ha meg van adva, ez a szerep olvasási jogot kap a shadow sémára (pl. a Power BI felhasználó)
+DB_READ_ROLE = os.getenv("DB_READ_ROLE")
+
 # API beállítások
 FD_API_KEY = os.getenv("FD_API_KEY")
 TM_API_URL = os.getenv("TM_API_URL")
 
-def get_db_engine():
+# Napi frissítésben követett bajnokságok (Football-Data kódok, vesszővel elválasztva)
+TRACKED_COMPETITIONS = [c.strip() for c in os.getenv("TRACKED_COMPETITIONS", "PL").split(",") if c.strip()]
+
+# Nagy API válaszok darabonkénti (streaming) feldolgozása a teljes resp.json() helyett
+STREAM_JSON = os.getenv("STREAM_JSON", "0") == "1"
+
+# Adaptív napi ütemezés: napi API keret hostonként és a meccs vége utáni frissítés késleltetése
+DAILY_API_BUDGET_FD = int(os.getenv("DAILY_API_BUDGET_FD", "500"))
+DAILY_API_BUDGET_TM = int(os.getenv("DAILY_API_BUDGET_TM", "20000"))
+MATCH_REFRESH_DELAY_MINUTES = int(os.getenv("MATCH_REFRESH_DELAY_MINUTES", "120"))
+
+# Percenkénti API keret hostonként (FD free tier: 10 hívás / perc)
+MINUTE_API_BUDGET_FD = int(os.getenv("MINUTE_API_BUDGET_FD", "10"))
+MINUTE_API_BUDGET_TM = int(os.getenv("MINUTE_API_BUDGET_TM", "60"))
+
+# ETL futás heartbeat: ennyi mp-enként frissül; a ennyi mp óta néma 'running' futás árva
+ETL_RUN_HEARTBEAT_SECONDS = int(os.getenv("ETL_RUN_HEARTBEAT_SECONDS", "60"))
+ETL_RUN_EXPIRY_SECONDS = int(os.getenv("ETL_RUN_EXPIRY_SECONDS", "900"))
+
+# A futó ETL prioritási osztálya a közös API keretben (live, daily, enrichment, backfill)
+API_PRIORITY = os.getenv("API_PRIORITY")
+
+def get_db_engine(schema=None):
+    """
+    schema: a kapcsolatok search_path-ja (alapból DB_SCHEMA, ha az sincs, az élő séma).
+    """
     if not DB_PASSWORD or not DB_USER:
         raise ValueError("Hiányzó adatbázis konfiguráció! Ellenőrizd a .env fájlt.")
-        
+
+    schema = schema or DB_SCHEMA
+    if schema:
+        return create_engine(DATABASE_URI, connect_args={'options': f'-csearch_path={schema}'})
     return create_engine(DATABASE_URI)
\ No newline at end of file
@@ -1,23 +1,29 @@
-from prefect import flow, task
+from datetime import timezone
+from prefect import flow, task, serve
 from prefect import get_run_logger
+from prefect.deployments import run_deployment
 import subprocess
 import os
 import sys
 
+def etl_daily_command(*args):
+    python_executable = sys.executable
+    return [
+        python_executable,
+        os.path.join(os.path.dirname(__file__), "etl_daily.py"),
+        *args
+    ]
+
 @task(name="Run_Daily_ETL")
-def run_daily_etl():
+def run_daily_etl(*args):
     """
-    Lefuttatja az etl_daily.py-t az előző nap eseményeire.
+    Lefuttatja az etl_daily.py-t a megadott kapcsolókkal (alapból az előző nap teljes frissítése).
     """
-    python_executable = sys.executable
-    command = [
-        python_executable, 
-        os.path.join(os.path.dirname(__file__), "etl_daily.py")
-    ]
-    
+    command = etl_daily_command(*args)
+
     logger = get_run_logger()
-    logger.info("Napi ETL indítása...")
-    
+    logger.info(f"Napi ETL indítása: {' '.join(command)}")
+
     result = subprocess.run(command, capture_output=True, text=True, check=True)
     logger.info(f"stdout: {result.stdout}")
     return result.returncode
@@ -26,8 +32,53 @@ def run_daily_etl():
 def daily_update_flow():
     run_daily_etl()
 
+@flow(name="Meccs_Eredmeny_Frissites")
+def match_results_flow(date_from: str, date_to: str):
+    """
+    Könnyű frissítés: csak a megadott napok meccs eredményei (FD, TM hívás nélkül).
+    """
+    run_daily_etl("--scope", "matches", "--date-from", date_from, "--date-to", date_to)
+
+@flow(name="Jatekos_Szinkron")
+def player_sync_flow(shard: str = None):
+    """
+    Nehéz frissítés: csapatok és játékosok TM adatai (opcionálisan egy shard).
+    """
+    args = ["--scope", "players"]
+    if shard:
+        args += ["--shard", shard]
+    run_daily_etl(*args)
+
+DEPLOYMENTS = {
+    'matches': "Meccs_Eredmeny_Frissites/match-results-deployment",
+    'players': "Jatekos_Szinkron/player-sync-deployment",
+}
+
+@flow(name="Napi_Utemezes_00:05")
+def daily_planner_flow():
+    """
+    A nap meccsnaptára alapján ütemezi a meccs frissítéseket (várható lefújás után)
+    és a játékos szinkront (csendes ablakban), a napi API kereten belül.
+    """
+    # A tervező DB kapcsolatot nyit importkor, ezért csak futáskor töltjük be
+    from schedule_planner import plan_day
+    from utils import get_db_session
+
+    logger = get_run_logger()
+    for run in plan_day(get_db_session()):
+        logger.info(f"Ütemezve: {run.run_at:%Y-%m-%d %H:%M} UTC {run.job} {run.parameters} (~{run.api_calls} API hívás)")
+        run_deployment(
+            name=DEPLOYMENTS[run.job],
+            parameters=run.parameters,
+            scheduled_time=run.run_at.replace(tzinfo=timezone.utc),
+            timeout=0
+        )
+
 if __name__ == "__main__":
-    daily_update_flow.serve(
-        name="daily-etl-deployment",
-        cron="5 0 * * *"
-    )
\ No newline at end of file
+    serve(
+        daily_planner_flow.to_deployment(name="daily-planner-deployment", cron="5 0 * * *"),
+        match_results_flow.to_deployment(name="match-results-deployment"),
+        player_sync_flow.to_deployment(name="player-sync-deployment"),
+        # A régi teljes frissítés kézi indításra megmarad
+        daily_update_flow.to_deployment(name="daily-etl-deployment"),
+    )
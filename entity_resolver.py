@@ -0,0 +1,143 @@
+import re
+import unicodedata
+from models import DimTeam, DimCompetition, DimEntityAlias
+
+# Gyakori, megkülönböztetésre alkalmatlan szavak a klubnevekben
+STOP_TOKENS = {
+    'fc', 'afc', 'cf', 'sc', 'ac', 'as', 'ss', 'club', 'football', 'futbol', 'calcio',
+    'de', 'the', 'and', 'sv', 'vfb', 'vfl', 'fk', 'sk', 'cd', 'ud', 'sd', 'rc',
+}
+
+# Tartalék / utánpótlás / második csapatot jelölő szavak: ha csak az egyik névben
+# szerepelnek, a két név nem ugyanaz az entitás ('Real Madrid' / 'Real Madrid Castilla')
+DISTINGUISHING_TOKENS = {
+    'b', 'c', 'ii', 'iii', 'u17', 'u18', 'u19', 'u20', 'u21', 'u23', 'castilla', 'atletic',
+    'reserve', 'reserves', 'youth', 'juniors', 'academy', 'women', 'woman', 'ladies', 'femenino', 'feminin',
+}
+
+# Ennyi pont felett fogadjuk el a találatot
+MATCH_THRESHOLD = 0.75
+
+def normalize_name(name):
+    """
+    Kisbetű, ékezetek és írásjelek nélkül, a stop szavak elhagyásával.
+    Pl. 'Manchester United FC' -> 'manchester united'
+    """
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = text.replace('&', ' and ')
+    tokens = re.findall(r'[a-z0-9]+', text)
+    meaningful = [t for t in tokens if t not in STOP_TOKENS]
+    return ' '.join(meaningful or tokens)
+
+def token_key(norm):
+    """
+    Sorrendfüggetlen kulcs (pl. 'hotspur tottenham' == 'tottenham hotspur').
+    """
+    return ' '.join(sorted(set(norm.split())))
+
+def trigrams(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def conflicting_tokens(a, b):
+    """
+    Csak az egyik névben szereplő megkülönböztető tokenek (tartalék / utánpótlás jelölés vagy szám).
+    """
+    ta, tb = set(a.split()), set(b.split())
+    return {t for t in ta ^ tb if t in DISTINGUISHING_TOKENS or any(c.isdigit() for c in t)}
+
+def similarity(a, b):
+    """
+    Két normalizált név hasonlósága 0..1 között (token és trigram Dice átlaga).
+    Megkülönböztető token eltérésnél 0 (első csapat != tartalék / utánpótlás csapat).
+    """
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if conflicting_tokens(a, b):
+        return 0.0
+    ta, tb = set(a.split()), set(b.split())
+    token_score = 2 * len(ta & tb) / (len(ta) + len(tb))
+    ga, gb = trigrams(a), trigrams(b)
+    trigram_score = 2 * len(ga & gb) / (len(ga) + len(gb))
+    return (token_score + trigram_score) / 2
+
+def best_match(names, candidates, key=lambda c: c.get('name')):
+    """
+    A keresési találatok közül a neveinkhez leginkább hasonlót adja vissza
+    (találat, pontszám) formában, az első találat vak elfogadása helyett.
+    """
+    norms = [normalize_name(n) for n in names if n]
+    best, best_score = None, 0.0
+    for candidate in candidates or []:
+        cand_norm = normalize_name(key(candidate))
+        score = max((similarity(n, cand_norm) for n in norms), default=0.0)
+        if score > best_score:
+            best, best_score = candidate, score
+    return best, best_score
+
+class EntityResolver:
+    """
+    Helyi név -> entitás feloldás a már ismert DimTeam / DimCompetition sorok
+    és az alias tábla felett. Egyszer töltődik be, utána memóriából dolgozik.
+    Csak pontos (normalizált vagy sorrendfüggetlen token) egyezést fogad el: a
+    hasonló nevű, de más entitás (pl. tartalék csapat) összevonása a dimenziót
+    rontaná el; bizonytalan névnél a TM keresés TM ID alapján dönt.
+    Egy kulcshoz több entitás is tartozhat ('FC Barcelona' / 'Barcelona SC'),
+    ezek közül a hívó accept feltétele választ.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.exact = {'team': {}, 'competition': {}}
+        self.token_index = {'team': {}, 'competition': {}}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, session):
+        for team in session.query(DimTeam.team_id, DimTeam.name, DimTeam.short_name):
+            self.add('team', team.team_id, team.name, team.short_name)
+        for comp in session.query(DimCompetition.competition_id, DimCompetition.name):
+            self.add('competition', comp.competition_id, comp.name)
+        for alias in session.query(DimEntityAlias):
+            self.add(alias.entity_type, alias.entity_id, alias.alias)
+        self.loaded = True
+
+    def add(self, kind, entity_id, *names):
+        for name in names:
+            norm = normalize_name(name)
+            if not norm:
+                continue
+            for index, key in ((self.exact[kind], norm), (self.token_index[kind], token_key(norm))):
+                candidates = index.setdefault(key, [])
+                if entity_id not in candidates:
+                    candidates.append(entity_id)
+
+    def resolve(self, kind, *names, accept=None):
+        """
+        Entitás ID a nevek pontos (normalizált / token kulcs) egyezése alapján, különben None.
+        accept: feltétel a jelölt ID-re (pl. nincs ütköző TM / FD ID); a nem elfogadott
+        jelöltek kimaradnak, így a hívó a TM keresésre esik vissza.
+        """
+        for norm in (normalize_name(n) for n in names if n):
+            candidates = self.exact[kind].get(norm, []) + self.token_index[kind].get(token_key(norm), [])
+            for entity_id in candidates:
+                if accept is None or accept(entity_id):
+                    self.hits += 1
+                    return entity_id
+        self.misses += 1
+        return None
+
+    def remember(self, session, kind, entity_id, name, source):
+        """
+        Új alias felvétele az alias táblába és az indexbe (commit nélkül).
+        """
+        norm = normalize_name(name)
+        if not norm or norm in self.exact[kind]:
+            return
+        session.add(DimEntityAlias(entity_type=kind, entity_id=entity_id, alias=norm, source=source))
+        self.add(kind, entity_id, name)
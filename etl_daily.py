@@ -2,16 +2,28 @@ import time
 import argparse
 from datetime import datetime, timedelta
 from sqlalchemy.orm import sessionmaker
-from config import FD_API_KEY
+from config import FD_API_KEY, TRACKED_COMPETITIONS
 from models import (
-    DimSeason, DimCompetition, DimTeam, DimPlayer, FactMatch, 
+    DimCompetition, DimTeam, DimPlayer, FactMatch,
     FactMarketValue, FactTransfer, FactPlayerSeasonStat
 )
 from utils import (
-    get_db_session, logger, requests_get_retry, FD_HEADERS,
+    get_db_session, logger, log_tm_flight_stats, record_dead_letter, requests_get_retry, FD_HEADERS,
     fetch_tm_club_profile, fetch_tm_market_value, fetch_tm_transfers, fetch_tm_stats, fetch_tm_players_from_team,
-    get_or_create_player, get_season_from_TMname, get_or_create_team_by_tm_id, get_or_create_competition_by_tm_id
+    get_or_create_player, get_season_from_TMname, get_season_registry, snapshots,
+    get_or_create_team_by_tm_id, get_or_create_competition_by_tm_id
 )
+from season_registry import current_season_tm_name, parse_season_code
+from market_value_series import refresh_market_value_series
+from scd_history import set_team_financials, set_player_team
+from rows import transfer_row, market_value_row, season_stat_row, match_row, bulk_insert
+from etl_runs import etl_run
+from quota import set_priority
+from pipeline import Pipeline, Stage
+from sharding import parse_shard, run_process_pool
+from streaming import log_peak_rss
+from refresh_queue import refresh_queue, mark_refreshed, budgeted
+from validation import validate_batch
 
 session = get_db_session()
 
@@ -27,56 +39,75 @@ def get_current_season_tm_name():
     Kiszámolja az aktuális szezont TM formátumban (pl. '23/24').
     Feltételezzük, hogy július 1-től új szezon van.
     """
-    today = datetime.now()
-    year = today.year
-    if today.month < 7: # Ha év eleje van (pl. 2024 május), akkor a szezon 23/24
-        return f"{str(year-1)[-2:]}/{str(year)[-2:]}"
-    else: # Ha év vége (pl. 2024 augusztus), akkor 24/25
-        return f"{str(year)[-2:]}/{str(year+1)[-2:]}"
-
-def update_team_details(team):
+    return current_season_tm_name()
+
+def update_team_details(team, club_data=None):
     """
     Ellenőrzi és frissíti a csapat pénzügyi adatait (MarketValue, TransferRecord).
+    A club_data előre lekérhető (pipeline fetch szakasz), különben itt kérjük le.
     """
     if not team.tm_id:
         return
 
     logger.info(f"Csapat adatainak ellenőrzése: {team.name}...")
-    club_data = fetch_tm_club_profile(team.tm_id)
+    if club_data is None:
+        club_data = fetch_tm_club_profile(team.tm_id)
     if not club_data:
         return
 
-    changed = False
+    # Változatlan profil: nincs mit összehasonlítani
+    changes = snapshots.diff(session, 'team', 'club_profile', team.tm_id, club_data)
+    if changes is None:
+        logger.info(f"Csapat profil változatlan - {team.name}")
+        return
+
+    market_value = team.currentMarketValue
+    transfer_record = team.currentTransferRecord
     
     # Current Market Value ellenőrzés
     new_mv = club_data.get('currentMarketValue')
     if new_mv is not None and team.currentMarketValue != new_mv:
         logger.info(f"Csapat Market Value változott - {team.name}: {team.currentMarketValue} -> {new_mv}")
-        team.currentMarketValue = new_mv
-        changed = True
+        market_value = new_mv
 
     # Transfer Record ellenőrzés
     new_tr = club_data.get('currentTransferRecord')
     if new_tr is not None and team.currentTransferRecord != new_tr:
         logger.info(f"Csapat Transfer Record változott - {team.name}: {team.currentTransferRecord} -> {new_tr}")
-        team.currentTransferRecord = new_tr
-        changed = True
+        transfer_record = new_tr
 
-    if changed:
-        session.commit()
+    # Felülírás helyett új verzió (SCD type-2), az aktuális érték a DimTeam-ben is frissül
+    # A snapshot a csapat frissítésével együtt commitolódik (hibánál a rollback mindkettőt viszi)
+    updated = set_team_financials(session, team, market_value, transfer_record)
+    session.commit()
+    if updated:
         logger.info(f"Csapat adatok frissítve - {team.name}")
 
-def update_player_details(player, current_season_tm):
+def fetch_player_feeds(tm_id):
+    """
+    A játékos napi frissítéséhez szükséges TM feedek (csak HTTP, DB nélkül).
+    """
+    return {
+        'transfers': fetch_tm_transfers(tm_id),
+        'market_value': fetch_tm_market_value(tm_id),
+        'stats': fetch_tm_stats(tm_id),
+    }
+
+def update_player_details(player, current_season_tm, tracked_tm_ids, feeds=None):
     """
     Frissíti a játékos csapatát, piaci értékét, átigazolásait és statisztikáit.
+    A feeds előre lekérhető (pipeline fetch szakasz), különben itt kérjük le.
     """
 
     # Ha nincs TM ID, nem tudunk továbbmenni
     if not player.tm_id:
         return
 
+    if feeds is None:
+        feeds = fetch_player_feeds(player.tm_id)
+
     # Transfer History ellenőrzés (Új rekord)
-    tf_data = fetch_tm_transfers(player.tm_id)
+    tf_data = feeds['transfers']
     if tf_data and 'transfers' in tf_data:
         # Megnézzük a legutolsó bejegyzést az API-ban
         if(len(tf_data['transfers']) != 0):
@@ -93,31 +124,32 @@ def update_player_details(player, current_season_tm):
                 if not exists:
                     # Transfer adatok lekérdezése
                     season = get_season_from_TMname(latest_entry.get('season'))
-                    from_team_id = get_or_create_team_by_tm_id(latest_entry.get('clubFrom', {}).get('id'), latest_entry.get('clubFrom', {}).get('name'))
-                    to_team_id = get_or_create_team_by_tm_id(latest_entry.get('clubTo', {}).get('id'), latest_entry.get('clubTo', {}).get('name'))
-
-                    tf = FactTransfer(
-                        player_id=player.player_id,
-                        date_recorded=date_recorded,
-                        teamFrom_id=from_team_id,
-                        teamTo_id=to_team_id,
-                        season_id=season.season_id,
-                        market_value_eur=latest_entry.get('marketValue'),
-                        fee_eur=latest_entry.get('fee')
+                    club_from = latest_entry.get('clubFrom') or {}
+                    club_to = latest_entry.get('clubTo') or {}
+                    from_team_id = get_or_create_team_by_tm_id(club_from.get('id'), club_from.get('name'))
+                    to_team_id = get_or_create_team_by_tm_id(club_to.get('id'), club_to.get('name'))
+
+                    row = transfer_row(
+                        latest_entry, player.player_id, from_team_id, to_team_id,
+                        season.season_id if season else None
                     )
+                    # Hibás sor (pl. ismeretlen szezon) karanténba kerül, a klubtagság sem változik
+                    if validate_batch(session, FactTransfer, [row]):
+                        logger.info(f"Átigazolás - {player.name} (Régi: {row.teamFrom_id}, Új: {row.teamTo_id})")
+                        # Klubtagság új verziója az átigazolás napjától (SCD type-2)
+                        set_player_team(session, player, row.teamTo_id, row.date_recorded)
+                        session.commit()
 
-                    logger.info(f"Átigazolás - {player.name} (Régi: {tf.teamFrom_id}, Új: {tf.teamTo_id})")
-                    player.current_team_id = tf.teamTo_id
-                    session.commit()
-                    
-                    session.add(tf)
+                        session.add(FactTransfer(**row._asdict()))
+                        logger.info(f"Új Transfer rögzítve - {player.name}: {row.date_recorded},  {row.market_value_eur}")
                     session.commit()
-                    logger.info(f"Új Transfer rögzítve - {player.name}: {date_recorded},  {latest_entry.get('marketValue')}")
             except Exception as e:
+                session.rollback()
                 logger.error(f"Transfer Update Hiba: {e}")
+                record_dead_letter('player', player.tm_id, 'transfers', e)
 
     # Market Value ellenőrzés
-    mv_data = fetch_tm_market_value(player.tm_id)
+    mv_data = feeds['market_value']
     if mv_data and 'marketValueHistory' in mv_data:
         # Megnézzük a legutolsó bejegyzést az API-ban
         if(len(mv_data['marketValueHistory']) != 0):    
@@ -132,40 +164,41 @@ def update_player_details(player, current_season_tm):
                 ).first()
 
                 if not exists:
-                    mv = FactMarketValue(
-                        player_id=player.player_id,
-                        date_recorded=date_recorded,
-                        market_value_eur=latest_entry.get('marketValue'),
-                        team_id=player.current_team_id
-                    )
-                    session.add(mv)
+                    row = market_value_row(latest_entry, player.player_id, player.current_team_id)
+                    if validate_batch(session, FactMarketValue, [row]):
+                        session.add(FactMarketValue(**row._asdict()))
+                        session.flush()
+                        # Származtatott idősor táblák (havi, szezon, legfrissebb) frissítése
+                        refresh_market_value_series(session, [player.player_id])
+                        logger.info(f"Új Market Value rögzítve - {player.name}: {row.market_value_eur})")
                     session.commit()
-                    logger.info(f"Új Market Value rögzítve - {player.name}: {mv.market_value_eur})")
             except Exception as e:
+                session.rollback()
                 logger.error(f"Market Value Update Hiba: {e}")
+                record_dead_letter('player', player.tm_id, 'market_value', e)
 
-    # Statisztika Frissítése (CSAK PREMIER LEAGUE + IDEI SZEZON)
-    stats_data = fetch_tm_stats(player.tm_id)
+    # Statisztika Frissítése (CSAK KÖVETETT BAJNOKSÁGOK + IDEI SZEZON)
+    stats_data = feeds['stats']
     
     if stats_data and 'stats' in stats_data:
+        current_team = session.get(DimTeam, player.current_team_id) if player.current_team_id else None
         for entry in stats_data['stats']:
             # Szűrés: Szezon
             if entry.get('seasonId') != current_season_tm:
                 continue
 
-            # Szűrés: Bajnokság (Premier League)
+            # Szűrés: Bajnokság (követett bajnokságok TM kódjai)
             comp_tm_id = entry.get('competitionId')
-            if comp_tm_id != "GB1":  # Premier League TM kódja
+            if comp_tm_id not in tracked_tm_ids:
                 continue
 
             # Szűrés: Jelenlegi csapat
-            current_team_tm_id = session.query(DimTeam).filter_by(team_id=player.current_team_id).first().tm_id
-            if int(entry.get('clubId')) != int(current_team_tm_id):
+            if not current_team or not current_team.tm_id or str(entry.get('clubId')) != str(current_team.tm_id):
                 continue
 
-            # Megtaláltuk a PL idei statisztikáját. Keressük meg a DB-ben.
+            # Megtaláltuk az idei statisztikát. Keressük meg a DB-ben.
             # Először kell a szezon objektum ID-ja
-            season_db = session.query(DimSeason).filter_by(season_name_TM=current_season_tm).first()
+            season_db = get_season_registry().by_tm_name.get(current_season_tm)
             if not season_db: continue
 
             competition = get_or_create_competition_by_tm_id(entry.get('competitionId'),entry.get('competitionName'))
@@ -176,13 +209,19 @@ def update_player_details(player, current_season_tm):
                 competition_id=competition.competition_id
             ).first()
 
-            # Adatok az API-ból
-            api_apps = entry.get('appearances')
-            api_goals = entry.get('goals')
-            api_assists = entry.get('assists')
-            api_yellow_cards = entry.get('yellowCards')
-            api_red_cards = entry.get('redCards')
-            api_minutes = entry.get('minutesPlayed')
+            # Adatok az API-ból (normalizálva és validálva; a hibás sor karanténba kerül)
+            row = season_stat_row(
+                entry, player.player_id, player.current_team_id, season_db.season_id, competition.competition_id
+            )
+            if not validate_batch(session, FactPlayerSeasonStat, [row]):
+                session.commit()
+                continue
+            api_apps = row.appearances
+            api_goals = row.goals
+            api_assists = row.assists
+            api_yellow_cards = row.yellow_cards
+            api_red_cards = row.red_cards
+            api_minutes = row.minutes_played
 
             if stat_record:
                 # Összehasonlítás: Ha változott, frissítjük
@@ -194,7 +233,7 @@ def update_player_details(player, current_season_tm):
                     stat_record.red_cards != api_red_cards
                     ):
                     
-                    logger.info(f"Statisztika frissítése: {player.name} (PL, {current_season_tm})\nApps: {stat_record.appearances} -> {api_apps}\nGoals: {stat_record.goals} -> {api_goals}\nAssists: {stat_record.assists} -> {api_assists}\nMins: {stat_record.minutes_played} -> {api_minutes}\nYellows: {stat_record.yellow_cards} -> {api_yellow_cards}\nReds: {stat_record.red_cards} -> {api_red_cards}")
+                    logger.info(f"Statisztika frissítése: {player.name} ({comp_tm_id}, {current_season_tm})\nApps: {stat_record.appearances} -> {api_apps}\nGoals: {stat_record.goals} -> {api_goals}\nAssists: {stat_record.assists} -> {api_assists}\nMins: {stat_record.minutes_played} -> {api_minutes}\nYellows: {stat_record.yellow_cards} -> {api_yellow_cards}\nReds: {stat_record.red_cards} -> {api_red_cards}")
                     stat_record.appearances = api_apps
                     stat_record.goals = api_goals
                     stat_record.assists = api_assists
@@ -204,104 +243,251 @@ def update_player_details(player, current_season_tm):
                     session.commit()
             else:
                 # Ha még nincs rekord erre a szezonra, létrehozzuk
-                new_stat = FactPlayerSeasonStat(
-                    player_id=player.player_id,
-                    team_id=player.team_id,
-                    season_id=season_db.season_id,
-                    competition_id=competition.competition_id,
-                    appearances=api_apps,
-                    goals=api_goals,
-                    assists=api_assists,
-                    minutes_played=api_minutes,
-                    yellow_cards=api_yellow_cards,
-                    red_cards=api_red_cards
-                )
-                session.add(new_stat)
+                session.add(FactPlayerSeasonStat(**row._asdict()))
                 session.commit()
-                logger.info(f"Új PL statisztika létrehozva: {player.name}")
+                logger.info(f"Új statisztika létrehozva: {player.name} ({comp_tm_id})")
+
+
+def fetch_fd_matches(competition_codes, date_from, date_to, batch_size=10):
+    """
+    Meccsek lekérése több bajnokságra egyszerre (FD /matches?competitions=...).
+    Bajnokságonkénti hívás helyett batch-enként egy kérés megy ki.
+    """
+    matches = []
+    for i in range(0, len(competition_codes), batch_size):
+        codes = ','.join(competition_codes[i:i + batch_size])
+        url = f"http://api.football-data.org/v4/matches?competitions={codes}&dateFrom={date_from}&dateTo={date_to}"
+        resp = requests_get_retry(url, headers=FD_HEADERS)
+        if not resp or resp.status_code != 200:
+            logger.error(f"Nem sikerült lekérni a meccseket: {codes}")
+            return None
+        matches.extend(resp.json().get('matches', []))
+    return matches
+
+def get_season_for_match(match_data, default_season):
+    """
+    A meccs szezonja az FD 'season.startDate' alapján (naptári éves bajnokságokhoz is).
+    """
+    start_date = (match_data.get('season') or {}).get('startDate')
+    start_year = parse_season_code(start_date)
+    if start_year is not None:
+        season = get_season_registry().by_start_year.get(start_year)
+        if season:
+            return season
+    return default_season
+
+def update_matches(matches, competitions_by_code, default_season):
+    """
+    A lefutott meccsek mentése, ha még nincsenek a DB-ben. Az új meccsek egy
+    batch-ben validálódnak és töltődnek be, a hibás sorok karanténba kerülnek.
+    """
+    rows, names = [], {}
+    for match_data in matches:
+        if match_data['status'] != 'FINISHED':
+            continue
+
+        fd_match_id = match_data['id']
+        
+        # Ellenőrzés: megvan-e már?
+        exists = session.query(FactMatch).filter_by(fd_match_id=fd_match_id).first()
+        if exists:
+            continue
+
+        competition_obj = competitions_by_code.get((match_data.get('competition') or {}).get('code'))
+        if competition_obj is None:
+            logger.warning(f"Ismeretlen bajnokság a meccsben: {fd_match_id}")
+            continue
+
+        # Mivel ez daily update, feltételezzük, hogy a csapatok már megvannak.
+        # DB csapatok keresése FD ID alapján
+        home_team = session.query(DimTeam).filter_by(fd_id=match_data['homeTeam']['id']).first()
+        away_team = session.query(DimTeam).filter_by(fd_id=match_data['awayTeam']['id']).first()
+        
+        if home_team and away_team:
+            season_obj = get_season_for_match(match_data, default_season)
+            rows.append(match_row(
+                match_data, season_obj.season_id if season_obj else None, competition_obj.competition_id,
+                home_team.team_id, away_team.team_id
+            ))
+            names[fd_match_id] = f"{home_team.name} vs {away_team.name} ({competition_obj.fd_id})"
+        else:
+            logger.warning(f"Ismeretlen csapatok a meccsben: {fd_match_id}")
+            record_dead_letter('match', fd_match_id, 'match', "Ismeretlen csapatok a meccsben")
+
+    # Match mentése
+    valid = validate_batch(session, FactMatch, rows)
+    bulk_insert(session, FactMatch, valid)
+    session.commit()
+    for row in valid:
+        logger.info(f"Meccs feldolgozva: {names[row.fd_match_id]}")
+
+def update_player_ref(player_ref, current_season_tm, tracked_tm_ids, feeds=None):
+    """
+    A játékos ORM objektuma csak a saját frissítése idejére van a sessionben,
+    utána kikerül az identity mapből (a memória nem nő a feldolgozott játékosokkal).
+    """
+    if feeds is None:
+        feeds = fetch_player_feeds(player_ref.tm_id)
+    player = session.get(DimPlayer, player_ref.player_id)
+    if player is None:
+        return
+    try:
+        update_player_details(player, current_season_tm, tracked_tm_ids, feeds)
+    finally:
+        if player in session:
+            session.expunge(player)
 
+    # A sikeresen lekért feedek frissítési ideje (a feed szintű hibák dead-letterbe kerültek)
+    for feed, data in feeds.items():
+        if data is not None:
+            mark_refreshed(session, [player_ref.player_id], feed)
+    session.commit()
 
 # --- FŐ FÜGGVÉNY ---
 
-def run_daily_etl():
+def safe_update(entity_type, entity_key, fn, *args):
+    """
+    Egy entitás frissítése úgy, hogy a hibája ne állítsa le a futást:
+    rollback és dead-letter bejegyzés, amit a retry parancs újra feldolgoz.
+    """
+    try:
+        fn(*args)
+    except Exception as e:
+        session.rollback()
+        record_dead_letter(entity_type, entity_key, 'daily_update', e)
+
+def run_daily_pipeline(name, items, fetch_fn, apply_fn, workers):
+    """
+    Párhuzamos TM lekérés (csak tm_id alapján) és egy szálú DB frissítés.
+    Az ORM objektumokat csak az apply szakasz használja (a session nem szálbiztos).
+    """
+    pipeline = Pipeline(name, items, [
+        Stage('fetch', lambda item: (item[0], fetch_fn(item[1])), workers=workers, queue_size=workers * 4),
+        Stage('apply', lambda item: apply_fn(*item), queue_size=workers * 4),
+    ])
+    pipeline.run()
+
+def run_daily_etl(competition_codes=None, workers=1, shard=None, scope='all', date_from=None, date_to=None,
+                  time_budget=None):
+    """
+    scope: 'all' (teljes frissítés), 'matches' (csak meccs eredmények, TM hívás nélkül)
+    vagy 'players' (csak csapat / játékos szinkron). A meccsek alapból a tegnapi napra.
+    """
     yesterday_str = get_yesterday()
-    logger.info(f"--- NAPI ETL INDÍTÁSA: {yesterday_str} ---")
+    date_from = date_from or yesterday_str
+    date_to = date_to or date_from
+    logger.info(f"--- NAPI ETL INDÍTÁSA ({scope}): {date_from} - {date_to} ---")
     
     current_season_tm = get_current_season_tm_name()
     logger.info(f"Aktuális szezon (TM): {current_season_tm}")
 
-    # Csapatok frissítése
-    teams_query = session.query(DimTeam).filter(DimTeam.tm_id.isnot(None)).filter(DimTeam.team_id <= 21)
-    teams = teams_query.all()
+    # Követett bajnokságok (config: TRACKED_COMPETITIONS)
+    competition_codes = competition_codes or TRACKED_COMPETITIONS
+    competitions = session.query(DimCompetition).filter(DimCompetition.fd_id.in_(competition_codes)).all()
+    competitions_by_code = {comp.fd_id: comp for comp in competitions}
+    tracked_tm_ids = {comp.tm_id for comp in competitions if comp.tm_id}
+    logger.info(f"Követett bajnokságok: {', '.join(competition_codes)} (TM: {', '.join(sorted(tracked_tm_ids))})")
+
+    missing = set(competition_codes) - set(competitions_by_code)
+    if missing:
+        logger.warning(f"Nincs betöltve a DB-be: {', '.join(sorted(missing))} (előbb season load kell)")
+
+    # Shardolt futásnál a csapatokat és a meccseket csak a 0. shard frissíti
+    primary = shard is None or shard[0] == 0
+    sync_players = scope in ('all', 'players')
+    sync_matches = primary and scope in ('all', 'matches')
+
+    # Csapatok frissítése (a követett bajnokságok csapatai)
+    teams_query = session.query(DimTeam).filter(DimTeam.tm_id.isnot(None)).filter(
+        DimTeam.competition_id.in_([comp.competition_id for comp in competitions])
+    )
+    teams = teams_query.all() if primary and sync_players else []
     logger.info(f"Összesen {len(teams)} csapat részleteinek frissítése indul...")
 
-    for i, team in enumerate(teams):
-        logger.info(f"[{i+1}/{len(teams)}] Feldolgozás: {team.name}...")
-        update_team_details(team)
-
-    # Játékosok frissítése
-    players_query = session.query(DimPlayer).filter(DimPlayer.tm_id.isnot(None))
-    players = players_query.all()
-    logger.info(f"Összesen {len(players)} játékos részleteinek frissítése indul...")
+    if workers > 1:
+        run_daily_pipeline('daily_teams', [(team, team.tm_id) for team in teams], fetch_tm_club_profile,
+                           lambda team, club_data: safe_update('team', team.tm_id, update_team_details, team, club_data),
+                           workers)
+    else:
+        for i, team in enumerate(teams):
+            logger.info(f"[{i+1}/{len(teams)}] Feldolgozás: {team.name}...")
+            safe_update('team', team.tm_id, update_team_details, team)
+
+    # Játékosok frissítése a legsürgősebbel kezdve; idő / TM keret fogytán a többi a következő futásra marad
+    queue = refresh_queue(session, shard) if sync_players else []
+    session.commit()
+    total = len(queue)
+    shard_info = f" (shard {shard[0]}/{shard[1]})" if shard else ""
+    logger.info(f"Összesen {total} játékos részleteinek frissítése indul prioritás szerint{shard_info}...")
+    players = budgeted(queue, time_budget)
+
+    def apply_player(player_ref, feeds=None):
+        safe_update('player', player_ref.tm_id, update_player_ref, player_ref, current_season_tm, tracked_tm_ids, feeds)
+
+    if workers > 1:
+        run_daily_pipeline('daily_players', ((ref, ref.tm_id) for ref in players), fetch_player_feeds, apply_player, workers)
+    else:
+        for i, player_ref in enumerate(players):
+            logger.info(f"[{i+1}/{total}] Feldolgozás: {player_ref.name}...")
+            apply_player(player_ref)
 
-    for i, player in enumerate(players):
-        logger.info(f"[{i+1}/{len(players)}] Feldolgozás: {player.name}...")
-        update_player_details(player, current_season_tm)
+    if sync_players:
+        log_peak_rss('daily_players')
 
-    # Meccsek lekérése tegnapról (Football-Data API)
-    # Csak PL (2021-es kód)
-    COMPETITION_CODE = "PL" 
-    
-    url = f"http://api.football-data.org/v4/competitions/{COMPETITION_CODE}/matches?dateFrom={yesterday_str}&dateTo={yesterday_str}"
-    resp = requests_get_retry(url, headers=FD_HEADERS)
-    
-    if resp and resp.status_code == 200:
-        matches = resp.json().get('matches', [])
-        logger.info(f"Tegnapi mérkőzések száma: {len(matches)}")
+    if not sync_matches:
+        log_tm_flight_stats()
+        logger.info("Napi ETL (shard / játékos szinkron) sikeresen befejeződött.")
+        return
 
-        season_obj = session.query(DimSeason).filter_by(season_name_TM=current_season_tm).first()
-        competition_obj = session.query(DimCompetition).filter_by(fd_id=COMPETITION_CODE).first()
-        
-        for match_data in matches:
-            if match_data['status'] == 'FINISHED':
-                fd_match_id = match_data['id']
-                
-                # Ellenőrzés: megvan-e már?
-                exists = session.query(FactMatch).filter_by(fd_match_id=fd_match_id).first()
-                if not exists:
-                    # Itt kéne a teljes FactMatch mentés logika (csapatok keresése, stb.)
-                    # Mivel ez daily update, feltételezzük, hogy a csapatok már megvannak.
-                    
-                    # DB csapatok keresése FD ID alapján
-                    home_team = session.query(DimTeam).filter_by(fd_id=match_data['homeTeam']['id']).first()
-                    away_team = session.query(DimTeam).filter_by(fd_id=match_data['awayTeam']['id']).first()
-                    
-                    if home_team and away_team:
-                        # Match mentése
-                        match_fact = FactMatch(
-                            fd_match_id=fd_match_id,
-                            date=datetime.strptime(match_data['utcDate'], "%Y-%m-%dT%H:%M:%SZ"),
-                            season_id=season_obj.season_id,
-                            competition_id=competition_obj.competition_id,
-                            home_team_id=home_team.team_id,
-                            away_team_id=away_team.team_id,
-                            home_score=match_data['score']['fullTime']['home'],
-                            away_score=match_data['score']['fullTime']['away'],
-                            status=match_data['status']
-                        )
-                        session.add(match_fact)
-                        session.commit()
-                        logger.info(f"Meccs feldolgozva: {home_team.name} vs {away_team.name}")
-                    else:
-                        logger.warning(f"Ismeretlen csapatok a meccsben: {fd_match_id}")
-    else:
-        logger.error("Nem sikerült lekérni a tegnapi meccseket.")
+    # Meccsek lekérése (Football-Data API), minden követett bajnokságra batch-elve
+    matches = fetch_fd_matches(list(competitions_by_code), date_from, date_to)
+    if matches is None:
+        logger.error("Nem sikerült lekérni a meccseket.")
         return
 
+    logger.info(f"Mérkőzések száma ({date_from} - {date_to}): {len(matches)}")
+    season_obj = get_season_registry().by_tm_name.get(current_season_tm)
+    update_matches(matches, competitions_by_code, season_obj)
+
+    log_tm_flight_stats()
     logger.info("Napi ETL sikeresen befejeződött.")
 
+def run_daily_shard_process(shard, competition_codes, workers, time_budget=None):
+    """
+    Process pool belépési pont: egy shard saját ETL futásként.
+    """
+    set_priority('daily')
+    try:
+        with etl_run(session, f"daily[{shard[0]}/{shard[1]}]"):
+            run_daily_etl(competition_codes=competition_codes, workers=workers, shard=shard, time_budget=time_budget)
+    except Exception as e:
+        logger.error(f"Hiba a napi ETL során (shard {shard[0]}/{shard[1]}): {e}")
+        raise
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Napi frissítés a követett bajnokságokra.")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="Párhuzamos TM lekérések száma (1 = soros futás).")
+    parser.add_argument('-c', '--competitions', type=str, help="FD bajnokság kódok vesszővel (pl. PL,BL1,SA). Alapértelmezett: TRACKED_COMPETITIONS.")
+    parser.add_argument('--shard', type=str, help="Csak ez a játékos shard: i/N (tm_id % N == i). Csapatok/meccsek csak a 0. shardban.")
+    parser.add_argument('-p', '--processes', type=int, default=1, help="Lokális process pool: N folyamat, mindegyik egy shard.")
+    parser.add_argument('--scope', choices=['all', 'matches', 'players'], default='all', help="Teljes frissítés, csak meccs eredmények vagy csak játékos szinkron.")
+    parser.add_argument('--date-from', type=str, help="Meccsek kezdő dátuma (YYYY-MM-DD). Alapértelmezett: tegnap.")
+    parser.add_argument('--date-to', type=str, help="Meccsek záró dátuma (YYYY-MM-DD). Alapértelmezett: --date-from.")
+    parser.add_argument('--time-budget', type=int, metavar='PERC', help="Időkeret percben a játékos szinkronra: utána a sor többi része a következő futásra marad.")
+    args = parser.parse_args()
+
+    competition_codes = args.competitions.split(',') if args.competitions else None
+    # A meccs eredmények élveznek elsőbbséget a közös API keretben
+    set_priority('live' if args.scope == 'matches' else 'daily')
+    time_budget = args.time_budget * 60 if args.time_budget else None
     try:
-        run_daily_etl()
+        if args.processes > 1:
+            ok = run_process_pool(run_daily_shard_process, args.processes, competition_codes, args.workers, time_budget)
+            exit(0 if ok else 1)
+        shard = parse_shard(args.shard) if args.shard else None
+        job = 'daily' if args.scope == 'all' else f"daily_{args.scope}"
+        with etl_run(session, job):
+            run_daily_etl(competition_codes=competition_codes, workers=args.workers, shard=shard,
+                          scope=args.scope, date_from=args.date_from, date_to=args.date_to, time_budget=time_budget)
     except Exception as e:
-        logger.error(f"Hiba a napi ETL során: {e}")
\ No newline at end of file
+        logger.error(f"Hiba a napi ETL során: {e}")
@@ -1,47 +1,143 @@
 # etl_player_data.py
 import time
 import argparse
-from datetime import datetime
+from collections import namedtuple
+from datetime import date, datetime
 from models import (
     DimPlayer, FactMarketValue, FactTransfer, FactPlayerSeasonStat
 )
 from utils import (
-    get_db_session, logger, fetch_tm_market_value, fetch_tm_transfers, fetch_tm_stats,
+    get_db_session, logger, log_tm_flight_stats, iter_tm_player_feed, record_dead_letter,
     get_season_from_TMname, get_or_create_team_by_tm_id, get_or_create_competition_by_tm_id
 )
+from market_value_series import refresh_market_value_series
+from scd_history import record_transfers, backfill_history
+from rows import (
+    date_or_raw, market_value_row, transfer_row, season_stat_row, bulk_insert
+)
+from etl_runs import etl_run
+from quota import estimate_player_details, report_estimate
+from pipeline import Pipeline, Stage
+from cold_load import (
+    prepare_staging, copy_valid_rows, load_player_details_from_staging,
+    market_value_staging_rows, transfer_staging_rows, season_stat_staging_rows
+)
+from sharding import parse_shard, shard_filter, run_process_pool, run_leased_shards
+from streaming import iter_keyset, log_peak_rss
+from refresh_queue import refresh_queue, mark_refreshed, budgeted
+from validation import validate_rows, validate_batch, quarantine
 
 session = get_db_session()
 
+# A pipeline szálai között ORM objektum helyett ez utazik
+PlayerRef = namedtuple('PlayerRef', ['player_id', 'tm_id', 'name'])
+
+PLAYER_FEEDS = {
+    'market_value': 'marketValueHistory',
+    'transfers': 'transfers',
+    'stats': 'stats',
+}
+
+# --- TRANSZFORMÁCIÓ: API bejegyzések -> új sorok ---
+
+def build_market_value_rows(player, entries):
+    """
+    Az új (még nem mentett) piaci érték sorok a bejegyzésekből.
+    """
+    # Duplikáció ellenőrzése: a meglévő dátumokat egyszerre kérjük le
+    existing = {
+        d for (d,) in session.query(FactMarketValue.date_recorded).filter_by(player_id=player.player_id)
+    }
+
+    rows = []
+    for entry in entries:
+        try:
+            date_recorded = date_or_raw(entry.get('date'))
+            if date_recorded in existing:
+                continue
+
+            # Csapat keresése (TM ID alapján)
+            team_id = get_or_create_team_by_tm_id(entry.get('clubId'), entry.get('clubName'))
+            rows.append(market_value_row(entry, player.player_id, team_id))
+            existing.add(date_recorded)
+        except ValueError as e:
+            logger.warning(f"Hibás piaci érték bejegyzés kihagyva - {player.name}: {e}")
+    return rows
+
+def build_transfer_rows(player, entries):
+    """
+    Az új (még nem mentett) átigazolás sorok a bejegyzésekből.
+    """
+    # Duplikáció ellenőrzése: a meglévő dátumokat egyszerre kérjük le
+    existing = {
+        d for (d,) in session.query(FactTransfer.date_recorded).filter_by(player_id=player.player_id)
+    }
+
+    rows = []
+    for entry in entries:
+        try:
+            date_recorded = date_or_raw(entry.get('date'))
+            if date_recorded in existing:
+                continue
+
+            season = get_season_from_TMname(entry.get('season'))
+            club_from = entry.get('clubFrom') or {}
+            club_to = entry.get('clubTo') or {}
+            from_team_id = get_or_create_team_by_tm_id(club_from.get('id'), club_from.get('name'))
+            to_team_id = get_or_create_team_by_tm_id(club_to.get('id'), club_to.get('name'))
+
+            rows.append(transfer_row(
+                entry, player.player_id, from_team_id, to_team_id,
+                season.season_id if season else None
+            ))
+            existing.add(date_recorded)
+        except ValueError as e:
+            logger.warning(f"Hibás átigazolás bejegyzés kihagyva - {player.name}: {e}")
+    return rows
+
+def build_season_stat_rows(player, entries):
+    """
+    Az új (még nem mentett) szezon statisztika sorok a bejegyzésekből.
+    """
+    # Duplikáció ellenőrzése: a meglévő (szezon, bajnokság) párokat egyszerre kérjük le
+    existing = {
+        (season_id, competition_id) for season_id, competition_id in
+        session.query(FactPlayerSeasonStat.season_id, FactPlayerSeasonStat.competition_id)
+        .filter_by(player_id=player.player_id)
+    }
+
+    rows = []
+    for entry in entries:
+        try:
+            # Szezon és bajnokság lekérése (ismeretlen szezon: None, a validálás karanténba teszi)
+            season = get_season_from_TMname(entry.get('seasonId'))
+            comp = get_or_create_competition_by_tm_id(entry.get('competitionId'), entry.get('competitionName'))
+
+            key = (season.season_id if season else None, comp.competition_id if comp else None)
+            if key in existing:
+                continue
+
+            # Csapat keresése (TM ID alapján)
+            team_id = get_or_create_team_by_tm_id(entry.get('clubId'), None)
+            rows.append(season_stat_row(entry, player.player_id, team_id, *key))
+            existing.add(key)
+        except ValueError as e:
+            logger.warning(f"Hibás statisztika bejegyzés kihagyva - {player.name}: {e}")
+    return rows
+
+# --- SOROS FELDOLGOZÁS ---
+
 def process_player_market_values(player):
     """
     Feldolgozza és menti a piaci érték történetet.
     """
     logger.info(f"Market Values lekérése: {player.name} (TM ID: {player.tm_id})")
-    
-    data = fetch_tm_market_value(player.tm_id)
-    if not data or 'marketValueHistory' not in data:
-        return
 
-    count = 0
-    for entry in data['marketValueHistory']:
-        # Duplikáció ellenőrzése
-        exists = session.query(FactMarketValue).filter_by(
-            player_id=player.player_id, 
-            date_recorded=entry.get('date')
-        ).first()
-        
-        if not exists:
-            # Csapat keresése (TM ID alapján)
-            team_id = get_or_create_team_by_tm_id(entry.get('clubId'), entry.get('clubName'))
-            mv = FactMarketValue(
-                player_id=player.player_id,
-                date_recorded=entry.get('date'),
-                market_value_eur=entry.get('marketValue'),
-                team_id=team_id
-            )
-            session.add(mv)
-            count += 1
-            
+    rows = build_market_value_rows(player, iter_tm_player_feed(player.tm_id, 'market_value', 'marketValueHistory'))
+    count = bulk_insert(session, FactMarketValue, validate_batch(session, FactMarketValue, rows))
+    if count:
+        # Származtatott idősor táblák (havi, szezon, legfrissebb) frissítése
+        refresh_market_value_series(session, [player.player_id])
     session.commit()
     logger.info(f"{player.name} (ID: {player.player_id}) {count} új piaci érték bejegyzés mentve.")
 
@@ -50,37 +146,12 @@ def process_player_transfers(player):
     Feldolgozza és menti az átigazolásokat.
     """
     logger.info(f"Transfers lekérése: {player.name}")
-    
-    data = fetch_tm_transfers(player.tm_id)
-    if not data or 'transfers' not in data:
-        return
-
-    count = 0
-    for entry in data['transfers']:
-        # Duplikáció ellenőrzése
-        exists = session.query(FactTransfer).filter_by(
-            player_id=player.player_id,
-            date_recorded=entry.get('date')
-        ).first()
-
-        if not exists:
-            season = get_season_from_TMname(entry.get('season'))
-
-            from_team_id = get_or_create_team_by_tm_id(entry.get('clubFrom', {}).get('id'), entry.get('clubFrom', {}).get('name'))
-            to_team_id = get_or_create_team_by_tm_id(entry.get('clubTo', {}).get('id'), entry.get('clubTo', {}).get('name'))
-
-            tf = FactTransfer(
-                player_id=player.player_id,
-                date_recorded=entry.get('date'),
-                teamFrom_id=from_team_id,
-                teamTo_id=to_team_id,
-                season_id=season.season_id,
-                market_value_eur=entry.get('marketValue'),
-                fee_eur=entry.get('fee')
-            )
-            session.add(tf)
-            count += 1
 
+    rows = build_transfer_rows(player, iter_tm_player_feed(player.tm_id, 'transfers', 'transfers'))
+    rows = validate_batch(session, FactTransfer, rows)
+    count = bulk_insert(session, FactTransfer, rows)
+    # Klubtagság verziók az átigazolásokból (SCD type-2)
+    record_transfers(session, rows)
     session.commit()
     logger.info(f"{player.name} (ID: {player.player_id}) {count} új átigazolás mentve.")
 
@@ -89,70 +160,272 @@ def process_player_season_stats(player):
     Szezonális statisztikák betöltése.
     """
     logger.info(f"Season stats lekérése: {player.name} (TM ID: {player.tm_id})")
-    
-    data = fetch_tm_stats(player.tm_id)
-    if not data or 'stats' not in data:
-        return
 
-    count = 0
-    for entry in data['stats']:
-        # Szezon és bajnokság lekérése
-        season = get_season_from_TMname(entry.get('seasonId'))
-        comp = get_or_create_competition_by_tm_id(entry.get('competitionId'),entry.get('competitionName'))
-        
-        # Duplikáció ellenőrzése
-        exists = session.query(FactPlayerSeasonStat).filter_by(
-            player_id=player.player_id, 
-            season_id=season.season_id,
-            competition_id=comp.competition_id
-        ).first()
-        
-        if not exists:
-            # Csapat keresése (TM ID alapján)
-            team_id = get_or_create_team_by_tm_id(entry.get('clubId'), None)
-            mv = FactPlayerSeasonStat(
-                player_id=player.player_id,
-                team_id=team_id,
-                season_id=season.season_id,
-                competition_id=comp.competition_id,
-                appearances=entry.get('appearances'),
-                goals=entry.get('goals'),
-                assists=entry.get('assists'),
-                yellow_cards=entry.get('yellowCards'),
-                red_cards=entry.get('redCards'),
-                minutes_played=entry.get('minutesPlayed')
-            )
-            session.add(mv)
-            count += 1
-            
+    rows = build_season_stat_rows(player, iter_tm_player_feed(player.tm_id, 'stats', 'stats'))
+    count = bulk_insert(session, FactPlayerSeasonStat, validate_batch(session, FactPlayerSeasonStat, rows))
     session.commit()
     logger.info(f"{player.name} (ID: {player.player_id}) {count} új szezon bajnoksági statisztika mentve.")
 
-def run_player_details_etl(limit=None):
+PROCESSORS = {
+    'market_value': process_player_market_values,
+    'transfers': process_player_transfers,
+    'stats': process_player_season_stats,
+}
+
+def process_player(player, feeds=PROCESSORS):
+    """
+    A játékos feedjeinek feldolgozása. Egy feed hibája nem állítja le a futást:
+    rollback és dead-letter bejegyzés, amit a retry parancs újra feldolgoz.
+    """
+    refreshed = []
+    for feed in feeds:
+        try:
+            PROCESSORS[feed](player)
+            refreshed.append(feed)
+        except Exception as e:
+            session.rollback()
+            record_dead_letter('player', player.tm_id, feed, e)
+
+    # A sikeres feedek frissítési ideje (a frissítési sor ebből számolja az elavultságot)
+    for feed in refreshed:
+        mark_refreshed(session, [player.player_id], feed)
+    session.commit()
+
+# --- PIPELINE FELDOLGOZÁS ---
+
+def fetch_player_feeds(player):
+    """
+    Fetch szakasz: a játékos három TM feedje (csak HTTP, DB nélkül).
+    A sikertelenül lekért feed None (dead-letter), így nem jelölődik frissnek.
+    """
+    feeds = {}
+    for feed, key in PLAYER_FEEDS.items():
+        try:
+            feeds[feed] = list(iter_tm_player_feed(player.tm_id, feed, key))
+        except Exception as e:
+            record_dead_letter('player', player.tm_id, feed, e)
+            feeds[feed] = None
+    return player, feeds
+
+def transform_player_feeds(item):
+    """
+    Transzformációs szakasz: FK feloldás és az új sorok összerakása.
+    Kimenet: (játékos, piaci érték, átigazolás, statisztika sorok, sikeresen lekért feedek).
+    """
+    player, feeds = item
+    try:
+        return (
+            player,
+            build_market_value_rows(player, feeds['market_value'] or []),
+            build_transfer_rows(player, feeds['transfers'] or []),
+            build_season_stat_rows(player, feeds['stats'] or []),
+            [feed for feed, entries in feeds.items() if entries is not None],
+        )
+    except Exception as e:
+        session.rollback()
+        record_dead_letter('player', player.tm_id, 'transform', e)
+        return None
+
+def validate_player_rows(item):
+    """
+    Validációs szakasz: a játékos sorainak ellenőrzése (DB nélkül), a hibás sorok
+    a karantén listába kerülnek, amit az író szakasz ment.
+    """
+    player, mv_rows, tf_rows, st_rows, fetched = item
+    mv_rows, mv_rejected = validate_rows(FactMarketValue, mv_rows)
+    tf_rows, tf_rejected = validate_rows(FactTransfer, tf_rows)
+    st_rows, st_rejected = validate_rows(FactPlayerSeasonStat, st_rows)
+    return player, mv_rows, tf_rows, st_rows, mv_rejected + tf_rejected + st_rejected, fetched
+
+def make_player_writer(write_session):
+    """
+    Író szakasz: több játékos sorai (és a karanténba került sorok) egy tranzakcióban, Core bulk inserttel.
+    """
+    def write(batch):
+        mv_rows = [row for _, rows, _, _, _, _ in batch for row in rows]
+        try:
+            bulk_insert(write_session, FactMarketValue, mv_rows)
+            tf_rows = [row for _, _, rows, _, _, _ in batch for row in rows]
+            bulk_insert(write_session, FactTransfer, tf_rows)
+            record_transfers(write_session, tf_rows)
+            bulk_insert(write_session, FactPlayerSeasonStat, [row for _, _, _, rows, _, _ in batch for row in rows])
+            quarantine(write_session, [entry for _, _, _, _, rejected, _ in batch for entry in rejected])
+            refresh_market_value_series(write_session, {row.player_id for row in mv_rows})
+            # Csak a sikeresen lekért feedek frissek (a hibásak a sor elején maradnak)
+            for feed in PLAYER_FEEDS:
+                mark_refreshed(write_session, [player.player_id for player, *_, fetched in batch if feed in fetched], feed)
+            write_session.commit()
+        except Exception as e:
+            write_session.rollback()
+            for player, *_ in batch:
+                record_dead_letter('player', player.tm_id, 'write', e)
+            raise
+        logger.info(f"{len(batch)} játékos részletei mentve ({batch[-1][0].name}).")
+    return write
+
+def run_player_details_pipeline(players, workers, batch_size=20):
+    """
+    Párhuzamos fetch, egy szálú transzformáció és validálás, batch-elt írás korlátos sorokkal.
+    """
+    write_session = get_db_session()
+    pipeline = Pipeline('player_details', players, [
+        Stage('fetch', fetch_player_feeds, workers=workers, queue_size=workers * 4),
+        Stage('transform', transform_player_feeds, queue_size=workers * 4),
+        Stage('validate', validate_player_rows, queue_size=workers * 4),
+        Stage('write', make_player_writer(write_session), queue_size=batch_size * 2, batch_size=batch_size),
+    ])
+    try:
+        pipeline.run()
+    finally:
+        write_session.close()
+
+# --- HIDEG BETÖLTÉS (első feltöltés COPY-val) ---
+
+PLAYER_STAGING = {
+    'stg_market_values': ('market_value', market_value_staging_rows),
+    'stg_transfers': ('transfers', transfer_staging_rows),
+    'stg_player_season_stats': ('stats', season_stat_staging_rows),
+}
+
+def make_staging_writer(load_session):
+    """
+    Író szakasz: több játékos nyers feedjei táblánként validálva, egy COPY-val a staging
+    táblákba (a hibás sorok karanténba).
+    """
+    def write(batch):
+        try:
+            for table, (feed, build_rows) in PLAYER_STAGING.items():
+                rows = (row for player, feeds in batch for row in build_rows(player.tm_id, feeds[feed] or []))
+                copy_valid_rows(load_session, table, rows)
+            load_session.commit()
+        except Exception as e:
+            # A megszakadt tranzakció nélkül a következő batch-ek és a betöltés is elbuknának
+            load_session.rollback()
+            for player, _ in batch:
+                record_dead_letter('player', player.tm_id, 'staging', e)
+            raise
+        logger.info(f"{len(batch)} játékos feedjei a staging táblákban ({batch[-1][0].name}).")
+    return write
+
+def run_player_details_cold_load(players, workers, batch_size=200):
+    """
+    Első feltöltés: párhuzamos fetch -> COPY a staging táblákba, majd set-based
+    kulcsfeloldás és betöltés (indexek nélkül), a végén ANALYZE.
+    """
+    load_session = get_db_session()
+    try:
+        prepare_staging(load_session, PLAYER_STAGING)
+        load_session.commit()
+        pipeline = Pipeline('player_details_cold', players, [
+            Stage('fetch', fetch_player_feeds, workers=workers, queue_size=workers * 4),
+            Stage('copy', make_staging_writer(load_session), queue_size=batch_size * 2, batch_size=batch_size),
+        ])
+        pipeline.run()
+
+        counts = load_player_details_from_staging(load_session)
+        refresh_market_value_series(load_session)
+        # Klubtagság verziók a betöltött átigazolásokból (set-based)
+        backfill_history(load_session)
+        load_session.commit()
+        logger.info(f"Hideg betöltés kész: {counts}")
+    finally:
+        load_session.close()
+
+# --- FŐ FÜGGVÉNY ---
+
+def run_player_details_etl(limit=None, workers=1, shard=None, cold=False, time_budget=None, stop=None):
+    """
+    Fő ciklus: frissíti a játékosok részleteit, a legsürgősebbel kezdve (refresh_queue).
+    workers > 1 esetén pipeline módban fut (párhuzamos TM lekérések).
+    shard=(i, N) esetén csak a tm_id % N == i játékosokat dolgozza fel.
+    time_budget (mp), az elfogyó napi TM keret vagy a stop Event (elveszett shard bérlet)
+    esetén a sor többi része a következő futásra marad.
+    cold=True esetén első feltöltés COPY-val a staging táblákon át (player_id sorrendben, keret nélkül).
+    """
+    shard_info = f" (shard {shard[0]}/{shard[1]})" if shard else ""
+    if cold:
+        def players_query(query_session):
+            query = query_session.query(DimPlayer.player_id, DimPlayer.tm_id, DimPlayer.name).filter(DimPlayer.tm_id.isnot(None))
+            return shard_filter(query, DimPlayer.tm_id, shard)
+
+        total = players_query(session).count()
+        session.commit()
+        logger.info(f"Összesen {min(total, limit) if limit else total} játékos részleteinek hideg betöltése indul{shard_info}...")
+        # Játékosok player_id szerinti lapozással, darabonként saját sessionben (ORM objektumok nélkül)
+        players = (
+            PlayerRef(*row) for row in iter_keyset(get_db_session, players_query, DimPlayer.player_id, limit=limit)
+        )
+        run_player_details_cold_load(players, workers)
+        log_peak_rss('player_details')
+        return
+
+    queue = refresh_queue(session, shard, limit)
+    session.commit()
+    total = len(queue)
+    logger.info(f"Összesen {total} játékos részleteinek frissítése indul prioritás szerint{shard_info}...")
+
+    players = budgeted(queue, time_budget, stop=stop)
+    if workers > 1:
+        run_player_details_pipeline(players, workers)
+    else:
+        for i, player in enumerate(players):
+            logger.info(f"[{i+1}/{total}] Feldolgozás: {player.name}...")
+            process_player(player)
+
+    log_tm_flight_stats()
+    log_peak_rss('player_details')
+
+def run_shard_process(shard, limit, workers, time_budget=None):
     """
-    Fő ciklus: Végigmegy a DimPlayer táblán és frissíti a részleteket.
+    Process pool belépési pont: egy shard saját ETL futásként.
     """
-    players_query = session.query(DimPlayer).filter(DimPlayer.tm_id.isnot(None))
-    
-    if limit:
-        players_query = players_query.limit(limit)
-        
-    players = players_query.all()
-    logger.info(f"Összesen {len(players)} játékos részleteinek frissítése indul...")
+    try:
+        with etl_run(session, f"player_details[{shard[0]}/{shard[1]}]"):
+            run_player_details_etl(limit=limit, workers=workers, shard=shard, time_budget=time_budget)
+    except KeyboardInterrupt:
+        pass
 
-    for i, player in enumerate(players):
-        logger.info(f"[{i+1}/{len(players)}] Feldolgozás: {player.name}...")
-        
-        process_player_market_values(player)
-        process_player_transfers(player)
-        process_player_season_stats(player)
+def run_player_details_leased(shard_count, limit=None, workers=1, lease_seconds=900, time_budget=None):
+    """
+    Több gépes mód: a shardokat a DB bérlet tábla osztja ki (SKIP LOCKED).
+    Minden worker addig vesz fel shardot, amíg van szabad vagy lejárt bérletű.
+    """
+    job = f"player_details:{date.today().isoformat()}"
+    return run_leased_shards(
+        session, get_db_session, job, shard_count,
+        lambda shard, lost: run_player_details_etl(limit=limit, workers=workers, shard=shard, time_budget=time_budget, stop=lost),
+        lease_seconds=lease_seconds
+    )
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Játékos részletek (Market Value, Transfer, Stats) betöltése.")
     parser.add_argument('-l', '--limit', type=int, help="Limit a teszteléshez (pl. 5 játékos).")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="Párhuzamos TM lekérések száma (1 = soros futás).")
+    parser.add_argument('--shard', type=str, help="Csak ez a shard: i/N (tm_id % N == i).")
+    parser.add_argument('-p', '--processes', type=int, default=1, help="Lokális process pool: N folyamat, mindegyik egy shard.")
+    parser.add_argument('--lease', type=int, metavar='N', help="Több gépes mód: N shard, DB bérlet táblával koordinálva.")
+    parser.add_argument('--lease-seconds', type=int, default=900, help="Bérlet hossza mp-ben (halott worker után ennyi idő múlva vehető át).")
+    parser.add_argument('--dry-run', action='store_true', help="Csak a várható API hívásszám becslése a hátralévő kerettel, futtatás nélkül.")
+    parser.add_argument('--time-budget', type=int, metavar='PERC', help="Időkeret percben: utána a sor többi része a következő futásra marad.")
+    parser.add_argument('--cold', action='store_true', help="Első feltöltés: COPY staging táblákba és set-based betöltés (üres fact táblákhoz).")
     args = parser.parse_args()
 
+    if args.dry_run:
+        shard = parse_shard(args.shard) if args.shard else None
+        exit(0 if report_estimate(estimate_player_details(session, args.limit, shard)) else 1)
+
+    time_budget = args.time_budget * 60 if args.time_budget else None
     try:
-        run_player_details_etl(limit=args.limit)
+        if args.processes > 1:
+            ok = run_process_pool(run_shard_process, args.processes, args.limit, args.workers, time_budget)
+            exit(0 if ok else 1)
+        with etl_run(session, 'player_details'):
+            if args.lease:
+                run_player_details_leased(args.lease, limit=args.limit, workers=args.workers,
+                                          lease_seconds=args.lease_seconds, time_budget=time_budget)
+            else:
+                shard = parse_shard(args.shard) if args.shard else None
+                run_player_details_etl(limit=args.limit, workers=args.workers, shard=shard, cold=args.cold,
+                                       time_budget=time_budget)
     except KeyboardInterrupt:
-        print("\nLeállítás...")
\ No newline at end of file
+        print("\nLeállítás...")
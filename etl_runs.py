@@ -0,0 +1,115 @@
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import ETL_RUN_HEARTBEAT_SECONDS
+from models import EtlRun
+from change_feed import set_current_run, summarize_run, run_expiry_cutoff
+from season_cube import refresh_cube_for_run
+from match_stats import refresh_match_stats_for_run
+from validation import quality
+
+logger = logging.getLogger(__name__)
+
+# --- ETL FUTÁS VERZIÓK ---
+
+def expire_orphaned_runs(session):
+    """
+    A lejárt heartbeat-ű 'running' futások lezárása 'failed' státusszal (commit nélkül).
+    Visszaadja a lezárt futások számát.
+    """
+    now = datetime.now()
+    orphaned = session.query(EtlRun).filter(
+        EtlRun.status == 'running',
+        func.coalesce(EtlRun.heartbeat_at, EtlRun.started_at) < run_expiry_cutoff()
+    ).all()
+    for run in orphaned:
+        logger.warning(f"Árva ETL futás lezárva: {run.run_id} ({run.job}, indult: {run.started_at})")
+        run.status = 'failed'
+        run.finished_at = now
+    return len(orphaned)
+
+@contextmanager
+def heartbeat(session, run):
+    """
+    Háttérszál, ami a futás alatt ETL_RUN_HEARTBEAT_SECONDS mp-enként frissíti
+    a heartbeat_at oszlopot (saját sessionnel). Ha a folyamat meghal, a futás
+    lejár, és a change_watermark nem vár rá tovább.
+    """
+    stop = threading.Event()
+    run_id = run.run_id
+    bind = session.get_bind()
+
+    def beat():
+        with Session(bind) as hb_session:
+            while not stop.wait(ETL_RUN_HEARTBEAT_SECONDS):
+                try:
+                    hb_session.query(EtlRun).filter_by(run_id=run_id).update(
+                        {EtlRun.heartbeat_at: datetime.now()}, synchronize_session=False
+                    )
+                    hb_session.commit()
+                except Exception as e:
+                    hb_session.rollback()
+                    logger.warning(f"ETL futás heartbeat sikertelen ({run_id}): {e}")
+
+    thread = threading.Thread(target=beat, name=f"run-heartbeat-{run_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+def start_run(session, job):
+    """
+    Új ETL futás nyitása (commitolva, hogy a run_id azonnal látszódjon), a korábbi
+    árva futások lezárásával. A folyamat további írásai ezzel a run_id-val kapnak bélyeget.
+    """
+    expire_orphaned_runs(session)
+    now = datetime.now()
+    run = EtlRun(job=job, started_at=now, heartbeat_at=now, status='running')
+    session.add(run)
+    session.commit()
+    set_current_run(run.run_id)
+    return run
+
+def finish_run(session, run, status='finished'):
+    """
+    Futás lezárása az érintett sorok táblánkénti összesítőjével, és a származtatott
+    táblák (kocka, egymás elleni mérleg, forma) frissítése a futás által írt sorok
+    alapján, valamint a futás adatminőség metrikáinak mentése. A 'finished' futás
+    növeli az adat verzióját.
+    """
+    set_current_run(None)
+    summarize_run(session, run.run_id)
+    quality.flush(session, run.run_id)
+    refresh_cube_for_run(session, run.run_id)
+    refresh_match_stats_for_run(session, run.run_id)
+    run.finished_at = datetime.now()
+    run.status = status
+    session.commit()
+
+def get_data_version(session):
+    """
+    Az adat aktuális verziója: a legutolsó sikeres futás lezárásának ideje. Nem a
+    run_id: párhuzamos futásoknál a korábban indult futás később is zárulhat.
+    """
+    return session.query(func.max(EtlRun.finished_at)).filter(EtlRun.status == 'finished').scalar()
+
+@contextmanager
+def etl_run(session, job):
+    """
+    Egy ETL futás keretezése: hiba vagy Ctrl+C esetén 'failed' státusszal zár.
+    A futás alatt heartbeat jelzi, hogy a folyamat él.
+    """
+    run = start_run(session, job)
+    try:
+        with heartbeat(session, run):
+            yield run
+    except BaseException:
+        session.rollback()
+        finish_run(session, run, 'failed')
+        raise
+    finish_run(session, run)
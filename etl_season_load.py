@@ -5,11 +5,22 @@ from models import (
     DimTeam, FactMatch
 )
 from utils import (
-    get_db_session, logger, FD_HEADERS, requests_get_retry, 
-    get_or_create_season, get_or_create_competition, get_or_create_team, get_or_create_player,
+    get_db_session, logger, log_tm_flight_stats, FD_HEADERS, requests_get_retry, iter_json_items, record_dead_letter,
+    get_or_create_season, get_or_create_competition, get_or_create_team, bulk_create_players_from_squad, is_current_squad,
     fetch_tm_competition_data, fetch_tm_player_search, fetch_tm_player_profile, 
-    fetch_tm_club_profile, fetch_tm_players_from_team, fetch_tm_team_data_search
+    fetch_tm_club_profile, fetch_tm_players_from_team, fetch_tm_team_data_search,
+    fetch_squad_player_fields, save_squad_players, player_from_fields
 )
+from cold_load import (
+    prepare_staging, copy_valid_rows, player_staging_row, match_staging_row,
+    load_players_from_staging, load_matches_from_staging
+)
+from rows import match_row
+from scd_history import backfill_history
+from validation import validate_batch
+from etl_runs import etl_run
+from quota import set_priority, estimate_season_load, report_estimate
+from pipeline import Pipeline, Stage
 
 session = get_db_session()
 
@@ -21,8 +32,8 @@ def season_load_competition(competition_code, season_year):
     # Bajnokság lekérése a listából (FD API)
     url = f"http://api.football-data.org/v4/competitions/{competition_code}"
     resp = requests_get_retry(url, headers=FD_HEADERS)
-    if resp.status_code != 200:
-        logger.error(f"Hiba a bajnokság lekérdezésénél: {resp.status_code}")
+    if resp is None or resp.status_code != 200:
+        logger.error(f"Hiba a bajnokság lekérdezésénél: {resp.status_code if resp is not None else 'nincs válasz'}")
         return None
     
     comp_meta = resp.json()
@@ -30,91 +41,230 @@ def season_load_competition(competition_code, season_year):
     
     return competition_obj
 
-def season_load_teams(competition_obj, season_year, with_players=False):
+def fetch_fd_team_ids(competition_code, season_year):
+    """
+    A szezon csapatainak FD ID-i a dry-run becsléshez (egy FD hívás). None, ha nem elérhető.
+    """
+    url = f"http://api.football-data.org/v4/competitions/{competition_code}/teams?season={season_year}"
+    resp = requests_get_retry(url, headers=FD_HEADERS)
+    if resp is None or resp.status_code != 200:
+        logger.warning(f"A(z) {competition_code} csapatlistája nem elérhető, a becslés alapértelmezett csapatszámmal számol.")
+        return None
+    return [team['id'] for team in resp.json().get('teams', [])]
+
+def season_load_teams(competition_obj, season_year, with_players=False, workers=1):
     """
-    Lekéri és betölti egy szezon összes csapatát a DB-be.
+    Lekéri és betölti egy szezon összes csapatát a DB-be, és visszaadja őket.
+    workers > 1 esetén a keretek lekérése párhuzamosan, pipeline-ban fut.
     """
      # Összes csapat lekérése a listából (FD API)
     url = f"http://api.football-data.org/v4/competitions/{competition_obj.fd_id}/teams?season={season_year}"
     resp = requests_get_retry(url, headers=FD_HEADERS)
-    if resp.status_code != 200:
-        logger.error(f"Hiba a meccsek listázásánál: {resp.status_code}")
-        return
+    if resp is None or resp.status_code != 200:
+        logger.error(f"Hiba a csapatok listázásánál: {resp.status_code if resp is not None else 'nincs válasz'}")
+        return []
     
     teams_data = resp.json().get('teams', [])
     logger.info(f"Összesen {len(teams_data)} csapat talált.")
-    team_count = 0
+    if workers > 1 or not with_players:
+        # Csapatok soros felvétele, majd a keretek párhuzamos lekérése
+        dim_teams = [get_or_create_team(team, competition_obj.competition_id) for team in teams_data]
+        if with_players:
+            season_load_players_pipeline(dim_teams, season_year, workers)
+        return dim_teams
+
+    dim_teams = []
     for team in teams_data:
         # Csapatok feldolgozása
         dim_team = get_or_create_team(team, competition_obj.competition_id)
+        dim_teams.append(dim_team)
 
         if with_players:
-            season_load_players_from_team(dim_team.tm_id, season_year)
+            season_load_players_from_team(dim_team, season_year)
         
-        team_count += 1
-        logger.info(f"Csapat és játékosai mentve és commitolva {team_count}/{len(teams_data)}")
+        logger.info(f"Csapat és játékosai mentve és commitolva {len(dim_teams)}/{len(teams_data)}")
+    return dim_teams
 
-def season_load_players_from_team(tm_team_id, season_year):
+def season_load_players_from_team(dim_team, season_year):
     """
     Lekéri és betölti egy csapat összes játékosát egy szezonon belül a DB-be.
+    A keret lista adataiból dolgozik, játékosonkénti TM hívás csak hiányzó mezőknél van.
+    """
+    if not dim_team.tm_id:
+        logger.warning(f"Nincs TM ID a csapathoz: {dim_team.name}, a keret kimarad.")
+        return
+
+    players = fetch_tm_players_from_team(dim_team.tm_id, season_year)
+    bulk_create_players_from_squad(players, dim_team.team_id, is_current_squad(season_year))
+
+def season_load_players_pipeline(dim_teams, season_year, workers):
+    """
+    A keretek és az új játékosok mezőinek párhuzamos lekérése (TM) és egy szálú
+    mentése korlátos sorral. A szálak között csak (team_id, tm_id, név) és a lekért
+    mezők utaznak, ORM objektum nem; a writer már csak a DB-be ír.
     """
-    players = fetch_tm_players_from_team(tm_team_id, season_year)
-    for player_entry in players:
-        get_or_create_player(player_entry['id'])
+    refs = [(team.team_id, team.tm_id, team.name) for team in dim_teams if team.tm_id]
+    current = is_current_squad(season_year)
+
+    def fetch(ref):
+        return ref, fetch_tm_players_from_team(ref[1], season_year)
+
+    def build(item):
+        ref, squad = item
+        # A workerek saját sessionnel szűrnek a létező játékosokra (a közös session nem szálbiztos)
+        with get_db_session() as worker_session:
+            return ref, len(squad), fetch_squad_player_fields(squad, not current, worker_session)
 
+    def write(item):
+        (team_id, _, name), squad_size, squad_fields = item
+        save_squad_players(squad_fields, team_id, current)
+        logger.info(f"Keret mentve: {name} ({squad_size} játékos)")
+
+    pipeline = Pipeline('season_load_players', refs, [
+        Stage('fetch', fetch, workers=workers, queue_size=workers * 2),
+        Stage('build', build, workers=workers, queue_size=workers * 2),
+        Stage('write', write, queue_size=workers * 2),
+    ])
+    pipeline.run()
+
+def matches_url(competition_obj, season_obj):
+    return f"http://api.football-data.org/v4/competitions/{competition_obj.fd_id}/matches?season={season_obj.start_year}"
 
 def season_load_matches(competition_obj, season_obj):
     """
     Lekéri és betölti egy szezon összes mérkőzését a DB-be.
     """
-    url = f"http://api.football-data.org/v4/competitions/{competition_obj.fd_id}/matches?season={season_obj.start_year}"
-    resp = requests_get_retry(url, headers=FD_HEADERS)
-    if resp.status_code != 200:
-        logger.error(f"Hiba a meccsek listázásánál: {resp.status_code}")
-        return
+    url = matches_url(competition_obj, season_obj)
 
-    matches_data = resp.json().get('matches', [])
+    # Iterálás a meccseken (STREAM_JSON esetén a választ darabonként dolgozzuk fel)
+    try:
+        match_count = 0
+        for match in iter_json_items(url, 'matches', headers=FD_HEADERS):
+            match_count += 1
+            try:
+                season_load_match(match, competition_obj, season_obj, match_count)
+            except Exception as e:
+                session.rollback()
+                record_dead_letter('match', match.get('id'), 'match', e)
+    except (ConnectionError, ValueError) as e: # ValueError: csonka / hibás JSON válasz
+        session.rollback()
+        logger.error(f"Hiba a meccsek listázásánál: {e}")
+        record_dead_letter('competition', f"{competition_obj.fd_id}/{season_obj.start_year}", 'matches', e)
 
-    # Iterálás a meccseken
-    match_count = 0
-    for match in matches_data:
-        fd_match_id = match['id']
-        logger.info(f"Meccs feldolgozása: {fd_match_id} ({match['homeTeam']['name']} vs {match['awayTeam']['name']})")
-        match_count += 1
+def season_load_match(match, competition_obj, season_obj, match_count):
+    """
+    Egy mérkőzés mentése, ha lefutott és még nincs a DB-ben.
+    """
+    fd_match_id = match['id']
+    logger.info(f"Meccs feldolgozása: {fd_match_id} ({match['homeTeam']['name']} vs {match['awayTeam']['name']})")
 
-        # Ellenőrizzük, hogy megvan-e már
-        existing_match = session.query(FactMatch).filter_by(fd_match_id=fd_match_id).first()
-        if existing_match and existing_match.status == 'FINISHED':
-            logger.info(f"Meccs már feldolgozva: {fd_match_id}, ugrás.")
-            continue
-        
-        if match['status'] != 'FINISHED':
-            continue
-
-        home_team = session.query(DimTeam).filter_by(fd_id=match['homeTeam']['id']).first()
-        away_team = session.query(DimTeam).filter_by(fd_id=match['awayTeam']['id']).first()
-
-        # Match mentése
-        match_fact = FactMatch(
-            fd_match_id=fd_match_id,
-            date=datetime.strptime(match['utcDate'], "%Y-%m-%dT%H:%M:%SZ"),
-            season_id=season_obj.season_id,
-            competition_id=competition_obj.competition_id,
-            home_team_id=home_team.team_id,
-            away_team_id=away_team.team_id,
-            home_score=match['score']['fullTime']['home'],
-            away_score=match['score']['fullTime']['away'],
-            status=match['status']
-        )
-        session.add(match_fact)
+    # Ellenőrizzük, hogy megvan-e már
+    existing_match = session.query(FactMatch).filter_by(fd_match_id=fd_match_id).first()
+    if existing_match and existing_match.status == 'FINISHED':
+        logger.info(f"Meccs már feldolgozva: {fd_match_id}, ugrás.")
+        return
+    
+    if match['status'] != 'FINISHED':
+        return
+
+    home_team = session.query(DimTeam).filter_by(fd_id=match['homeTeam']['id']).first()
+    away_team = session.query(DimTeam).filter_by(fd_id=match['awayTeam']['id']).first()
+
+    row = match_row(
+        match, season_obj.season_id, competition_obj.competition_id,
+        home_team.team_id if home_team else None, away_team.team_id if away_team else None
+    )
+    # Hibás sor (pl. ismeretlen csapat, hiányzó eredmény) karanténba kerül
+    if not validate_batch(session, FactMatch, [row]):
         session.commit()
-        logger.info(f"Meccs mentve és commitolva {match_count}/{len(matches_data)}: {fd_match_id}")
+        return
+
+    # Match mentése (a korábban nem lefutott állapotban mentett sort frissítjük, nem szúrunk be újat)
+    match_fact = existing_match or FactMatch(fd_match_id=fd_match_id)
+    for field, value in row._asdict().items():
+        setattr(match_fact, field, value)
+    session.add(match_fact)
+    session.commit()
+    logger.info(f"Meccs mentve és commitolva ({match_count}.): {fd_match_id}")
+
+# --- HIDEG BETÖLTÉS (első feltöltés COPY-val) ---
+
+def squad_staging_rows(batch, season_year):
+    """
+    A keretek új játékosai staging sorként, listában: a csapat feloldása (DB)
+    is itt történik, így a COPY alatt már nincs se HTTP, se DB hívás.
+    """
+    current = is_current_squad(season_year)
+    return [
+        player_staging_row(player_from_fields(tm_id, fields, team_id if current else None))
+        for (team_id, _, _), squad_fields in batch
+        for tm_id, fields in squad_fields
+    ]
+
+def season_load_players_cold(dim_teams, season_year, workers, load_session, batch_size=5):
+    """
+    A keretek és a játékosok mezőinek lekérése (párhuzamosan) és COPY a
+    stg_players táblába, majd egy set-based INSERT a dim_players táblába.
+    """
+    refs = [(team.team_id, team.tm_id, team.name) for team in dim_teams if team.tm_id]
+    need_club = not is_current_squad(season_year)
+
+    def fetch(ref):
+        # Csak HTTP: a csapat feloldása és a COPY a writerben fut
+        return ref, fetch_squad_player_fields(fetch_tm_players_from_team(ref[1], season_year), need_club)
+
+    def write(batch):
+        try:
+            rows = squad_staging_rows(batch, season_year)
+            count = copy_valid_rows(load_session, 'stg_players', rows)
+            load_session.commit()
+        except Exception as e:
+            # A megszakadt tranzakció nélkül a következő batch-ek és a betöltés is elbuknának
+            load_session.rollback()
+            for (_, tm_id, _), _ in batch:
+                record_dead_letter('team', f"{tm_id}/{season_year}", 'squad', e)
+            raise
+        logger.info(f"{count} játékos a staging táblában ({', '.join(name for (_, _, name), _ in batch)}).")
+
+    prepare_staging(load_session, ['stg_players'])
+    load_session.commit()
+    pipeline = Pipeline('season_load_players_cold', refs, [
+        Stage('fetch', fetch, workers=workers, queue_size=workers * 2),
+        Stage('copy', write, queue_size=batch_size * 2, batch_size=batch_size),
+    ])
+    pipeline.run()
+
+    counts = load_players_from_staging(load_session)
+    # A COPY-val felvett játékosok első klubtagság verziója (set-based)
+    backfill_history(load_session)
+    load_session.commit()
+    logger.info(f"Játékosok betöltve: {counts}")
+
+def season_load_matches_cold(competition_obj, season_obj, load_session):
+    """
+    A szezon meccsei streamelve COPY-val a stg_matches táblába, majd FD ID
+    alapján feloldva egy INSERT ... SELECT-tel a fact_matches táblába.
+    """
+    prepare_staging(load_session, ['stg_matches'])
+    try:
+        matches = iter_json_items(matches_url(competition_obj, season_obj), 'matches', headers=FD_HEADERS)
+        count = copy_valid_rows(load_session, 'stg_matches', (match_staging_row(match) for match in matches))
+    except (ConnectionError, ValueError) as e: # ValueError: csonka / hibás JSON válasz
+        load_session.rollback()
+        logger.error(f"Hiba a meccsek listázásánál: {e}")
+        record_dead_letter('competition', f"{competition_obj.fd_id}/{season_obj.start_year}", 'matches', e)
+        return
+
+    counts = load_matches_from_staging(load_session, competition_obj.competition_id, season_obj.season_id)
+    load_session.commit()
+    logger.info(f"{count} meccs a staging táblában, betöltve: {counts}")
 
 # --- FŐ FÜGGVÉNY ---
 
-def run_season_load(competition_code="PL", season_year=2024):
+def run_season_load(competition_code="PL", season_year=2024, workers=1, cold=False):
     """
     A fő függvény, ami végigmegy a szezon összes meccsén.
+    cold=True esetén a játékosok és meccsek COPY-val, staging táblákon át töltődnek.
     """
     session.rollback()
     logger.info(f"--- Season load indítása: {competition_code} {season_year} ---")
@@ -125,12 +275,22 @@ def run_season_load(competition_code="PL", season_year=2024):
     # Bajnokság lekérése a listából (FD API)
     competition_obj = season_load_competition(competition_code, season_year)
     
-    # Összes csapat lekérése a listából (FD API)
-    season_load_teams(competition_obj, season_year, with_players=True)
+    if cold:
+        load_session = get_db_session()
+        try:
+            dim_teams = season_load_teams(competition_obj, season_year)
+            season_load_players_cold(dim_teams, season_year, workers, load_session)
+            season_load_matches_cold(competition_obj, season_obj, load_session)
+        finally:
+            load_session.close()
+    else:
+        # Összes csapat lekérése a listából (FD API)
+        season_load_teams(competition_obj, season_year, with_players=True, workers=workers)
 
-    # Összes meccs lekérése a listából (FD API)
-    season_load_matches(competition_obj, season_obj)
+        # Összes meccs lekérése a listából (FD API)
+        season_load_matches(competition_obj, season_obj)
 
+    log_tm_flight_stats()
     logger.info("A teljes szezon feldolgozása befejeződött.")
 
 # --- FŐ FÜGGVÉNY FUTTATÁSA ---
@@ -155,6 +315,25 @@ if __name__ == "__main__":
         help="A szezon kezdő éve (pl. 2023 a 2023/2024 szezonhoz). Alapértelmezett: 2023."
     )
 
+    parser.add_argument(
+        '-w', '--workers', 
+        type=int, 
+        default=1, 
+        help="Párhuzamos TM keret lekérések száma (1 = soros futás). Alapértelmezett: 1."
+    )
+
+    parser.add_argument(
+        '--cold',
+        action='store_true',
+        help="Első feltöltés: játékosok és meccsek COPY-val, staging táblákon át."
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help="Csak a várható API hívásszám becslése a hátralévő kerettel, futtatás nélkül."
+    )
+
     args = parser.parse_args()
 
     # Ellenőrizzük, hogy a bemeneti év reális-e
@@ -163,8 +342,17 @@ if __name__ == "__main__":
         logger.error(f"Hiba: A megadott év ({args.year}) a jövőben van. A maximálisan megengedett év: {current_year}.")
         exit(1)
         
+    # Visszamenőleges töltés: a közös API keretből a legalacsonyabb prioritással
+    set_priority('backfill')
+    if args.dry_run:
+        estimate = estimate_season_load(
+            session, args.competition, fetch_fd_team_ids(args.competition, args.year), is_current_squad(args.year)
+        )
+        exit(0 if report_estimate(estimate) else 1)
+
     try:
-        run_season_load(competition_code=args.competition, season_year=args.year)
+        with etl_run(session, 'season_load'):
+            run_season_load(competition_code=args.competition, season_year=args.year, workers=args.workers, cold=args.cold)
     except KeyboardInterrupt:
         print("\nLeállítás a felhasználó által (Ctrl+C).")
     except Exception as e:
@@ -1,25 +1,34 @@
-from config import get_db_engine
+from config import get_db_engine, DB_SCHEMA, LIVE_SCHEMA
 from models import Base
+from change_feed import install_change_tracking
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
 
-def init_db():
-    engine = get_db_engine()
+def init_db(schema=None):
+    """
+    A séma (alapból DB_SCHEMA, különben az élő séma) törlése és újra létrehozása.
+    Blue/green újratöltésnél a shadow sémára fut, az élő séma érintetlen marad.
+    """
+    schema = schema or DB_SCHEMA or LIVE_SCHEMA
 
-    sql_drop_cascade = text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")    
-    with Session(engine) as session:
+    sql_drop_cascade = text(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema};")
+    with Session(get_db_engine(LIVE_SCHEMA)) as session:
         try:
             session.execute(sql_drop_cascade)
             session.commit()
-            print("A korábbi táblák (és a séma) sikeresen törölve.")
+            print(f"A korábbi táblák (és a {schema} séma) sikeresen törölve.")
         except Exception as e:
             session.rollback()
             print(f"Hiba a DROP CASCADE parancs futtatásakor: {e}")
             print("Folytatjuk a create_all paranccsal.")
 
+    # A séma már létezik, így a kapcsolatok search_path-ja rá mutat
+    engine = get_db_engine(schema)
     print("Adatbázis táblák létrehozása...")
     Base.metadata.create_all(engine)
-    print("A táblák létrejöttek a football_dwh adatbázisban.")
+    with Session(engine) as session:
+        install_change_tracking(session)
+    print(f"A táblák létrejöttek a football_dwh adatbázisban ({schema}).")
 
 if __name__ == "__main__":
     init_db()
@@ -4,6 +4,17 @@ import subprocess
 import os
 import sys
 
+SHADOW_SCHEMA = "public_shadow"
+
+def etl_env(schema=None):
+    """
+    A betöltő folyamatok környezete; schema esetén a shadow sémába írnak (blue/green).
+    """
+    env = dict(os.environ)
+    if schema:
+        env["DB_SCHEMA"] = schema
+    return env
+
 @task(name="Initialize_DB_Schema")
 def run_init_db():
     """
@@ -26,8 +37,28 @@ def run_init_db():
         
     return result.returncode
 
+@task(name="Blue_Green")
+def run_blue_green(*args):
+    """
+    Lefuttatja a blue_green.py-t (prepare / validate / swap), az élő séma közben olvasható marad.
+    """
+    command = [
+        sys.executable,
+        os.path.join(os.path.dirname(__file__), "blue_green.py"),
+        *args
+    ]
+
+    logger = get_run_logger()
+    logger.info(f"Futtatás indítása: {' '.join(command)}")
+
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    logger.info(f"stdout: {result.stdout}")
+    if result.stderr:
+        logger.warning(f"stderr (warnings/errors): {result.stderr}")
+    return result.returncode
+
 @task(name="Load_Season_Data")
-def run_season_load(competition: str, year: int):
+def run_season_load(competition: str, year: int, schema: str = None):
     """
     Lefuttatja az etl_season_load.py-t az adott paraméterekkel.
     """
@@ -36,14 +67,15 @@ def run_season_load(competition: str, year: int):
         python_executable, 
         os.path.join(os.path.dirname(__file__), "etl_season_load.py"), 
         "-c", competition, 
-        "-y", str(year)
+        "-y", str(year),
+        "--cold"
     ]
     
     logger = get_run_logger()
     logger.info(f"Futtatás indítása: {' '.join(command)}")
     
     # A subprocess segítségével futtatjuk a külső Python szkriptet
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    result = subprocess.run(command, capture_output=True, text=True, check=True, env=etl_env(schema))
     
     logger.info(f"stdout: {result.stdout}")
     if result.stderr:
@@ -52,31 +84,39 @@ def run_season_load(competition: str, year: int):
     return result.returncode
 
 @task(name="Load_Player_Details")
-def run_player_details():
+def run_player_details(schema: str = None):
     """
     Lefuttatja az etl_player_data.py-t a már betöltött játékosokra.
     """
     python_executable = sys.executable
     command = [
         python_executable, 
-        os.path.join(os.path.dirname(__file__), "etl_player_data.py")
+        os.path.join(os.path.dirname(__file__), "etl_player_data.py"),
+        "--cold"
     ]
     
     logger = get_run_logger()
     logger.info(f"Futtatás indítása: {' '.join(command)}")
     
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    result = subprocess.run(command, capture_output=True, text=True, check=True, env=etl_env(schema))
     logger.info(f"stdout: {result.stdout}")
     return result.returncode
 
 @flow(name="Load_PL_2025")
-def initial_setup_flow(competition: str = "PL", year: int = 2025):
-    init_result = run_init_db()
+def initial_setup_flow(competition: str = "PL", year: int = 2025, blue_green: bool = False):
+    """
+    blue_green=True: a betöltés a shadow sémába megy, az élő séma végig olvasható;
+    sikeres validálás után a két séma egy tranzakcióban cserél.
+    """
+    schema = SHADOW_SCHEMA if blue_green else None
+    init_result = run_blue_green("prepare") if blue_green else run_init_db()
 
-    season_result = run_season_load(competition, year, wait_for=[init_result])    
+    season_result = run_season_load(competition, year, schema, wait_for=[init_result])    
     # Csak akkor futtatjuk a kiegészítő adatokat, ha a szezon betöltés sikeres volt
     if season_result == 0:
-        run_player_details()
+        details_result = run_player_details(schema)
+        if blue_green and details_result == 0:
+            run_blue_green("swap")
 
 if __name__ == "__main__":
     initial_setup_flow()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+def iter_json_array(chunks, key):
+    """
+    Egy JSON objektum `key` kulcsú tömbjének elemeit adja vissza egyenként,
+    a teljes válasz memóriába töltése nélkül.
+    A `chunks` bájt (vagy str) darabok iterátora, pl. resp.iter_content().
+    Csak a legkülső előfordulást keresi (pl. {"id": ..., "stats": [...]}).
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+
+    def read():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return None
+        return utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    # A tömb elejének megkeresése
+    buf = ''
+    while True:
+        text = read()
+        if text is None:
+            return
+        buf += text
+        match = pattern.search(buf)
+        if match:
+            buf = buf[match.end():]
+            break
+        # A darabhatáron kettévágott kulcs miatt a végét megtartjuk
+        buf = buf[-(len(key) + 16):]
+
+    # Elemek dekódolása, ahogy a darabok megérkeznek
+    pos = 0
+    while True:
+        item, end = None, None
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos < len(buf) and buf[pos] == ']':
+            return
+
+        if pos < len(buf):
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                pass
+            # Szám a puffer végén lehet csonka, ezért elválasztót is várunk utána
+            if end is not None and end < len(buf) and buf[end] in ' \t\r\n,]':
+                yield item
+                pos = end
+                continue
+
+        text = read()
+        if text is None:
+            if end is not None:
+                yield item
+                return
+            raise ValueError(f"Csonka JSON tömb a(z) '{key}' kulcsnál.")
+        buf = buf[pos:] + text
+        pos = 0
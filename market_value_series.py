@@ -0,0 +1,112 @@
+import argparse
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from models import Base, FactMarketValue, FactMarketValueMonthly, FactMarketValueSeason, FactMarketValueLatest
+
+# --- PIACI ÉRTÉK IDŐSOR ---
+# A fact_market_values nyers megfigyelésekből tartja karban a származtatott táblákat:
+#   - fact_market_values_latest:  játékosonként a legfrissebb érték (rangsorokhoz)
+#   - fact_market_values_monthly: havi utolsó érték (grafikon)
+#   - fact_market_values_season:  szezon max / min / utolsó érték
+# Mindhárom set-based upsert, opcionálisan csak a megadott játékosokra.
+
+SQL_LATEST = """
+    INSERT INTO fact_market_values_latest (player_id, team_id, date_recorded, market_value_eur)
+    SELECT DISTINCT ON (player_id) player_id, team_id, date_recorded, market_value_eur
+    FROM fact_market_values
+    WHERE date_recorded IS NOT NULL {filter}
+    ORDER BY player_id, date_recorded DESC
+    ON CONFLICT (player_id) DO UPDATE SET
+        team_id = EXCLUDED.team_id,
+        date_recorded = EXCLUDED.date_recorded,
+        market_value_eur = EXCLUDED.market_value_eur
+"""
+
+SQL_MONTHLY = """
+    INSERT INTO fact_market_values_monthly (player_id, month, market_value_eur)
+    SELECT DISTINCT ON (player_id, date_trunc('month', date_recorded))
+        player_id, date_trunc('month', date_recorded)::date, market_value_eur
+    FROM fact_market_values
+    WHERE date_recorded IS NOT NULL {filter}
+    ORDER BY player_id, date_trunc('month', date_recorded), date_recorded DESC
+    ON CONFLICT (player_id, month) DO UPDATE SET
+        market_value_eur = EXCLUDED.market_value_eur
+"""
+
+# Szezon: start_year július 1-től a következő év július 1-ig
+SQL_SEASON = """
+    INSERT INTO fact_market_values_season (player_id, season_id, max_value_eur, min_value_eur, last_value_eur)
+    SELECT mv.player_id, s.season_id,
+        MAX(mv.market_value_eur), MIN(mv.market_value_eur),
+        (ARRAY_AGG(mv.market_value_eur ORDER BY mv.date_recorded DESC))[1]
+    FROM fact_market_values mv
+    JOIN dim_seasons s
+        ON mv.date_recorded >= make_date(s.start_year, 7, 1)
+        AND mv.date_recorded < make_date(s.start_year + 1, 7, 1)
+    WHERE mv.date_recorded IS NOT NULL {filter}
+    GROUP BY mv.player_id, s.season_id
+    ON CONFLICT (player_id, season_id) DO UPDATE SET
+        max_value_eur = EXCLUDED.max_value_eur,
+        min_value_eur = EXCLUDED.min_value_eur,
+        last_value_eur = EXCLUDED.last_value_eur
+"""
+
+def _statement(sql, player_ids, column='player_id'):
+    if player_ids is None:
+        return text(sql.format(filter='')), {}
+    stmt = text(sql.format(filter=f"AND {column} IN :player_ids"))
+    stmt = stmt.bindparams(bindparam('player_ids', expanding=True))
+    return stmt, {'player_ids': list(player_ids)}
+
+def refresh_market_value_series(session, player_ids=None):
+    """
+    Frissíti a származtatott piaci érték táblákat (commit nélkül).
+    player_ids=None esetén az összes játékosra.
+    """
+    if player_ids is not None and not player_ids:
+        return
+    for sql, column in ((SQL_LATEST, 'player_id'), (SQL_MONTHLY, 'player_id'), (SQL_SEASON, 'mv.player_id')):
+        stmt, params = _statement(sql, player_ids, column)
+        session.execute(stmt, params)
+
+def get_player_value_series(session, player_id, monthly=True):
+    """
+    Egy játékos piaci érték idősora (player_id + dátum indexből olvasva).
+    """
+    if monthly:
+        return session.query(FactMarketValueMonthly.month, FactMarketValueMonthly.market_value_eur) \
+            .filter_by(player_id=player_id).order_by(FactMarketValueMonthly.month).all()
+    return session.query(FactMarketValue.date_recorded, FactMarketValue.market_value_eur) \
+        .filter_by(player_id=player_id).order_by(FactMarketValue.date_recorded).all()
+
+def rank_players_by_value(session, team_ids=None, limit=50):
+    """
+    Játékosok rangsora a legfrissebb piaci érték szerint (opcionálisan csapatokra szűrve).
+    """
+    query = session.query(FactMarketValueLatest)
+    if team_ids is not None:
+        query = query.filter(FactMarketValueLatest.team_id.in_(team_ids))
+    return query.order_by(FactMarketValueLatest.market_value_eur.desc().nullslast()).limit(limit).all()
+
+def ensure_market_value_series(engine):
+    """
+    Meglévő adatbázison létrehozza a hiányzó táblákat és indexeket.
+    """
+    Base.metadata.create_all(engine, tables=[
+        FactMarketValueMonthly.__table__, FactMarketValueSeason.__table__, FactMarketValueLatest.__table__
+    ])
+    for index in FactMarketValue.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Piaci érték idősor táblák létrehozása és teljes újraszámolása.")
+    parser.parse_args()
+
+    engine = get_db_engine()
+    ensure_market_value_series(engine)
+    with Session(engine) as session:
+        refresh_market_value_series(session)
+        session.commit()
+    print("A piaci érték idősor táblák frissítve.")
@@ -0,0 +1,240 @@
+import argparse
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from models import Base, AggHeadToHead, AggTeamForm
+from rows import bulk_insert
+
+# --- EGYMÁS ELLENI MÉRLEG ÉS FORMA ---
+# A fact_matches-ból származtatott táblák, hogy a riport egymás elleni és forma
+# kérdései kulcs szerinti lookupok legyenek self-join helyett:
+#   - agg_head_to_head: csapatpáronként a teljes mérleg,
+#   - agg_team_form: csapatonként minden meccs utáni forma és Elo értékszám.
+# Egy ETL futás után csak a futás által írt meccsek (run_id) párjait számoljuk újra,
+# a formát pedig a legkorábbi új meccs dátumától: az Elo sorrendfüggő, ezért az
+# addigi állapotot (utolsó 10 meccs, utolsó Elo) a táblából olvassuk vissza.
+
+FORM_WINDOW = 10
+SHORT_FORM_WINDOW = 5
+
+ELO_START = 1500.0
+ELO_K = 20
+ELO_HOME_ADVANTAGE = 60
+
+class TeamFormRow(NamedTuple):
+    team_id: int
+    match_id: int
+    date: datetime
+    opponent_id: int
+    is_home: bool
+    goals_for: int
+    goals_against: int
+    points: int
+    form_last_5: str
+    points_last_5: int
+    points_last_10: int
+    goals_for_last_10: int
+    goals_against_last_10: int
+    elo_before: float
+    elo_after: float
+
+class TeamState:
+    """
+    Egy csapat gördülő állapota: az utolsó FORM_WINDOW meccs és az aktuális Elo.
+    """
+
+    def __init__(self, elo=ELO_START):
+        self.elo = elo
+        self.history = deque(maxlen=FORM_WINDOW) # (pont, rúgott, kapott)
+
+    def add(self, points, goals_for, goals_against):
+        self.history.append((points, goals_for, goals_against))
+
+    def summary(self):
+        last_5 = list(self.history)[-SHORT_FORM_WINDOW:]
+        return {
+            'form_last_5': ''.join(RESULT_CODES[points] for points, _, _ in last_5),
+            'points_last_5': sum(points for points, _, _ in last_5),
+            'points_last_10': sum(points for points, _, _ in self.history),
+            'goals_for_last_10': sum(gf for _, gf, _ in self.history),
+            'goals_against_last_10': sum(ga for _, _, ga in self.history),
+        }
+
+RESULT_CODES = {3: 'W', 1: 'D', 0: 'L'}
+
+def match_points(goals_for, goals_against):
+    return 3 if goals_for > goals_against else 1 if goals_for == goals_against else 0
+
+def goal_diff_multiplier(goal_diff):
+    """
+    Nagyobb gólkülönbségű győzelem többet ér (World Football Elo szerint).
+    """
+    goal_diff = abs(goal_diff)
+    if goal_diff <= 1:
+        return 1.0
+    if goal_diff == 2:
+        return 1.5
+    return (11 + goal_diff) / 8
+
+def elo_update(home_elo, away_elo, home_goals, away_goals):
+    """
+    Új (hazai, vendég) Elo értékek egy meccs után.
+    """
+    expected_home = 1 / (1 + 10 ** ((away_elo - home_elo - ELO_HOME_ADVANTAGE) / 400))
+    actual_home = 1.0 if home_goals > away_goals else 0.5 if home_goals == away_goals else 0.0
+    delta = ELO_K * goal_diff_multiplier(home_goals - away_goals) * (actual_home - expected_home)
+    return home_elo + delta, away_elo - delta
+
+def compute_form(matches, states):
+    """
+    Forma sorok időrendben érkező meccsekből: [(match_id, date, home_id, away_id, home_goals, away_goals), ...].
+    A states (team_id -> TeamState) helyben frissül; hiányzó csapat ELO_START-tal indul.
+    """
+    for match_id, date, home_id, away_id, home_goals, away_goals in matches:
+        home = states.setdefault(home_id, TeamState())
+        away = states.setdefault(away_id, TeamState())
+        home_elo, away_elo = elo_update(home.elo, away.elo, home_goals, away_goals)
+
+        for team_id, opponent_id, is_home, state, goals_for, goals_against, elo_after in (
+            (home_id, away_id, True, home, home_goals, away_goals, home_elo),
+            (away_id, home_id, False, away, away_goals, home_goals, away_elo),
+        ):
+            points = match_points(goals_for, goals_against)
+            state.add(points, goals_for, goals_against)
+            yield TeamFormRow(
+                team_id=team_id, match_id=match_id, date=date, opponent_id=opponent_id, is_home=is_home,
+                goals_for=goals_for, goals_against=goals_against, points=points,
+                elo_before=state.elo, elo_after=elo_after, **state.summary()
+            )
+            state.elo = elo_after
+
+FINISHED_MATCH = "status = 'FINISHED' AND home_score IS NOT NULL AND away_score IS NOT NULL"
+
+SQL_MATCHES_FROM = f"""
+    SELECT match_id, date, home_team_id, away_team_id, home_score, away_score
+    FROM fact_matches
+    WHERE {FINISHED_MATCH} AND date IS NOT NULL {{filter}}
+    ORDER BY date, match_id
+"""
+
+# A cutoff előtti állapot: csapatonként az utolsó FORM_WINDOW forma sor, időrendben
+SQL_FORM_STATE = f"""
+    SELECT team_id, points, goals_for, goals_against, elo_after FROM (
+        SELECT f.*, ROW_NUMBER() OVER (PARTITION BY team_id ORDER BY date DESC, match_id DESC) AS rn
+        FROM agg_team_form f
+        WHERE date < :cutoff
+    ) s
+    WHERE rn <= {FORM_WINDOW}
+    ORDER BY team_id, date, match_id
+"""
+
+SQL_RUN_CUTOFF = f"SELECT MIN(date) FROM fact_matches WHERE run_id = :run_id AND {FINISHED_MATCH}"
+
+SQL_HEAD_TO_HEAD = f"""
+    WITH m AS (
+        SELECT match_id, date,
+            LEAST(home_team_id, away_team_id) AS team_a_id,
+            GREATEST(home_team_id, away_team_id) AS team_b_id,
+            CASE WHEN home_team_id < away_team_id THEN home_score ELSE away_score END AS a_goals,
+            CASE WHEN home_team_id < away_team_id THEN away_score ELSE home_score END AS b_goals
+        FROM fact_matches
+        WHERE {FINISHED_MATCH} AND home_team_id <> away_team_id
+    )
+    INSERT INTO agg_head_to_head (
+        team_a_id, team_b_id, matches, team_a_wins, draws, team_b_wins,
+        team_a_goals, team_b_goals, last_match_id, last_match_date
+    )
+    SELECT team_a_id, team_b_id, COUNT(*),
+        SUM(CASE WHEN a_goals > b_goals THEN 1 ELSE 0 END),
+        SUM(CASE WHEN a_goals = b_goals THEN 1 ELSE 0 END),
+        SUM(CASE WHEN a_goals < b_goals THEN 1 ELSE 0 END),
+        SUM(a_goals), SUM(b_goals),
+        (ARRAY_AGG(match_id ORDER BY date DESC NULLS LAST, match_id DESC))[1],
+        MAX(date)
+    FROM m
+    {{filter}}
+    GROUP BY team_a_id, team_b_id
+    ON CONFLICT (team_a_id, team_b_id) DO UPDATE SET
+        matches = EXCLUDED.matches,
+        team_a_wins = EXCLUDED.team_a_wins,
+        draws = EXCLUDED.draws,
+        team_b_wins = EXCLUDED.team_b_wins,
+        team_a_goals = EXCLUDED.team_a_goals,
+        team_b_goals = EXCLUDED.team_b_goals,
+        last_match_id = EXCLUDED.last_match_id,
+        last_match_date = EXCLUDED.last_match_date
+"""
+
+# Csak a futás által írt meccsek csapatpárjai
+HEAD_TO_HEAD_RUN_FILTER = """
+    WHERE (team_a_id, team_b_id) IN (
+        SELECT LEAST(home_team_id, away_team_id), GREATEST(home_team_id, away_team_id)
+        FROM fact_matches WHERE run_id = :run_id
+    )
+"""
+
+SQL_LOCK = "SELECT pg_advisory_xact_lock(hashtext('agg_team_form'))"
+
+def refresh_head_to_head(session, run_id=None):
+    """
+    Egymás elleni mérlegek újraszámolása: run_id esetén csak a futás meccseinek párjaira (commit nélkül).
+    """
+    if run_id is None:
+        return session.execute(text(SQL_HEAD_TO_HEAD.format(filter=''))).rowcount
+    return session.execute(text(SQL_HEAD_TO_HEAD.format(filter=HEAD_TO_HEAD_RUN_FILTER)), {'run_id': run_id}).rowcount
+
+def load_form_state(session, cutoff):
+    states = {}
+    for team_id, points, goals_for, goals_against, elo_after in session.execute(text(SQL_FORM_STATE), {'cutoff': cutoff}):
+        state = states.setdefault(team_id, TeamState())
+        state.add(points, goals_for, goals_against)
+        state.elo = elo_after
+    return states
+
+def refresh_team_form(session, cutoff=None):
+    """
+    A forma sorok újraszámolása a cutoff dátumtól (None: teljes újraépítés), commit nélkül.
+    Visszaadja a beszúrt sorok számát.
+    """
+    if cutoff is None:
+        session.execute(text("DELETE FROM agg_team_form"))
+        states = {}
+        matches = session.execute(text(SQL_MATCHES_FROM.format(filter='')))
+    else:
+        states = load_form_state(session, cutoff)
+        session.execute(text("DELETE FROM agg_team_form WHERE date >= :cutoff"), {'cutoff': cutoff})
+        matches = session.execute(text(SQL_MATCHES_FROM.format(filter="AND date >= :cutoff")), {'cutoff': cutoff})
+    return bulk_insert(session, AggTeamForm, compute_form(matches.all(), states))
+
+def refresh_match_stats_for_run(session, run_id):
+    """
+    ETL futás utáni inkrementális frissítés: a futás új / módosított meccsei alapján.
+    """
+    cutoff = session.execute(text(SQL_RUN_CUTOFF), {'run_id': run_id}).scalar()
+    if cutoff is None:
+        return 0
+    session.execute(text(SQL_LOCK))
+    refresh_head_to_head(session, run_id)
+    return refresh_team_form(session, cutoff)
+
+def ensure_match_stats(engine):
+    """
+    Meglévő adatbázison létrehozza a származtatott táblákat.
+    """
+    Base.metadata.create_all(engine, tables=[AggHeadToHead.__table__, AggTeamForm.__table__])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Egymás elleni mérleg és forma / Elo táblák teljes újraszámolása.")
+    parser.parse_args()
+
+    engine = get_db_engine()
+    ensure_match_stats(engine)
+    with Session(engine) as session:
+        session.execute(text(SQL_LOCK))
+        pairs = refresh_head_to_head(session)
+        form_rows = refresh_team_form(session)
+        session.commit()
+    print(f"Egymás elleni mérlegek: {pairs} csapatpár, forma sorok: {form_rows}.")
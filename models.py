@@ -1,11 +1,171 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Date, ForeignKey, Float, DateTime, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import JSONB
 
 Base = declarative_base()
 
+class RunStamped:
+    """
+    Az utolsó beszúró / módosító ETL futás azonosítója és időpontja. Az értékeket
+    a DB trigger tölti (change_feed.py), így a Core és COPY alapú írások is kapják.
+    """
+    run_id = Column(Integer, nullable=True, index=True)
+    updated_at = Column(DateTime, nullable=True)
+
+# --- ETL FUTÁSOK ---
+
+class EtlRun(Base):
+    """
+    Az ETL futások naplója. A legutolsó sikeres futás lezárásának ideje az adat
+    "verziója", erre invalidálnak az olvasó oldali cache-ek.
+    """
+    __tablename__ = 'etl_runs'
+    run_id = Column(Integer, primary_key=True, autoincrement=True)
+    job = Column(String) # 'season_load', 'player_details', 'daily'
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True) # a futó folyamat életjele (árva futás felismerése)
+    status = Column(String) # 'running', 'finished', 'failed'
+
+class EtlRunChange(Base):
+    """
+    Futásonkénti összesítő: táblánként hány sort szúrt be / módosított a futás.
+    Az érintett kulcsok a tábla run_id oszlopán (indexelt) kérdezhetők le.
+    """
+    __tablename__ = 'etl_run_changes'
+    __table_args__ = (UniqueConstraint('run_id', 'table_name'),)
+    run_change_id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey('etl_runs.run_id'))
+    table_name = Column(String)
+    rows = Column(Integer)
+
+class EtlShardLease(Base):
+    """
+    Több gépen futó, shardolt ETL koordinációja: egy sor egy shard bérlete.
+    Lejárt bérletű (halott worker) shardot más worker átvehet.
+    """
+    __tablename__ = 'etl_shard_leases'
+    __table_args__ = (UniqueConstraint('job', 'shard'),)
+    lease_id = Column(Integer, primary_key=True, autoincrement=True)
+    job = Column(String) # pl. 'player_details:2024-05-01'
+    shard = Column(Integer)
+    shard_count = Column(Integer)
+    worker = Column(String, nullable=True)
+    leased_until = Column(DateTime, nullable=True)
+    done_at = Column(DateTime, nullable=True)
+
+class EtlApiUsage(Base):
+    """
+    Külső API hívások száma hostonként és időablakonként ('minute' / 'day').
+    Minden ETL folyamat ezen a táblán át osztozik a közös API kereten.
+    """
+    __tablename__ = 'etl_api_usage'
+    __table_args__ = (UniqueConstraint('host', 'window_kind', 'window_start'),)
+    usage_id = Column(Integer, primary_key=True, autoincrement=True)
+    host = Column(String)
+    window_kind = Column(String) # 'minute', 'day'
+    window_start = Column(DateTime)
+    calls = Column(Integer, default=0)
+
+class EtlDeadLetter(Base):
+    """
+    Sikertelenül feldolgozott entitások (játékos, csapat, meccs) feedenként.
+    A retry parancs csak ezeket dolgozza fel újra.
+    """
+    __tablename__ = 'etl_dead_letters'
+    __table_args__ = (
+        Index('ix_etl_dead_letters_open', 'entity_type', 'entity_key', 'feed'),
+    )
+    dead_letter_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String) # 'player', 'team', 'match', 'competition'
+    entity_key = Column(String) # TM / FD azonosító
+    feed = Column(String) # pl. 'transfers', 'market_value', 'stats', 'club_profile', 'player_create', 'match'
+    error = Column(String)
+    attempts = Column(Integer, default=1)
+    first_failed_at = Column(DateTime)
+    last_failed_at = Column(DateTime)
+    resolved_at = Column(DateTime, nullable=True)
+
+class EtlPlayerRefresh(Base):
+    """
+    Játékosonként és feedenként a legutolsó sikeres frissítés ideje. Ebből számolt
+    elavultság alapján rangsorol a frissítési sor (refresh_queue.py).
+    """
+    __tablename__ = 'etl_player_refresh'
+    player_id = Column(Integer, ForeignKey('dim_players.player_id'), primary_key=True)
+    feed = Column(String, primary_key=True) # 'market_value', 'transfers', 'stats'
+    refreshed_at = Column(DateTime)
+
+class EtlSnapshot(Base):
+    """
+    A legutóbb lekért TM payload (pl. klub profil) hash-e és tartalma entitásonként.
+    Változatlan hash esetén a feldolgozás kihagyható.
+    """
+    __tablename__ = 'etl_snapshots'
+    __table_args__ = (UniqueConstraint('entity_type', 'feed', 'entity_key'),)
+    snapshot_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String) # 'team', 'player'
+    feed = Column(String) # pl. 'club_profile', 'player_profile'
+    entity_key = Column(String) # TM azonosító
+    payload_hash = Column(String(64))
+    payload = Column(JSONB)
+    fetched_at = Column(DateTime)
+
+class EtlChangeLog(Base):
+    """
+    Mező szintű változások a snapshotok között. A downstream fogyasztók ebből
+    frissíthetnek inkrementálisan a dimenziók újraolvasása helyett.
+    """
+    __tablename__ = 'etl_change_log'
+    __table_args__ = (
+        Index('ix_etl_change_log_changed_at', 'changed_at'),
+        Index('ix_etl_change_log_entity', 'entity_type', 'entity_key'),
+    )
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String)
+    feed = Column(String)
+    entity_key = Column(String)
+    field = Column(String) # pont-elválasztott út, pl. 'squad.size'
+    old_value = Column(String, nullable=True)
+    new_value = Column(String, nullable=True)
+    changed_at = Column(DateTime)
+
+class EtlQuarantine(Base):
+    """
+    A validáláson elbukott (be nem töltött) sorok a hibás szabályokkal együtt.
+    A payload a normalizált sor, javítás után kézzel vagy újrafuttatással tölthető.
+    """
+    __tablename__ = 'etl_quarantine'
+    __table_args__ = (
+        Index('ix_etl_quarantine_run', 'run_id'),
+        Index('ix_etl_quarantine_table', 'table_name', 'entity_key'),
+    )
+    quarantine_id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, nullable=True)
+    table_name = Column(String) # a céltábla, pl. 'fact_transfers'
+    entity_key = Column(String) # pl. player_id / fd_match_id
+    reasons = Column(String) # vesszővel elválasztott szabály nevek, pl. 'season_id_not_null'
+    payload = Column(JSONB)
+    quarantined_at = Column(DateTime)
+
+class EtlQualityMetric(Base):
+    """
+    Futásonként és céltáblánként a validált / karanténba került sorok száma,
+    a szabályonkénti hibák és a validálás ideje.
+    """
+    __tablename__ = 'etl_quality_metrics'
+    __table_args__ = (UniqueConstraint('run_id', 'table_name'),)
+    metric_id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey('etl_runs.run_id'))
+    table_name = Column(String)
+    rows_checked = Column(Integer)
+    rows_quarantined = Column(Integer)
+    failures = Column(JSONB) # szabály -> hibás sorok száma
+    check_seconds = Column(Float)
+
 # --- DIMENZIÓ TÁBLÁK ---
 
-class DimSeason(Base):
+class DimSeason(RunStamped, Base):
     __tablename__ = 'dim_seasons'
     season_id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, unique=True)
@@ -13,7 +173,7 @@ class DimSeason(Base):
     start_year = Column(Integer)
     end_year = Column(Integer)
 
-class DimCompetition(Base):
+class DimCompetition(RunStamped, Base):
     __tablename__ = 'dim_competitions'
     competition_id = Column(Integer, primary_key=True, autoincrement=True)
     fd_id = Column(String, unique=True, nullable=True)
@@ -24,7 +184,7 @@ class DimCompetition(Base):
     country = Column(String)
     continent = Column(String)
 
-class DimTeam(Base):
+class DimTeam(RunStamped, Base):
     __tablename__ = 'dim_teams'
     team_id = Column(Integer, primary_key=True, autoincrement=True)
     fd_id = Column(Integer, unique=True, nullable=True)
@@ -42,7 +202,7 @@ class DimTeam(Base):
     competition_id = Column(Integer, ForeignKey('dim_competitions.competition_id'))
     competition = relationship("DimCompetition", backref="teams")
 
-class DimPlayer(Base):
+class DimPlayer(RunStamped, Base):
     __tablename__ = 'dim_players'
     player_id = Column(Integer, primary_key=True, autoincrement=True)
     tm_id = Column(Integer, unique=True, nullable=True)
@@ -57,9 +217,57 @@ class DimPlayer(Base):
     current_team_id = Column(Integer, ForeignKey('dim_teams.team_id'), nullable=True)
     current_team = relationship("DimTeam", backref="current_players")
 
+class DimTeamHistory(RunStamped, Base):
+    """
+    A csapat pénzügyi adatainak verziói (SCD type-2).
+    Érvényes: valid_from <= nap < valid_to (valid_to NULL = aktuális).
+    """
+    __tablename__ = 'dim_team_history'
+    __table_args__ = (
+        Index('ix_dim_team_history_asof', 'team_id', 'valid_from', 'valid_to'),
+    )
+    team_history_id = Column(Integer, primary_key=True, autoincrement=True)
+    team_id = Column(Integer, ForeignKey('dim_teams.team_id'))
+
+    currentTransferRecord = Column(Integer)
+    currentMarketValue = Column(Integer)
+    valid_from = Column(Date)
+    valid_to = Column(Date, nullable=True)
+
+class DimPlayerTeamHistory(RunStamped, Base):
+    """
+    A játékos klubtagságának verziói (SCD type-2).
+    Érvényes: valid_from <= nap < valid_to (valid_to NULL = aktuális).
+    """
+    __tablename__ = 'dim_player_team_history'
+    __table_args__ = (
+        Index('ix_dim_player_team_history_player', 'player_id', 'valid_from'),
+        Index('ix_dim_player_team_history_team_asof', 'team_id', 'valid_from', 'valid_to'),
+    )
+    player_team_history_id = Column(Integer, primary_key=True, autoincrement=True)
+    player_id = Column(Integer, ForeignKey('dim_players.player_id'))
+    team_id = Column(Integer, ForeignKey('dim_teams.team_id'), nullable=True)
+
+    valid_from = Column(Date)
+    valid_to = Column(Date, nullable=True)
+
+class DimEntityAlias(RunStamped, Base):
+    """
+    Alternatív (normalizált) nevek csapatokhoz és bajnokságokhoz,
+    pl. a Football-Data név a TM-ből létrehozott csapathoz.
+    """
+    __tablename__ = 'dim_entity_aliases'
+    __table_args__ = (UniqueConstraint('entity_type', 'alias'),)
+    alias_id = Column(Integer, primary_key=True, autoincrement=True)
+
+    entity_type = Column(String) # 'team', 'competition'
+    entity_id = Column(Integer)
+    alias = Column(String)
+    source = Column(String) # 'FD', 'TM'
+
 # --- TÉNY TÁBLÁK ---
 
-class FactMatch(Base):
+class FactMatch(RunStamped, Base):
     """
     A mérkőzések végeredményét tárolja. 
     Ebből számoljuk a tabellát (W-D-L, Pontok).
@@ -80,12 +288,16 @@ class FactMatch(Base):
     status = Column(String) # 'FINISHED', 'SCHEDULED'
 
 
-class FactMarketValue(Base):
+class FactMarketValue(RunStamped, Base):
     """
     A játékos piaci értékének változása az időben.
     Erre épül a grafikon a játékos oldalán.
     """
     __tablename__ = 'fact_market_values'
+    __table_args__ = (
+        # Egy játékos egy napon egy értéket kap; az idősor ennek indexéből olvasható
+        UniqueConstraint('player_id', 'date_recorded', name='uq_fact_market_values_player_date'),
+    )
     mv_id = Column(Integer, primary_key=True, autoincrement=True)
     
     player_id = Column(Integer, ForeignKey('dim_players.player_id'))
@@ -94,12 +306,47 @@ class FactMarketValue(Base):
     date_recorded = Column(Date)
     market_value_eur = Column(Integer)
 
-class FactTransfer(Base):
+class FactMarketValueMonthly(RunStamped, Base):
+    """
+    Havi mintavételezett piaci érték (a hónap utolsó értéke) a grafikonhoz.
+    """
+    __tablename__ = 'fact_market_values_monthly'
+    player_id = Column(Integer, ForeignKey('dim_players.player_id'), primary_key=True)
+    month = Column(Date, primary_key=True)
+    market_value_eur = Column(Integer)
+
+class FactMarketValueSeason(RunStamped, Base):
+    """
+    Szezononkénti piaci érték: maximum, minimum és a szezon utolsó értéke.
+    """
+    __tablename__ = 'fact_market_values_season'
+    player_id = Column(Integer, ForeignKey('dim_players.player_id'), primary_key=True)
+    season_id = Column(Integer, ForeignKey('dim_seasons.season_id'), primary_key=True)
+    max_value_eur = Column(Integer)
+    min_value_eur = Column(Integer)
+    last_value_eur = Column(Integer)
+
+class FactMarketValueLatest(RunStamped, Base):
+    """
+    A játékos legfrissebb piaci értéke (egy sor játékosonként), a rangsorokhoz.
+    """
+    __tablename__ = 'fact_market_values_latest'
+    __table_args__ = (
+        Index('ix_fact_market_values_latest_value', 'market_value_eur'),
+        Index('ix_fact_market_values_latest_team_value', 'team_id', 'market_value_eur'),
+    )
+    player_id = Column(Integer, ForeignKey('dim_players.player_id'), primary_key=True)
+    team_id = Column(Integer, ForeignKey('dim_teams.team_id'), nullable=True)
+    date_recorded = Column(Date)
+    market_value_eur = Column(Integer)
+
+class FactTransfer(RunStamped, Base):
     """
     A játékos átigazásoli története.
     Melyik csapattól melyik csapathoz, mikor és mennyiért.
     """
     __tablename__ = 'fact_transfers'
+    __table_args__ = (UniqueConstraint('player_id', 'date_recorded', name='uq_fact_transfers_player_date'),)
     transfer_id = Column(Integer, primary_key=True, autoincrement=True)
     
     player_id = Column(Integer, ForeignKey('dim_players.player_id'))
@@ -111,11 +358,14 @@ class FactTransfer(Base):
     market_value_eur = Column(Integer)
     fee_eur = Column(Integer)
 
-class FactPlayerSeasonStat(Base):
+class FactPlayerSeasonStat(RunStamped, Base):
     """
     A játékos adott szezonbeli összesített statisztikái egy bajnokságban.
     """
     __tablename__ = 'fact_player_season_stats'
+    __table_args__ = (
+        UniqueConstraint('player_id', 'season_id', 'competition_id', name='uq_fact_player_season_stats_key'),
+    )
     season_stat_id = Column(Integer, primary_key=True, autoincrement=True)
     
     player_id = Column(Integer, ForeignKey('dim_players.player_id'))
@@ -129,3 +379,77 @@ class FactPlayerSeasonStat(Base):
     yellow_cards = Column(Integer)
     red_cards = Column(Integer)
     minutes_played = Column(Integer)
+
+# --- AGGREGÁTUMOK ---
+
+class AggPlayerSeasonCube(Base):
+    """
+    Előre aggregált kocka a BI szeleteléshez: (szezon, bajnokság, csapat, poszt,
+    nemzetiség) szinten a játékos statisztikák összegei és a keret piaci értéke.
+    Származtatott tábla, szezononként újraszámolva (season_cube.py).
+    """
+    __tablename__ = 'agg_player_season_cube'
+    __table_args__ = (
+        Index('ix_agg_player_season_cube_slice', 'season_id', 'competition_id', 'team_id'),
+    )
+    cube_id = Column(Integer, primary_key=True, autoincrement=True)
+
+    season_id = Column(Integer, ForeignKey('dim_seasons.season_id'))
+    competition_id = Column(Integer, ForeignKey('dim_competitions.competition_id'))
+    team_id = Column(Integer, ForeignKey('dim_teams.team_id'), nullable=True)
+    position = Column(String, nullable=True)
+    nationality = Column(String, nullable=True)
+
+    players = Column(Integer)
+    appearances = Column(Integer)
+    goals = Column(Integer)
+    assists = Column(Integer)
+    yellow_cards = Column(Integer)
+    red_cards = Column(Integer)
+    minutes_played = Column(Integer)
+    market_value_eur = Column(BigInteger) # a cella játékosainak szezon végi értéke összesen
+    valued_players = Column(Integer) # ennyi játékosnak van piaci értéke a szezonban
+
+class AggHeadToHead(Base):
+    """
+    Két csapat egymás elleni mérlege (team_a_id < team_b_id), match_stats.py tartja karban.
+    """
+    __tablename__ = 'agg_head_to_head'
+    team_a_id = Column(Integer, ForeignKey('dim_teams.team_id'), primary_key=True)
+    team_b_id = Column(Integer, ForeignKey('dim_teams.team_id'), primary_key=True)
+    matches = Column(Integer)
+    team_a_wins = Column(Integer)
+    draws = Column(Integer)
+    team_b_wins = Column(Integer)
+    team_a_goals = Column(Integer)
+    team_b_goals = Column(Integer)
+    last_match_id = Column(Integer, ForeignKey('fact_matches.match_id'))
+    last_match_date = Column(DateTime)
+
+class AggTeamForm(Base):
+    """
+    Csapatonként minden lejátszott meccs utáni forma: az utolsó 5 / 10 meccs pontjai,
+    gördülő rúgott / kapott gólok és Elo értékszám. A legfrissebb sor a csapat aktuális formája.
+    """
+    __tablename__ = 'agg_team_form'
+    __table_args__ = (
+        Index('ix_agg_team_form_team_date', 'team_id', 'date'),
+        Index('ix_agg_team_form_date', 'date'),
+    )
+    team_id = Column(Integer, ForeignKey('dim_teams.team_id'), primary_key=True)
+    match_id = Column(Integer, ForeignKey('fact_matches.match_id'), primary_key=True)
+    date = Column(DateTime)
+    opponent_id = Column(Integer, ForeignKey('dim_teams.team_id'))
+    is_home = Column(Boolean)
+
+    goals_for = Column(Integer)
+    goals_against = Column(Integer)
+    points = Column(Integer) # 3 / 1 / 0
+    form_last_5 = Column(String(5)) # pl. 'WWDLW', a legutolsó a végén
+    points_last_5 = Column(Integer)
+    points_last_10 = Column(Integer)
+    goals_for_last_10 = Column(Integer)
+    goals_against_last_10 = Column(Integer)
+    elo_before = Column(Float)
+    elo_after = Column(Float)
+
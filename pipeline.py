@@ -0,0 +1,216 @@
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- PIPELINE FUTTATÓ ---
+# Fetch -> transform -> write szakaszok korlátos sorokkal összekötve: a lassabb
+# szakasz visszanyomja (backpressure) a gyorsabbat, így az áteresztőképesség a
+# leglassabb szakaszon múlik, nem a hálózat és a DB várakozások összegén.
+# A szálak azért megfelelők, mert a munka nagy része I/O várakozás; a DB-t
+# használó szakaszok egy workerrel futnak (a session nem szálbiztos).
+
+_DONE = object()
+
+class Stage:
+    """
+    Egy feldolgozási szakasz.
+    fn(item) -> a következő szakasz eleme (None: nincs kimenet).
+    batch_size esetén fn(batch) listát kap (író szakasz), és nincs kimenete.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=100, batch_size=None, flush_interval=5):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.processed = 0
+        self.errors = 0
+        self._alive = workers
+        self._lock = threading.Lock()
+
+    def count(self, processed=0, errors=0):
+        with self._lock:
+            self.processed += processed
+            self.errors += errors
+
+class Pipeline:
+    """
+    Forrásból (iterálható) induló, szakaszokon átmenő pipeline.
+    Ctrl+C esetén a folyamatban lévő elemeket befejezi, a már összegyűjtött
+    batch-et kiírja, majd továbbdobja a KeyboardInterrupt-ot.
+    """
+
+    def __init__(self, name, source, stages, gauge_interval=30):
+        self.name = name
+        self.source = source
+        self.stages = stages
+        self.gauge_interval = gauge_interval
+        self.stop_event = threading.Event()
+        self.produced = 0
+
+    # --- Sor műveletek, amelyek leállításkor nem blokkolnak örökre ---
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _signal_done(self, q, count):
+        for _ in range(count):
+            while True:
+                try:
+                    q.put(_DONE, timeout=0.5)
+                    break
+                except queue.Full:
+                    # Leállításkor a workerek a stop_event alapján maguktól kilépnek
+                    if self.stop_event.is_set():
+                        return
+
+    def _get(self, q, timeout=0.5):
+        try:
+            return q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # --- Szálak ---
+
+    def _produce(self):
+        first = self.stages[0]
+        try:
+            for item in self.source:
+                if not self._put(first.queue, item):
+                    break
+                self.produced += 1
+        except Exception as e:
+            logger.error(f"[{self.name}] Hiba a forrásban: {e}")
+        finally:
+            self._signal_done(first.queue, first.workers)
+
+    def _finish_worker(self, index):
+        stage = self.stages[index]
+        with stage._lock:
+            stage._alive -= 1
+            last = stage._alive == 0
+        if last and index + 1 < len(self.stages):
+            following = self.stages[index + 1]
+            self._signal_done(following.queue, following.workers)
+
+    def _work(self, index):
+        stage = self.stages[index]
+        output = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+        try:
+            while True:
+                # Leállításkor a folyamatban lévő elem után kilépünk, a sorban maradtakat eldobjuk
+                if self.stop_event.is_set():
+                    return
+                item = self._get(stage.queue)
+                if item is _DONE:
+                    return
+                if item is None:
+                    continue
+                try:
+                    result = stage.fn(item)
+                    stage.count(processed=1)
+                except Exception as e:
+                    stage.count(errors=1)
+                    logger.error(f"[{self.name}/{stage.name}] Hiba: {e}")
+                    continue
+                if output is not None and result is not None:
+                    if not self._put(output, result):
+                        return
+        finally:
+            self._finish_worker(index)
+
+    def _write(self, index):
+        stage = self.stages[index]
+        batch = []
+        last_flush = time.monotonic()
+
+        def flush():
+            nonlocal batch, last_flush
+            if batch:
+                try:
+                    stage.fn(batch)
+                    stage.processed += len(batch)
+                except Exception as e:
+                    stage.errors += len(batch)
+                    logger.error(f"[{self.name}/{stage.name}] Batch írási hiba ({len(batch)} elem): {e}")
+            batch = []
+            last_flush = time.monotonic()
+
+        try:
+            while True:
+                item = self._get(stage.queue)
+                if item is _DONE:
+                    break
+                if item is not None:
+                    batch.append(item)
+                elif self.stop_event.is_set():
+                    # A már transzformált, sorban álló elemeket még kiírjuk
+                    while True:
+                        try:
+                            item = stage.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is not _DONE:
+                            batch.append(item)
+                    break
+                if len(batch) >= stage.batch_size or time.monotonic() - last_flush >= stage.flush_interval:
+                    flush()
+            # Leállításkor is kiírjuk, ami már átment a transzformáción
+            flush()
+        finally:
+            self._finish_worker(index)
+
+    def _gauge(self):
+        while not self.stop_event.wait(self.gauge_interval):
+            logger.info(f"[{self.name}] {self.gauge_line()}")
+
+    def gauge_line(self):
+        """
+        Szakaszonkénti sor mélység és feldolgozott elemszám.
+        """
+        parts = [f"forrás: {self.produced}"]
+        for stage in self.stages:
+            parts.append(
+                f"{stage.name}: sor {stage.queue.qsize()}/{stage.queue.maxsize}, kész {stage.processed}, hiba {stage.errors}"
+            )
+        return " | ".join(parts)
+
+    def run(self):
+        threads = [threading.Thread(target=self._produce, name=f"{self.name}-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            target = self._write if stage.batch_size else self._work
+            for w in range(stage.workers):
+                threads.append(threading.Thread(target=target, args=(index,), name=f"{self.name}-{stage.name}-{w}", daemon=True))
+        gauge = threading.Thread(target=self._gauge, name=f"{self.name}-gauge", daemon=True)
+
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        gauge.start()
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logger.warning(f"[{self.name}] Leállítás kérve, a folyamatban lévő elemek befejezése...")
+            self.stop_event.set()
+            for t in threads:
+                t.join(timeout=30)
+            raise
+        finally:
+            self.stop_event.set()
+            logger.info(f"[{self.name}] Vége ({time.monotonic() - started:.1f} mp). {self.gauge_line()}")
+
+        return {stage.name: {'processed': stage.processed, 'errors': stage.errors} for stage in self.stages}
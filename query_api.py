@@ -0,0 +1,263 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from etl_runs import get_data_version
+from change_feed import change_watermark, changes_since, changed_rows
+
+# --- OLVASÓ OLDALI LEKÉRDEZÉSEK ---
+# Power BI / notebookok számára paraméterezett lekérdezések (tabella, játékos profil,
+# keret) memóriában cache-elve. A cache az ETL futás verziójára invalidál: amíg nincs
+# új sikeres futás, az ismételt lekérdezések nem érik el az adatbázist.
+
+class LRUCache:
+    """
+    Egyszerű, szálbiztos LRU cache az adat verzióhoz kötve.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def set_version(self, version):
+        """
+        Új adat verziónál a teljes cache ürül.
+        """
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+def cached(fn):
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        self._check_version()
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+        found, value = self.cache.get(key)
+        if not found:
+            value = fn(self, *args, **kwargs)
+            self.cache.put(key, value)
+        # Másolat: a hívó módosítása ne írja át a cache-elt listát / dictet
+        return copy.deepcopy(value)
+    return wrapper
+
+SQL_STANDINGS = """
+    WITH results AS (
+        SELECT home_team_id AS team_id, home_score AS gf, away_score AS ga
+        FROM fact_matches
+        WHERE competition_id = :competition_id AND season_id = :season_id AND status = 'FINISHED'
+        UNION ALL
+        SELECT away_team_id, away_score, home_score
+        FROM fact_matches
+        WHERE competition_id = :competition_id AND season_id = :season_id AND status = 'FINISHED'
+    )
+    SELECT t.team_id, t.name, t.crest_url,
+        COUNT(*) AS played,
+        SUM(CASE WHEN r.gf > r.ga THEN 1 ELSE 0 END) AS won,
+        SUM(CASE WHEN r.gf = r.ga THEN 1 ELSE 0 END) AS draw,
+        SUM(CASE WHEN r.gf < r.ga THEN 1 ELSE 0 END) AS lost,
+        SUM(r.gf) AS goals_for,
+        SUM(r.ga) AS goals_against,
+        SUM(r.gf) - SUM(r.ga) AS goal_difference,
+        SUM(CASE WHEN r.gf > r.ga THEN 3 WHEN r.gf = r.ga THEN 1 ELSE 0 END) AS points
+    FROM results r
+    JOIN dim_teams t ON t.team_id = r.team_id
+    GROUP BY t.team_id, t.name, t.crest_url
+    ORDER BY points DESC, goal_difference DESC, goals_for DESC, t.name
+"""
+
+SQL_PLAYER = """
+    SELECT p.player_id, p.tm_id, p.name, p.position, p.position_name, p.nationality, p.age,
+        p.shirt_number, p.current_team_id, t.name AS current_team
+    FROM dim_players p
+    LEFT JOIN dim_teams t ON t.team_id = p.current_team_id
+    WHERE p.player_id = :player_id
+"""
+
+SQL_PLAYER_VALUES = """
+    SELECT mv.date_recorded, mv.market_value_eur, t.name AS team
+    FROM fact_market_values mv
+    LEFT JOIN dim_teams t ON t.team_id = mv.team_id
+    WHERE mv.player_id = :player_id
+    ORDER BY mv.date_recorded
+"""
+
+SQL_PLAYER_TRANSFERS = """
+    SELECT tf.date_recorded, s.name AS season, tf_from.name AS team_from, tf_to.name AS team_to,
+        tf.market_value_eur, tf.fee_eur
+    FROM fact_transfers tf
+    LEFT JOIN dim_seasons s ON s.season_id = tf.season_id
+    LEFT JOIN dim_teams tf_from ON tf_from.team_id = tf."teamFrom_id"
+    LEFT JOIN dim_teams tf_to ON tf_to.team_id = tf."teamTo_id"
+    WHERE tf.player_id = :player_id
+    ORDER BY tf.date_recorded DESC
+"""
+
+SQL_PLAYER_STATS = """
+    SELECT s.name AS season, c.name AS competition, t.name AS team,
+        st.appearances, st.goals, st.assists, st.yellow_cards, st.red_cards, st.minutes_played
+    FROM fact_player_season_stats st
+    LEFT JOIN dim_seasons s ON s.season_id = st.season_id
+    LEFT JOIN dim_competitions c ON c.competition_id = st.competition_id
+    LEFT JOIN dim_teams t ON t.team_id = st.team_id
+    WHERE st.player_id = :player_id
+    ORDER BY s.start_year DESC, c.name
+"""
+
+SQL_TEAM_SQUAD = """
+    SELECT p.player_id, p.name, p.position, p.nationality, p.age, p.shirt_number,
+        l.market_value_eur, l.date_recorded AS market_value_date
+    FROM dim_players p
+    LEFT JOIN fact_market_values_latest l ON l.player_id = p.player_id
+    WHERE p.current_team_id = :team_id
+    ORDER BY l.market_value_eur DESC NULLS LAST, p.name
+"""
+
+# A BI szeletelés az előre aggregált kockából, az alap tény táblák joinja nélkül
+SQL_SEASON_CUBE = """
+    SELECT c.team_id, t.name AS team, c.competition_id, comp.name AS competition,
+        c.position, c.nationality, c.players, c.appearances, c.goals, c.assists,
+        c.yellow_cards, c.red_cards, c.minutes_played, c.market_value_eur, c.valued_players
+    FROM agg_player_season_cube c
+    LEFT JOIN dim_teams t ON t.team_id = c.team_id
+    LEFT JOIN dim_competitions comp ON comp.competition_id = c.competition_id
+    WHERE c.season_id = :season_id AND (CAST(:competition_id AS INTEGER) IS NULL OR c.competition_id = :competition_id)
+    ORDER BY comp.name, t.name, c.position, c.nationality
+"""
+
+SQL_HEAD_TO_HEAD = """
+    SELECT team_a_id, team_b_id, matches, team_a_wins, draws, team_b_wins,
+        team_a_goals, team_b_goals, last_match_id, last_match_date
+    FROM agg_head_to_head
+    WHERE team_a_id = LEAST(:team_id, :other_team_id) AND team_b_id = GREATEST(:team_id, :other_team_id)
+"""
+
+SQL_TEAM_FORM = """
+    SELECT f.date, f.match_id, t.name AS opponent, f.is_home, f.goals_for, f.goals_against,
+        f.form_last_5, f.points_last_5, f.points_last_10, f.goals_for_last_10, f.goals_against_last_10,
+        f.elo_after AS elo
+    FROM agg_team_form f
+    LEFT JOIN dim_teams t ON t.team_id = f.opponent_id
+    WHERE f.team_id = :team_id
+    ORDER BY f.date DESC, f.match_id DESC
+    LIMIT :limit
+"""
+
+class WarehouseQueries:
+    """
+    Olvasó oldali lekérdezések cache-elve. Az adat verziót legfeljebb
+    `version_ttl` másodpercenként ellenőrzi; addig a cache-ből szolgál ki.
+    """
+
+    def __init__(self, engine=None, maxsize=256, version_ttl=60):
+        self.engine = engine or get_db_engine()
+        self.cache = LRUCache(maxsize)
+        self.version_ttl = version_ttl
+        self._version_checked_at = 0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_ttl:
+            return
+        with Session(self.engine) as session:
+            self.cache.set_version(get_data_version(session))
+        self._version_checked_at = now
+
+    def _fetch_all(self, sql, **params):
+        with Session(self.engine) as session:
+            return [dict(row._mapping) for row in session.execute(text(sql), params)]
+
+    def invalidate(self):
+        """
+        Kényszerített verzió ellenőrzés a következő lekérdezésnél.
+        """
+        self._version_checked_at = 0
+
+    @cached
+    def standings(self, competition_id, season_id):
+        return self._fetch_all(SQL_STANDINGS, competition_id=competition_id, season_id=season_id)
+
+    @cached
+    def player_profile(self, player_id):
+        player = self._fetch_all(SQL_PLAYER, player_id=player_id)
+        if not player:
+            return None
+        return {
+            **player[0],
+            'market_values': self._fetch_all(SQL_PLAYER_VALUES, player_id=player_id),
+            'transfers': self._fetch_all(SQL_PLAYER_TRANSFERS, player_id=player_id),
+            'stats': self._fetch_all(SQL_PLAYER_STATS, player_id=player_id),
+        }
+
+    @cached
+    def team_squad(self, team_id):
+        return self._fetch_all(SQL_TEAM_SQUAD, team_id=team_id)
+
+    @cached
+    def head_to_head(self, team_id, other_team_id):
+        """
+        Egymás elleni mérleg a team_id szemszögéből.
+        """
+        rows = self._fetch_all(SQL_HEAD_TO_HEAD, team_id=team_id, other_team_id=other_team_id)
+        if not rows:
+            return None
+        row = rows[0]
+        swap = team_id != row['team_a_id']
+        return {
+            'matches': row['matches'],
+            'wins': row['team_b_wins'] if swap else row['team_a_wins'],
+            'draws': row['draws'],
+            'losses': row['team_a_wins'] if swap else row['team_b_wins'],
+            'goals_for': row['team_b_goals'] if swap else row['team_a_goals'],
+            'goals_against': row['team_a_goals'] if swap else row['team_b_goals'],
+            'last_match_id': row['last_match_id'],
+            'last_match_date': row['last_match_date'],
+        }
+
+    @cached
+    def team_form(self, team_id, limit=10):
+        """
+        A csapat utolsó meccsei utáni forma, a legfrissebb elöl (az első sor az aktuális forma).
+        """
+        return self._fetch_all(SQL_TEAM_FORM, team_id=team_id, limit=limit)
+
+    @cached
+    def season_slice(self, season_id, competition_id=None):
+        return self._fetch_all(SQL_SEASON_CUBE, season_id=season_id, competition_id=competition_id)
+
+    def changes_since(self, run_id):
+        """
+        Inkrementális frissítéshez: a run_id utáni, lezárt futásokban változott sorok
+        száma táblánként, és az új pozíció ('until_run_id'), amit a fogyasztó eltárol.
+        """
+        with Session(self.engine) as session:
+            until = change_watermark(session)
+            return {'until_run_id': until, 'tables': changes_since(session, run_id, until)}
+
+    def changed_rows(self, table, since_run_id, until_run_id):
+        with Session(self.engine) as session:
+            return list(changed_rows(session, table, since_run_id, until_run_id))
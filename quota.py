@@ -0,0 +1,205 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from config import (
+    get_db_engine, LIVE_SCHEMA, TM_API_URL, API_PRIORITY,
+    DAILY_API_BUDGET_FD, DAILY_API_BUDGET_TM, MINUTE_API_BUDGET_FD, MINUTE_API_BUDGET_TM
+)
+from models import EtlApiUsage, DimCompetition, DimTeam, DimPlayer
+from sharding import shard_filter
+
+logger = logging.getLogger(__name__)
+
+# --- KÖZÖS API KERET ---
+# Az FD és a TM API-n minden ETL (season load, player details, napi, backfill)
+# osztozik. Minden kérés előtt egy hívást lefoglalunk a DB-ben (etl_api_usage),
+# hostonként percenkénti és napi ablakban. A prioritási osztályok a keret egyre
+# kisebb részét használhatják, így egy backfill nem tudja elfogyasztani a napi
+# meccs frissítés elől a keretet.
+
+FD_HOST = 'api.football-data.org'
+TM_HOST = urlparse(TM_API_URL or '').netloc
+
+# host -> (percenkénti, napi) keret
+BUDGETS = {
+    FD_HOST: (MINUTE_API_BUDGET_FD, DAILY_API_BUDGET_FD),
+    TM_HOST: (MINUTE_API_BUDGET_TM, DAILY_API_BUDGET_TM),
+}
+
+# Prioritási osztály -> a keret ekkora részét használhatja
+PRIORITY_SHARES = {
+    'live': 1.0, # meccs eredmények
+    'daily': 0.9, # napi delta frissítés
+    'enrichment': 0.7, # játékos részletek, dead-letter retry
+    'backfill': 0.5, # season load, visszamenőleges töltés
+}
+DEFAULT_PRIORITY = 'enrichment'
+
+class QuotaExceeded(ConnectionError):
+    """
+    Elfogyott a prioritási osztály napi kerete az adott hoston.
+    """
+
+_priority = API_PRIORITY or DEFAULT_PRIORITY
+_session_factory = None
+_lock = threading.Lock()
+
+def set_priority(priority):
+    """
+    A folyamat összes további API hívásának prioritási osztálya.
+    """
+    global _priority
+    if priority not in PRIORITY_SHARES:
+        raise ValueError(f"Ismeretlen prioritás: {priority!r} ({', '.join(PRIORITY_SHARES)})")
+    _priority = API_PRIORITY or priority
+
+def get_priority():
+    return _priority
+
+def _session():
+    global _session_factory
+    with _lock:
+        if _session_factory is None:
+            # A keret mindig az élő sémában van: egy shadow újratöltés is a közös keretből fogyaszt
+            _session_factory = sessionmaker(bind=get_db_engine(LIVE_SCHEMA))
+    return _session_factory()
+
+def _window_start(window, now):
+    if window == 'minute':
+        return now.replace(second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def limit_for(host, window, priority):
+    minute_budget, day_budget = BUDGETS[host]
+    budget = minute_budget if window == 'minute' else day_budget
+    return int(budget * PRIORITY_SHARES[priority])
+
+def _take(session, host, window, now, limit):
+    """
+    Egy hívás atomikus lefoglalása az ablakban, ha még a limit alatt van.
+    """
+    stmt = pg_insert(EtlApiUsage).values(host=host, window_kind=window, window_start=_window_start(window, now), calls=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['host', 'window_kind', 'window_start'],
+        set_={'calls': EtlApiUsage.calls + 1},
+        where=EtlApiUsage.calls < limit
+    ).returning(EtlApiUsage.calls)
+    return session.execute(stmt).first() is not None
+
+def acquire(url, priority=None):
+    """
+    Egy API hívás lefoglalása a közös keretből. Ha a percenkénti keret tele van,
+    a következő percig vár; ha a napi elfogyott, QuotaExceeded-et dob.
+    Ismeretlen hostra nincs korlát.
+    """
+    host = urlparse(url).netloc
+    if host not in BUDGETS:
+        return
+    priority = priority or _priority
+
+    while True:
+        now = datetime.now()
+        session = _session()
+        try:
+            if not _take(session, host, 'day', now, limit_for(host, 'day', priority)):
+                session.rollback()
+                raise QuotaExceeded(f"Elfogyott a napi API keret: {host} ({priority})")
+            if _take(session, host, 'minute', now, limit_for(host, 'minute', priority)):
+                session.commit()
+                return
+            # A napi foglalást visszaadjuk, és a következő percben újra próbáljuk
+            session.rollback()
+        finally:
+            session.close()
+
+        wait = 60 - now.second - now.microsecond / 1e6
+        logger.info(f"Percenkénti API keret tele ({host}, {priority}), várakozás {wait:.0f} mp...")
+        time.sleep(wait)
+
+def usage(host, window='day', now=None):
+    """
+    Az aktuális ablakban eddig elhasznált hívások száma.
+    """
+    now = now or datetime.now()
+    session = _session()
+    try:
+        return session.query(func.coalesce(func.sum(EtlApiUsage.calls), 0)).filter_by(
+            host=host, window_kind=window, window_start=_window_start(window, now)
+        ).scalar()
+    finally:
+        session.close()
+
+def remaining(host, priority=None, window='day'):
+    """
+    Ennyi hívás fér még bele a prioritási osztály keretébe az aktuális ablakban.
+    """
+    return max(0, limit_for(host, window, priority or _priority) - usage(host, window))
+
+# --- DRY-RUN BECSLÉS ---
+# A becslés csak a DB-t olvassa, API hívás nélkül; a szezon csapatlistáját (egy FD hívás) a hívó adja.
+
+TEAMS_PER_COMPETITION = 20 # ha az FD csapatlista nem elérhető
+SQUAD_SIZE = 25 # egy keret átlagos létszáma
+NEW_TEAM_TM_CALLS = 2 # csapat keresés + klub profil
+PAST_SEASON_PLAYER_TM_CALLS = 1 # korábbi szezon keretében a játékos csapatát a profil adja
+PLAYER_DETAIL_TM_CALLS = 3 # market_value, transfers, stats
+
+def estimate_season_load(session, competition_code, fd_team_ids=None, current=True):
+    """
+    Egy run_season_load futás becsült hívásszáma hostonként. fd_team_ids: a szezon
+    csapatainak FD ID-i (a /competitions/{code}/teams válaszából); ha nincs meg,
+    TEAMS_PER_COMPETITION csapattal számol. A már betöltött csapatokra csak a keret
+    lekérése kell, az új csapatok játékosai (SQUAD_SIZE fővel) újak: az aktuális
+    szezon keretéből profil hívás nélkül, korábbi szezonnál játékosonként egy profil
+    hívással jönnek létre (lásd utils.build_player). A hiányos keret adatok miatti
+    keresések nincsenek benne.
+    """
+    comp = session.query(DimCompetition).filter_by(fd_id=competition_code).first()
+    if fd_team_ids is not None:
+        teams = len(fd_team_ids)
+        known_teams = session.query(DimTeam).filter(DimTeam.fd_id.in_(fd_team_ids)).count() if fd_team_ids else 0
+        new_teams = teams - known_teams
+    else:
+        known_teams = 0
+        if comp:
+            known_teams = session.query(DimTeam).filter_by(competition_id=comp.competition_id).count()
+        teams = max(known_teams, TEAMS_PER_COMPETITION)
+        new_teams = max(0, TEAMS_PER_COMPETITION - known_teams)
+    new_players = new_teams * SQUAD_SIZE
+    return {
+        FD_HOST: 3, # bajnokság, csapatok, meccsek
+        TM_HOST: (0 if comp and comp.tm_id else 1) + new_teams * NEW_TEAM_TM_CALLS
+                 + teams # keretek
+                 + (0 if current else new_players * PAST_SEASON_PLAYER_TM_CALLS),
+    }
+
+def estimate_player_details(session, limit=None, shard=None):
+    """
+    Egy run_player_details_etl futás becsült hívásszáma hostonként.
+    """
+    query = session.query(DimPlayer).filter(DimPlayer.tm_id.isnot(None))
+    players = shard_filter(query, DimPlayer.tm_id, shard).count()
+    if limit:
+        players = min(players, limit)
+    return {FD_HOST: 0, TM_HOST: players * PLAYER_DETAIL_TM_CALLS}
+
+def report_estimate(estimate, priority=None):
+    """
+    A becslés kiírása a hátralévő napi kerettel együtt. True, ha belefér.
+    """
+    priority = priority or _priority
+    fits = True
+    for host, calls in estimate.items():
+        left = remaining(host, priority)
+        minute_limit = limit_for(host, 'minute', priority)
+        ok = calls <= left and (minute_limit > 0 or calls == 0)
+        fits = fits and ok
+        duration = timedelta(minutes=calls / minute_limit) if minute_limit else '-'
+        print(f"{host}: ~{calls} hívás, hátralévő napi keret ({priority}): {left}, "
+              f"legalább {duration} a percenkénti keret miatt{'' if ok else '  -> NEM FÉR BELE'}")
+    return fits
@@ -0,0 +1,117 @@
+import time
+import argparse
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy.sql import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Base, EtlPlayerRefresh
+from quota import TM_HOST, PLAYER_DETAIL_TM_CALLS, remaining
+from season_registry import current_start_year
+from utils import get_db_session, logger
+
+# --- PRIORITÁSOS JÁTÉKOS FRISSÍTÉSI SOR ---
+# A játékosokat nem tábla sorrendben frissítjük, hanem pontszám szerint:
+#   feedenkénti elavultság (napokban, MAX_STALENESS_DAYS-nél levágva, súlyozva)
+#   x piaci érték szorzó (logaritmikus) x idei szezonban pályára lépett szorzó.
+# Ha a futás idő vagy API keret miatt megszakad, a legfontosabb játékosok már
+# frissek, a sikeres feedek ideje pedig megmarad (etl_player_refresh), így a
+# következő napi futás ott folytatja, ahol a legnagyobb a lemaradás.
+
+FEED_WEIGHTS = {
+    'market_value': 1.0,
+    'stats': 1.0,
+    'transfers': 0.5,
+}
+MAX_STALENESS_DAYS = 30 # a soha nem frissített feed is ennyinek számít
+RECENT_PLAYER_BOOST = 2.0
+
+class QueuedPlayer(NamedTuple):
+    player_id: int
+    tm_id: int
+    name: str
+    score: float
+
+FEED_VALUES = ", ".join(f"('{feed}', {weight})" for feed, weight in FEED_WEIGHTS.items())
+
+SQL_REFRESH_QUEUE = f"""
+    SELECT p.player_id, p.tm_id, p.name,
+        (
+            SELECT SUM(f.weight * LEAST(EXTRACT(EPOCH FROM (:now - r.refreshed_at)) / 86400, :max_days))
+            FROM (VALUES {FEED_VALUES}) AS f (feed, weight)
+            LEFT JOIN etl_player_refresh r ON r.player_id = p.player_id AND r.feed = f.feed
+        )
+        * (1 + LN(1 + COALESCE(l.market_value_eur, 0) / 1000000.0))
+        * CASE WHEN EXISTS (
+            SELECT 1 FROM fact_player_season_stats st
+            JOIN dim_seasons s ON s.season_id = st.season_id
+            WHERE st.player_id = p.player_id AND s.start_year = :start_year AND st.appearances > 0
+        ) THEN :recent_boost ELSE 1 END AS score
+    FROM dim_players p
+    LEFT JOIN fact_market_values_latest l ON l.player_id = p.player_id
+    WHERE p.tm_id IS NOT NULL {{shard}}
+    ORDER BY score DESC, p.player_id
+    {{limit}}
+"""
+
+def refresh_queue(session, shard=None, limit=None, now=None):
+    """
+    A játékosok a frissítés sürgőssége szerint csökkenő sorrendben (QueuedPlayer lista).
+    shard=(i, N) esetén csak a tm_id % N == i játékosok.
+    """
+    params = {
+        'now': now or datetime.now(), 'max_days': MAX_STALENESS_DAYS,
+        'start_year': current_start_year(), 'recent_boost': RECENT_PLAYER_BOOST,
+    }
+    shard_sql, limit_sql = '', ''
+    if shard:
+        shard_sql = "AND p.tm_id % :shard_count = :shard_index"
+        params.update(shard_index=shard[0], shard_count=shard[1])
+    if limit:
+        limit_sql = "LIMIT :limit"
+        params['limit'] = limit
+    rows = session.execute(text(SQL_REFRESH_QUEUE.format(shard=shard_sql, limit=limit_sql)), params)
+    return [QueuedPlayer(*row) for row in rows]
+
+def mark_refreshed(session, player_ids, feed, now=None):
+    """
+    A feed sikeres frissítésének rögzítése (commit nélkül).
+    """
+    if not player_ids:
+        return
+    now = now or datetime.now()
+    stmt = pg_insert(EtlPlayerRefresh).values([
+        {'player_id': player_id, 'feed': feed, 'refreshed_at': now} for player_id in set(player_ids)
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=['player_id', 'feed'], set_={'refreshed_at': stmt.excluded.refreshed_at}
+    ))
+
+def budgeted(players, time_budget=None, calls_per_player=PLAYER_DETAIL_TM_CALLS, stop=None):
+    """
+    A sor elemei, amíg belefér az időkeretbe (mp) és a prioritási osztály napi TM keretébe.
+    Pipeline forrásként is használható (a keret a lekérés előtt ellenőrződik).
+    A stop Event beállítása (pl. elveszett shard bérlet) után nem ad több elemet.
+    """
+    deadline = time.monotonic() + time_budget if time_budget else None
+    for i, player in enumerate(players):
+        if stop is not None and stop.is_set():
+            logger.warning(f"Leállítás kérve: {i} játékos feldolgozva, a többi a következő futásra marad.")
+            return
+        if deadline and time.monotonic() >= deadline:
+            logger.warning(f"Elfogyott az időkeret: {i} játékos feldolgozva, a többi a következő futásra marad.")
+            return
+        if remaining(TM_HOST) < calls_per_player:
+            logger.warning(f"Elfogyott a napi TM keret: {i} játékos feldolgozva, a többi a következő futásra marad.")
+            return
+        yield player
+
+def ensure_refresh_queue(engine):
+    Base.metadata.create_all(engine, tables=[EtlPlayerRefresh.__table__])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A játékos frissítési sor elejének kiírása (futtatás nélkül).")
+    parser.add_argument('-n', '--top', type=int, default=20, help="Ennyi játékos a sor elejéről.")
+    args = parser.parse_args()
+
+    for player in refresh_queue(get_db_session(), limit=args.top):
+        print(f"{player.score:8.2f}  {player.name} (TM ID: {player.tm_id})")
@@ -0,0 +1,152 @@
+import argparse
+from datetime import datetime
+from config import TRACKED_COMPETITIONS
+from models import DimSeason, DimCompetition, DimTeam, DimPlayer, EtlDeadLetter
+from utils import get_db_session, logger, record_dead_letter, requests_get_retry, FD_HEADERS, get_or_create_player
+import etl_daily
+import etl_player_data
+import etl_season_load
+from etl_runs import etl_run
+
+# --- DEAD-LETTER ÚJRAFELDOLGOZÁS ---
+# Csak a sikertelenül feldolgozott entitásokat futtatja újra (nem a teljes ETL-t).
+# Egy bejegyzés akkor lezárt, ha az újrafuttatás alatt ugyanarra az entitásra
+# (entity_type + entity_key) semmilyen feeddel nem érkezett új hiba: a feldolgozó
+# függvények a hibát gyakran más feed néven rögzítik (pl. 'daily_update' újrafuttatása
+# alatt 'transfers'), ezért nem csak a saját bejegyzés last_failed_at mezőjét nézzük.
+
+session = get_db_session()
+
+def retry_player(entry):
+    player = etl_player_data.session.query(DimPlayer).filter_by(tm_id=entry.entity_key).first()
+    if player is None:
+        raise LookupError(f"Nincs ilyen játékos a DB-ben: {entry.entity_key}")
+    if entry.feed == 'daily_update':
+        tracked_tm_ids = {
+            comp.tm_id for comp in etl_daily.session.query(DimCompetition)
+            .filter(DimCompetition.fd_id.in_(TRACKED_COMPETITIONS)).all() if comp.tm_id
+        }
+        daily_player = etl_daily.session.query(DimPlayer).filter_by(tm_id=entry.entity_key).first()
+        etl_daily.safe_update('player', entry.entity_key, etl_daily.update_player_details,
+                              daily_player, etl_daily.get_current_season_tm_name(), tracked_tm_ids)
+    elif entry.feed in etl_player_data.PROCESSORS:
+        etl_player_data.process_player(player, [entry.feed])
+    else:
+        # transform / write hiba: a játékos összes feedje
+        etl_player_data.process_player(player)
+
+def retry_player_create(entry):
+    if get_or_create_player(entry.entity_key) is None:
+        raise LookupError(f"A játékos létrehozása ismét sikertelen: {entry.entity_key}")
+
+def retry_team(entry):
+    team = etl_daily.session.query(DimTeam).filter_by(tm_id=entry.entity_key).first()
+    if team is None:
+        raise LookupError(f"Nincs ilyen csapat a DB-ben: {entry.entity_key}")
+    etl_daily.safe_update('team', entry.entity_key, etl_daily.update_team_details, team)
+
+def retry_team_squad(entry):
+    tm_id, season_year = entry.entity_key.split('/')
+    team = etl_season_load.session.query(DimTeam).filter_by(tm_id=tm_id).first()
+    if team is None:
+        raise LookupError(f"Nincs ilyen csapat a DB-ben: {tm_id}")
+    etl_season_load.season_load_players_from_team(team, int(season_year))
+
+def retry_match(entry):
+    resp = requests_get_retry(f"http://api.football-data.org/v4/matches/{entry.entity_key}", headers=FD_HEADERS)
+    if resp is None or resp.status_code != 200:
+        raise ConnectionError(f"Sikertelen meccs lekérdezés: {entry.entity_key}")
+    match_data = resp.json()
+    competitions_by_code = {comp.fd_id: comp for comp in etl_daily.session.query(DimCompetition).all()}
+    default_season = etl_daily.session.query(DimSeason).filter_by(
+        season_name_TM=etl_daily.get_current_season_tm_name()
+    ).first()
+    etl_daily.update_matches([match_data], competitions_by_code, default_season)
+
+def retry_competition_matches(entry):
+    code, start_year = entry.entity_key.split('/')
+    competition_obj = etl_season_load.session.query(DimCompetition).filter_by(fd_id=code).first()
+    season_obj = etl_season_load.session.query(DimSeason).filter_by(start_year=int(start_year)).first()
+    if competition_obj is None or season_obj is None:
+        raise LookupError(f"Nincs ilyen bajnokság / szezon a DB-ben: {entry.entity_key}")
+    etl_season_load.season_load_matches(competition_obj, season_obj)
+
+RETRY_HANDLERS = {
+    ('player', 'player_create'): retry_player_create,
+    ('player', None): retry_player,
+    ('team', 'squad'): retry_team_squad,
+    ('team', None): retry_team,
+    ('match', None): retry_match,
+    ('competition', 'matches'): retry_competition_matches,
+}
+
+def failed_since(entry, since):
+    """
+    Érkezett-e új hiba az entitásra (bármely feeddel) a megadott időpont óta.
+    """
+    return session.query(EtlDeadLetter.dead_letter_id).filter(
+        EtlDeadLetter.entity_type == entry.entity_type,
+        EtlDeadLetter.entity_key == entry.entity_key,
+        EtlDeadLetter.last_failed_at >= since,
+    ).first() is not None
+
+def get_handler(entry):
+    return RETRY_HANDLERS.get((entry.entity_type, entry.feed)) or RETRY_HANDLERS.get((entry.entity_type, None))
+
+def retry_dead_letters(entity_type=None, feed=None, limit=None):
+    """
+    A nyitott dead-letter bejegyzések újrafeldolgozása.
+    Visszaad: (lezárt, továbbra is hibás) darabszám
+    """
+    query = session.query(EtlDeadLetter).filter(EtlDeadLetter.resolved_at.is_(None))
+    if entity_type:
+        query = query.filter(EtlDeadLetter.entity_type == entity_type)
+    if feed:
+        query = query.filter(EtlDeadLetter.feed == feed)
+    entries = query.order_by(EtlDeadLetter.first_failed_at).limit(limit).all()
+    logger.info(f"{len(entries)} nyitott dead-letter bejegyzés újrafeldolgozása...")
+
+    resolved, failed = 0, 0
+    for i, entry in enumerate(entries):
+        logger.info(f"[{i+1}/{len(entries)}] {entry.entity_type} {entry.entity_key} ({entry.feed}), {entry.attempts}. próbálkozás után")
+        handler = get_handler(entry)
+        if handler is None:
+            logger.warning(f"Nincs újrafeldolgozó: {entry.entity_type}/{entry.feed}")
+            failed += 1
+            continue
+
+        started = datetime.now()
+        try:
+            handler(entry)
+        except Exception as e:
+            etl_daily.session.rollback()
+            etl_player_data.session.rollback()
+            etl_season_load.session.rollback()
+            record_dead_letter(entry.entity_type, entry.entity_key, entry.feed, e)
+
+        # A dead-letter sessionje külön commitol (READ COMMITTED: a lekérdezés már látja)
+        if not failed_since(entry, started):
+            entry.resolved_at = datetime.now()
+            session.commit()
+            resolved += 1
+        else:
+            failed += 1
+
+    logger.info(f"Dead-letter újrafeldolgozás vége: {resolved} lezárva, {failed} továbbra is hibás.")
+    return resolved, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sikertelenül feldolgozott entitások (dead-letter) újrafuttatása.")
+    parser.add_argument('-t', '--type', type=str, help="Csak ez az entitás típus (player, team, match, competition).")
+    parser.add_argument('-f', '--feed', type=str, help="Csak ez a feed (pl. transfers, market_value, stats, club_profile).")
+    parser.add_argument('-l', '--limit', type=int, help="Legfeljebb ennyi bejegyzés.")
+    args = parser.parse_args()
+
+    try:
+        # Saját ETL futásként: az újrafeldolgozott sorok run_id-t kapnak (változás feed, kocka, cache verzió)
+        with etl_run(session, 'dead_letter_retry'):
+            resolved, failed = retry_dead_letters(args.type, args.feed, args.limit)
+    except Exception as e:
+        logger.error(f"Hiba a dead-letter újrafeldolgozás során: {e}")
+        exit(1)
+    exit(0 if failed == 0 else 1)
@@ -0,0 +1,158 @@
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+# --- KÖNNYŰ SOR TÍPUSOK A TÉNY TÁBLÁKHOZ ---
+# A fetch és a load között ezek utaznak ORM objektumok helyett:
+# nincs identity map / instrumentation, és egyenesen Core bulk insertbe mennek.
+
+class MarketValueRow(NamedTuple):
+    player_id: int
+    team_id: Optional[int]
+    date_recorded: date
+    market_value_eur: Optional[int]
+
+class TransferRow(NamedTuple):
+    player_id: int
+    teamFrom_id: Optional[int]
+    teamTo_id: Optional[int]
+    season_id: Optional[int]
+    date_recorded: date
+    market_value_eur: Optional[int]
+    fee_eur: Optional[int]
+
+class PlayerSeasonStatRow(NamedTuple):
+    player_id: int
+    team_id: Optional[int]
+    season_id: int
+    competition_id: int
+    appearances: Optional[int]
+    goals: Optional[int]
+    assists: Optional[int]
+    yellow_cards: Optional[int]
+    red_cards: Optional[int]
+    minutes_played: Optional[int]
+
+class MatchRow(NamedTuple):
+    fd_match_id: int
+    date: datetime
+    season_id: Optional[int]
+    competition_id: Optional[int]
+    home_team_id: Optional[int]
+    away_team_id: Optional[int]
+    home_score: Optional[int]
+    away_score: Optional[int]
+    status: str
+
+# --- PARSOLÁS ÉS VALIDÁLÁS ---
+
+def parse_date(value):
+    """
+    TM dátum ('2023-07-01' vagy ISO időbélyeg) -> date. Hiányzó/rossz érték: ValueError.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value or not isinstance(value, str):
+        raise ValueError(f"Hiányzó dátum: {value!r}")
+    return date.fromisoformat(value[:10])
+
+def parse_int(value):
+    """
+    Egész szám vagy None. A TM néha stringként ('1500000', '-') vagy floatként adja.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    text = str(value).strip().replace(',', '')
+    if text in ('', '-', '?'):
+        return None
+    return int(text)
+
+# A sor építők nem dobnak hibát: a nem értelmezhető értéket (pl. '€1.5m' díj) nyersen
+# hagyják a sorban, a hiányzó kulcsot None-ként, és a validálás (validation.py)
+# teszi karanténba a hibás szabály nevével.
+
+def int_or_raw(value):
+    try:
+        return parse_int(value)
+    except ValueError:
+        return value
+
+def date_or_raw(value):
+    """
+    parse_date, de hiányzó dátumnál None, nem értelmezhetőnél a nyers érték.
+    """
+    if value is None:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        return value
+
+def market_value_row(entry, player_id, team_id):
+    return MarketValueRow(
+        player_id=player_id,
+        team_id=team_id,
+        date_recorded=date_or_raw(entry.get('date')),
+        market_value_eur=int_or_raw(entry.get('marketValue')),
+    )
+
+def transfer_row(entry, player_id, from_team_id, to_team_id, season_id):
+    return TransferRow(
+        player_id=player_id,
+        teamFrom_id=from_team_id,
+        teamTo_id=to_team_id,
+        season_id=season_id,
+        date_recorded=date_or_raw(entry.get('date')),
+        market_value_eur=int_or_raw(entry.get('marketValue')),
+        fee_eur=int_or_raw(entry.get('fee')),
+    )
+
+def season_stat_row(entry, player_id, team_id, season_id, competition_id):
+    return PlayerSeasonStatRow(
+        player_id=player_id,
+        team_id=team_id,
+        season_id=season_id,
+        competition_id=competition_id,
+        appearances=int_or_raw(entry.get('appearances')),
+        goals=int_or_raw(entry.get('goals')),
+        assists=int_or_raw(entry.get('assists')),
+        yellow_cards=int_or_raw(entry.get('yellowCards')),
+        red_cards=int_or_raw(entry.get('redCards')),
+        minutes_played=int_or_raw(entry.get('minutesPlayed')),
+    )
+
+def match_row(match, season_id, competition_id, home_team_id, away_team_id):
+    full_time = (match.get('score') or {}).get('fullTime') or {}
+    return MatchRow(
+        fd_match_id=match['id'],
+        date=datetime.strptime(match['utcDate'], "%Y-%m-%dT%H:%M:%SZ"),
+        season_id=season_id,
+        competition_id=competition_id,
+        home_team_id=home_team_id,
+        away_team_id=away_team_id,
+        home_score=int_or_raw(full_time.get('home')),
+        away_score=int_or_raw(full_time.get('away')),
+        status=match.get('status'),
+    )
+
+# --- BETÖLTÉS ---
+
+def bulk_insert(session, model, rows, chunk_size=5000):
+    """
+    Sorok beszúrása Core executemany-vel (commit nélkül).
+    A unique kulcsba ütköző sorokat (párhuzamos futás már beszúrta) kihagyja.
+    Visszaadja a ténylegesen beszúrt sorok számát (a RETURNING sorokból).
+    """
+    rows = list(rows)
+    pk = model.__table__.primary_key.columns.values()[0]
+    stmt = pg_insert(model).on_conflict_do_nothing().returning(pk)
+    inserted = 0
+    for i in range(0, len(rows), chunk_size):
+        inserted += len(session.execute(stmt, [row._asdict() for row in rows[i:i + chunk_size]]).all())
+    return inserted
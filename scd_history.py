@@ -0,0 +1,192 @@
+import argparse
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from models import Base, DimPlayer, DimTeamHistory, DimPlayerTeamHistory
+
+# --- SCD TYPE-2 TÖRTÉNET ---
+# A DimTeam pénzügyi adatai és a DimPlayer aktuális csapata felülíródnak,
+# ezért a változásokat verziókként is eltároljuk [valid_from, valid_to) intervallummal.
+# Egy adott napra vonatkozó állapot így egyetlen tartomány-join.
+
+def _insert_version(session, model, key, as_of, values):
+    """
+    Új verzió as_of naptól (commit nélkül). A korábbra datált (pl. késve érkező
+    átigazolás) verzió a meglévők közé kerül: az as_of napot lefedő verzió as_of
+    napon zárul, az új a következő verzió kezdetéig érvényes. Ugyanarra a napra
+    érkező verzió helyben felülírja a meglévőt.
+    Visszaad: (volt-e változás, az új verzió-e az aktuális).
+    """
+    versions = sorted(
+        session.query(model).filter_by(**key).all(),
+        key=lambda version: version.valid_from or date.min
+    )
+    earlier = [version for version in versions if version.valid_from is None or version.valid_from <= as_of]
+    later = [version for version in versions if version.valid_from is not None and version.valid_from > as_of]
+    covering = earlier[-1] if earlier and (earlier[-1].valid_to is None or earlier[-1].valid_to > as_of) else None
+    following = later[0] if later else None
+
+    def same(version):
+        return all(getattr(version, column) == value for column, value in values.items())
+
+    if covering is not None and same(covering):
+        return False, covering.valid_to is None
+    if covering is not None and covering.valid_from == as_of:
+        for column, value in values.items():
+            setattr(covering, column, value)
+        return True, covering.valid_to is None
+    if covering is not None:
+        covering.valid_to = as_of
+    if following is not None and same(following):
+        # A következő verzió már ezt az állapotot rögzíti: korábbra húzzuk a kezdetét
+        following.valid_from = as_of
+        return True, following.valid_to is None
+    session.add(model(**key, **values, valid_from=as_of, valid_to=following.valid_from if following else None))
+    return True, following is None
+
+def set_team_financials(session, team, market_value, transfer_record, as_of=None):
+    """
+    Frissíti a csapat aktuális piaci értékét / transzfer rekordját és új verziót nyit.
+    Korábbra datált adat csak a történetbe kerül, az aktuális értéket nem írja felül.
+    Visszaadja, hogy volt-e változás (commit nélkül).
+    """
+    changed, is_current = _insert_version(
+        session, DimTeamHistory, {'team_id': team.team_id}, as_of or date.today(),
+        {'currentMarketValue': market_value, 'currentTransferRecord': transfer_record}
+    )
+    if is_current:
+        team.currentMarketValue = market_value
+        team.currentTransferRecord = transfer_record
+    return changed
+
+def record_player_team(session, player_id, team_id, as_of=None):
+    """
+    Klubtagság verzió as_of naptól (commit nélkül). Visszaadja, hogy ez lett-e az aktuális.
+    """
+    _, is_current = _insert_version(
+        session, DimPlayerTeamHistory, {'player_id': player_id}, as_of or date.today(), {'team_id': team_id}
+    )
+    return is_current
+
+def set_player_team(session, player, team_id, as_of=None):
+    """
+    Átállítja a játékos aktuális csapatát és új klubtagság verziót nyit (commit nélkül).
+    Korábbra datált átigazolás csak a történetbe kerül, az aktuális csapat marad.
+    """
+    if record_player_team(session, player.player_id, team_id, as_of):
+        player.current_team_id = team_id
+
+def record_transfers(session, rows):
+    """
+    Klubtagság verziók a (validált) átigazolás sorokból, dátum szerint (commit nélkül).
+    Ha egy átigazolás lett az aktuális verzió, a játékos aktuális csapata is átáll.
+    """
+    for row in sorted(rows, key=lambda row: (row.player_id, row.date_recorded)):
+        if record_player_team(session, row.player_id, row.teamTo_id, row.date_recorded):
+            session.query(DimPlayer).filter_by(player_id=row.player_id).update(
+                {DimPlayer.current_team_id: row.teamTo_id}, synchronize_session=False
+            )
+
+def open_versions(session, players=(), teams=()):
+    """
+    Az újonnan felvett (már ID-val rendelkező) játékosok és csapatok első verziója mától (commit nélkül).
+    """
+    today = date.today()
+    session.add_all([
+        DimPlayerTeamHistory(player_id=player.player_id, team_id=player.current_team_id, valid_from=today)
+        for player in players if player.current_team_id is not None
+    ])
+    session.add_all([
+        DimTeamHistory(
+            team_id=team.team_id, currentMarketValue=team.currentMarketValue,
+            currentTransferRecord=team.currentTransferRecord, valid_from=today
+        )
+        for team in teams
+    ])
+
+# A klubtagság múltja az átigazolásokból: teamTo a következő átigazolásig, az utolsó a
+# játékos legkorábbi meglévő verziójáig (pl. a keret betöltésekor nyitott mai verzió).
+# Csak a meglévő verziók előtti átigazolások kerülnek be, így újrafuttatható.
+SQL_BACKFILL_PLAYERS = """
+    INSERT INTO dim_player_team_history (player_id, team_id, valid_from, valid_to)
+    SELECT t.player_id, t."teamTo_id", t.date_recorded,
+        COALESCE(LEAD(t.date_recorded) OVER (PARTITION BY t.player_id ORDER BY t.date_recorded), first.valid_from)
+    FROM fact_transfers t
+    LEFT JOIN LATERAL (
+        SELECT MIN(h.valid_from) AS valid_from FROM dim_player_team_history h WHERE h.player_id = t.player_id
+    ) first ON true
+    WHERE t.date_recorded IS NOT NULL
+        AND (first.valid_from IS NULL OR t.date_recorded < first.valid_from)
+"""
+
+# Átigazolás nélküli játékosok: az aktuális csapat mától
+SQL_BACKFILL_PLAYERS_CURRENT = """
+    INSERT INTO dim_player_team_history (player_id, team_id, valid_from, valid_to)
+    SELECT p.player_id, p.current_team_id, CURRENT_DATE, NULL
+    FROM dim_players p
+    WHERE NOT EXISTS (SELECT 1 FROM dim_player_team_history h WHERE h.player_id = p.player_id)
+"""
+
+SQL_BACKFILL_TEAMS = """
+    INSERT INTO dim_team_history (team_id, "currentMarketValue", "currentTransferRecord", valid_from, valid_to)
+    SELECT t.team_id, t."currentMarketValue", t."currentTransferRecord", CURRENT_DATE, NULL
+    FROM dim_teams t
+    WHERE NOT EXISTS (SELECT 1 FROM dim_team_history h WHERE h.team_id = t.team_id)
+"""
+
+def backfill_history(session):
+    """
+    Kezdeti verziók feltöltése a meglévő adatokból (commit nélkül): az átigazolások
+    a meglévő verziók elé, az aktuális állapot a verzió nélküli entitásokra.
+    A hideg (COPY) betöltések a végén ezzel pótolják a verziókat.
+    """
+    for sql in (SQL_BACKFILL_PLAYERS, SQL_BACKFILL_PLAYERS_CURRENT, SQL_BACKFILL_TEAMS):
+        session.execute(text(sql))
+
+# --- AS-OF LEKÉRDEZÉSEK ---
+
+SQL_SQUAD_ON_DATE = """
+    SELECT h.player_id, mv.market_value_eur
+    FROM dim_player_team_history h
+    LEFT JOIN LATERAL (
+        SELECT m.market_value_eur
+        FROM fact_market_values m
+        WHERE m.player_id = h.player_id AND m.date_recorded <= :as_of
+        ORDER BY m.date_recorded DESC
+        LIMIT 1
+    ) mv ON true
+    WHERE h.team_id = :team_id
+        AND h.valid_from <= :as_of
+        AND (h.valid_to IS NULL OR h.valid_to > :as_of)
+"""
+
+def get_squad_on_date(session, team_id, as_of):
+    """
+    A csapat kerete egy adott napon, a játékosok akkori piaci értékével.
+    Visszaad: ([(player_id, market_value_eur), ...], összesített keretérték)
+    """
+    rows = session.execute(text(SQL_SQUAD_ON_DATE), {'team_id': team_id, 'as_of': as_of}).all()
+    total = sum(row.market_value_eur or 0 for row in rows)
+    return rows, total
+
+def get_team_financials_on_date(session, team_id, as_of):
+    """
+    A csapat pénzügyi adatainak verziója egy adott napon (vagy None).
+    """
+    return session.query(DimTeamHistory).filter(
+        DimTeamHistory.team_id == team_id,
+        DimTeamHistory.valid_from <= as_of,
+        (DimTeamHistory.valid_to.is_(None)) | (DimTeamHistory.valid_to > as_of)
+    ).first()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SCD history táblák létrehozása és kezdeti feltöltése.")
+    parser.parse_args()
+
+    engine = get_db_engine()
+    Base.metadata.create_all(engine, tables=[DimTeamHistory.__table__, DimPlayerTeamHistory.__table__])
+    with Session(engine) as session:
+        backfill_history(session)
+        session.commit()
+    print("A history táblák feltöltve.")
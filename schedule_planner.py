@@ -0,0 +1,174 @@
+import argparse
+import math
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from config import TRACKED_COMPETITIONS, MATCH_REFRESH_DELAY_MINUTES
+from models import DimCompetition, DimTeam, DimPlayer, FactMatch
+from utils import get_db_session, logger
+from etl_daily import fetch_fd_matches
+from quota import FD_HOST, TM_HOST, remaining
+
+# --- ADAPTÍV NAPI ÜTEMEZÉS ---
+# A fix éjféli teljes frissítés helyett a nap meccsnaptára alapján tervezünk:
+#   - könnyű meccs eredmény frissítés a várható lefújás után (kezdés + késleltetés),
+#     az egymáshoz közeli kezdések egy futásba vonva; meccs nélküli napon nincs ilyen futás,
+#   - a nehéz játékos szinkron a leghosszabb meccsmentes ablak elejére kerül,
+#     a napi TM keretbe nem férő szinkron shardokra bontva, napról napra körbejárva.
+# Minden időpont UTC (az FD utcDate és a fact_matches.date is UTC).
+
+FD_BATCH_SIZE = 10 # fetch_fd_matches: ennyi bajnokság egy kérésben
+PLAYER_FEED_CALLS = 3 # transfers, market_value, stats
+MERGE_WINDOW = timedelta(minutes=30)
+BUSY_BEFORE_KICKOFF = timedelta(minutes=30)
+
+class PlannedRun(NamedTuple):
+    run_at: datetime
+    job: str # 'matches' vagy 'players'
+    parameters: dict
+    api_calls: int
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def parse_utc(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+def upcoming_kickoffs(session, competition_codes, start, end):
+    """
+    A tervezési ablak még le nem játszott meccseinek kezdési időpontjai.
+    Elsődlegesen FD-ből, ha az nem elérhető, a fact_matches nem lefutott soraiból.
+    """
+    matches = fetch_fd_matches(competition_codes, start.date().isoformat(), end.date().isoformat())
+    if matches is not None:
+        return sorted(
+            kickoff for kickoff in (parse_utc(m['utcDate']) for m in matches if m.get('status') != 'FINISHED')
+            if start <= kickoff < end
+        )
+
+    logger.warning("FD meccsnaptár nem elérhető, a fact_matches alapján tervezünk.")
+    rows = session.query(FactMatch.date).join(
+        DimCompetition, DimCompetition.competition_id == FactMatch.competition_id
+    ).filter(
+        DimCompetition.fd_id.in_(competition_codes),
+        FactMatch.status != 'FINISHED',
+        FactMatch.date >= start,
+        FactMatch.date < end,
+    ).order_by(FactMatch.date)
+    return [row.date for row in rows]
+
+def match_refresh_runs(kickoffs, delay, fd_calls_per_run):
+    """
+    Meccs eredmény frissítések: a MERGE_WINDOW-n belül lefújt meccsek egy futásba
+    kerülnek, a csoport utolsó várható lefújása után.
+    """
+    runs = []
+    group = []
+    for kickoff in kickoffs:
+        if group and kickoff - group[-1] > MERGE_WINDOW:
+            runs.append(_match_run(group, delay, fd_calls_per_run))
+            group = []
+        group.append(kickoff)
+    if group:
+        runs.append(_match_run(group, delay, fd_calls_per_run))
+    return runs
+
+def _match_run(group, delay, fd_calls_per_run):
+    return PlannedRun(
+        run_at=group[-1] + delay,
+        job='matches',
+        parameters={'date_from': group[0].date().isoformat(), 'date_to': group[-1].date().isoformat()},
+        api_calls=fd_calls_per_run,
+    )
+
+def fit_match_runs(runs, budget):
+    """
+    Ha a napi FD keret kevés, a szomszédos futásokat összevonjuk (a későbbi időpontra),
+    így kevesebb, de mindent lefedő frissítés marad.
+    """
+    runs = list(runs)
+    while runs and sum(run.api_calls for run in runs) > budget and len(runs) > 1:
+        first, second = runs[0], runs[1]
+        runs[:2] = [second._replace(parameters={
+            'date_from': first.parameters['date_from'], 'date_to': second.parameters['date_to']
+        })]
+    return runs
+
+def quiet_window_start(kickoffs, start, end, delay):
+    """
+    A leghosszabb meccsmentes ablak eleje [start, end) között.
+    Foglalt: kezdés előtt BUSY_BEFORE_KICKOFF-tól a frissítés utáni MERGE_WINDOW-ig.
+    """
+    busy = sorted((k - BUSY_BEFORE_KICKOFF, k + delay + MERGE_WINDOW) for k in kickoffs)
+    best_start, best_length = start, timedelta(0)
+    cursor = start
+    for busy_from, busy_to in busy + [(end, end)]:
+        if busy_from - cursor > best_length:
+            best_start, best_length = cursor, busy_from - cursor
+        cursor = max(cursor, busy_to)
+    return best_start
+
+def estimate_player_sync_calls(session, competition_codes):
+    """
+    Becsült TM hívásszám a teljes csapat + játékos szinkronhoz.
+    """
+    competition_ids = [
+        comp_id for (comp_id,) in
+        session.query(DimCompetition.competition_id).filter(DimCompetition.fd_id.in_(competition_codes))
+    ]
+    teams = session.query(DimTeam).filter(
+        DimTeam.tm_id.isnot(None), DimTeam.competition_id.in_(competition_ids)
+    ).count()
+    players = session.query(DimPlayer).filter(DimPlayer.tm_id.isnot(None)).count()
+    return teams + players * PLAYER_FEED_CALLS
+
+def plan_day(session, now=None, competition_codes=None, fd_budget=None, tm_budget=None,
+             delay_minutes=MATCH_REFRESH_DELAY_MINUTES):
+    """
+    A következő 24 óra futásai időrendben. A keretek alapból a közös API keretből
+    még hátralévő hívások (meccs frissítés: 'live', játékos szinkron: 'daily' osztály).
+    """
+    fd_budget = remaining(FD_HOST, 'live') if fd_budget is None else fd_budget
+    tm_budget = remaining(TM_HOST, 'daily') if tm_budget is None else tm_budget
+    now = now or utc_now()
+    end = now + timedelta(days=1)
+    competition_codes = competition_codes or TRACKED_COMPETITIONS
+    delay = timedelta(minutes=delay_minutes)
+    fd_calls_per_run = math.ceil(len(competition_codes) / FD_BATCH_SIZE)
+
+    # A késő esti meccsek eredménye a következő napra is átnyúlhat: a tegnapiakat is nézzük
+    kickoffs = upcoming_kickoffs(session, competition_codes, now - delay, end)
+    fd_budget -= fd_calls_per_run # a tervezés saját lekérése
+
+    runs = fit_match_runs(
+        [run for run in match_refresh_runs(kickoffs, delay, fd_calls_per_run) if run.run_at >= now],
+        fd_budget
+    )
+    if not kickoffs:
+        logger.info("Nincs meccs a következő 24 órában (pl. válogatott szünet): meccs frissítés nem kell.")
+
+    # Játékos szinkron a csendes ablakban, a TM keretbe férő shardokra bontva
+    tm_calls = estimate_player_sync_calls(session, competition_codes)
+    shard_count = max(1, math.ceil(tm_calls / tm_budget)) if tm_budget > 0 else 0
+    if shard_count:
+        parameters = {}
+        if shard_count > 1:
+            shard = now.timetuple().tm_yday % shard_count
+            parameters['shard'] = f"{shard}/{shard_count}"
+            logger.info(f"A játékos szinkron ({tm_calls} hívás) nem fér a napi TM keretbe: ma a {shard}/{shard_count} shard fut.")
+        runs.append(PlannedRun(
+            run_at=quiet_window_start(kickoffs, now, end, delay),
+            job='players',
+            parameters=parameters,
+            api_calls=math.ceil(tm_calls / shard_count),
+        ))
+
+    return sorted(runs, key=lambda run: run.run_at)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A következő 24 óra adaptív futási tervének kiírása (indítás nélkül).")
+    parser.add_argument('-c', '--competitions', type=str, help="FD bajnokság kódok vesszővel. Alapértelmezett: TRACKED_COMPETITIONS.")
+    args = parser.parse_args()
+
+    competition_codes = args.competitions.split(',') if args.competitions else None
+    for run in plan_day(get_db_session(), competition_codes=competition_codes):
+        print(f"{run.run_at:%Y-%m-%d %H:%M} UTC  {run.job:<8} {run.parameters}  (~{run.api_calls} API hívás)")
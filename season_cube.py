@@ -0,0 +1,108 @@
+import argparse
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from config import get_db_engine
+from models import Base, AggPlayerSeasonCube
+
+# --- JÁTÉKOS-SZEZON-CSAPAT KOCKA ---
+# A riport a fact_player_season_stats-ot szezon, bajnokság, csapat, nemzetiség és
+# poszt szerint szeleteli, minden vizuálnál dim_players / dim_teams joinnal. A kocka
+# ezt a szintet előre aggregálja. Egy ETL futás után csak azokat a szezonokat
+# számoljuk újra, amelyekben a futás statisztikát vagy piaci értéket írt (run_id).
+# A piaci érték a fact_market_values-ból származtatott szezon végi érték
+# (fact_market_values_season); egy játékos bajnokságonként külön cellában
+# szerepel, ezért bajnokságokon át nem összegezhető.
+
+# A dim_players sor változása (pozíció, nemzetiség) a játékos minden szezonjának celláját érinti
+SQL_AFFECTED_SEASONS = """
+    SELECT season_id FROM fact_player_season_stats WHERE run_id = :run_id AND season_id IS NOT NULL
+    UNION
+    SELECT season_id FROM fact_market_values_season WHERE run_id = :run_id
+    UNION
+    SELECT st.season_id
+    FROM dim_players p
+    JOIN fact_player_season_stats st ON st.player_id = p.player_id
+    WHERE p.run_id = :run_id AND st.season_id IS NOT NULL
+"""
+
+SQL_DELETE = "DELETE FROM agg_player_season_cube {filter}"
+
+SQL_INSERT = """
+    INSERT INTO agg_player_season_cube (
+        season_id, competition_id, team_id, position, nationality,
+        players, appearances, goals, assists, yellow_cards, red_cards, minutes_played,
+        market_value_eur, valued_players
+    )
+    SELECT st.season_id, st.competition_id, st.team_id, p.position, p.nationality,
+        COUNT(DISTINCT st.player_id),
+        COALESCE(SUM(st.appearances), 0),
+        COALESCE(SUM(st.goals), 0),
+        COALESCE(SUM(st.assists), 0),
+        COALESCE(SUM(st.yellow_cards), 0),
+        COALESCE(SUM(st.red_cards), 0),
+        COALESCE(SUM(st.minutes_played), 0),
+        SUM(mv.last_value_eur),
+        COUNT(mv.last_value_eur)
+    FROM fact_player_season_stats st
+    JOIN dim_players p ON p.player_id = st.player_id
+    LEFT JOIN fact_market_values_season mv ON mv.player_id = st.player_id AND mv.season_id = st.season_id
+    WHERE st.season_id IS NOT NULL {filter}
+    GROUP BY st.season_id, st.competition_id, st.team_id, p.position, p.nationality
+"""
+
+# Párhuzamos (shardolt) futások ne töröljenek / szúrjanak egymásra ugyanabba a szezonba
+SQL_LOCK = "SELECT pg_advisory_xact_lock(hashtext('agg_player_season_cube'))"
+
+def _statement(sql, season_ids, condition):
+    if season_ids is None:
+        return text(sql.format(filter='')), {}
+    stmt = text(sql.format(filter=condition))
+    stmt = stmt.bindparams(bindparam('season_ids', expanding=True))
+    return stmt, {'season_ids': list(season_ids)}
+
+def affected_seasons(session, run_id):
+    """
+    A futás által írt statisztikák és szezon piaci értékek szezonjai, valamint a
+    futásban módosult játékosok összes szezonja.
+    """
+    return {season_id for (season_id,) in session.execute(text(SQL_AFFECTED_SEASONS), {'run_id': run_id})}
+
+def refresh_season_cube(session, season_ids=None):
+    """
+    A kocka újraszámolása a megadott szezonokra (commit nélkül).
+    season_ids=None esetén az összes szezonra. Visszaadja a beszúrt cellák számát.
+    """
+    if season_ids is not None and not season_ids:
+        return 0
+    session.execute(text(SQL_LOCK))
+    stmt, params = _statement(SQL_DELETE, season_ids, "WHERE season_id IN :season_ids")
+    session.execute(stmt, params)
+    stmt, params = _statement(SQL_INSERT, season_ids, "AND st.season_id IN :season_ids")
+    return session.execute(stmt, params).rowcount
+
+def refresh_cube_for_run(session, run_id):
+    """
+    ETL futás utáni inkrementális frissítés: csak az érintett szezonok.
+    """
+    season_ids = affected_seasons(session, run_id)
+    return season_ids, refresh_season_cube(session, season_ids)
+
+def ensure_season_cube(engine):
+    """
+    Meglévő adatbázison létrehozza a kocka tábláját.
+    """
+    Base.metadata.create_all(engine, tables=[AggPlayerSeasonCube.__table__])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A játékos-szezon-csapat kocka létrehozása és újraszámolása.")
+    parser.add_argument('-s', '--seasons', type=str, help="season_id-k vesszővel. Alapértelmezett: minden szezon.")
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    ensure_season_cube(engine)
+    season_ids = [int(season_id) for season_id in args.seasons.split(',')] if args.seasons else None
+    with Session(engine) as session:
+        cells = refresh_season_cube(session, season_ids)
+        session.commit()
+    print(f"A kocka frissítve: {cells} cella.")
@@ -0,0 +1,146 @@
+import re
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple
+from sqlalchemy.exc import IntegrityError
+from models import DimSeason
+
+# --- SZEZON REGISZTER ---
+# A szezonokat egyszer töltjük be, a TM / FD szezon kódokat táblázatból,
+# előre fordított mintákkal értelmezzük, és a nyers kódra memoizálunk:
+# a statisztika / átigazolás ciklusban a szezon feloldás egy dict lookup.
+# Naptári éves bajnokságok (pl. MLS, skandináv ligák) 'YYYY' kódja és FD
+# startDate-je a start_year = YYYY szezonra képeződik, mint eddig.
+
+# Július 1-től új szezon
+SEASON_START_MONTH = 7
+# Két számjegyes évnél e felett 19xx, alatta 20xx
+CENTURY_THRESHOLD = 50
+
+def _two_digit_year(value):
+    value = int(value)
+    return (1900 if value >= CENTURY_THRESHOLD else 2000) + value
+
+SEASON_FORMATS = (
+    # '22/23', '98/99'
+    (re.compile(r'^(\d{2})/(\d{2})$'), lambda m: _two_digit_year(m.group(1))),
+    # '2022' (TM szezon ID, naptári éves bajnokság)
+    (re.compile(r'^(\d{4})$'), lambda m: int(m.group(1))),
+    # '2022/23', '2022/2023', '2022-23'
+    (re.compile(r'^(\d{4})[/-](\d{2}|\d{4})$'), lambda m: int(m.group(1))),
+    # FD 'season.startDate': '2022-08-05'
+    (re.compile(r'^(\d{4})-\d{2}-\d{2}$'), lambda m: int(m.group(1))),
+)
+
+class SeasonRef(NamedTuple):
+    season_id: int
+    name: str
+    season_name_TM: str
+    start_year: int
+    end_year: int
+
+def season_names(start_year):
+    """
+    start_year -> (name, season_name_TM), pl. 2022 -> ('2022/2023', '22/23').
+    """
+    end_year = start_year + 1
+    return f"{start_year}/{end_year}", f"{str(start_year)[-2:]}/{str(end_year)[-2:]}"
+
+@lru_cache(maxsize=None)
+def parse_season_code(code):
+    """
+    Nyers szezon kód -> kezdő év, vagy None ha nem értelmezhető.
+    """
+    if not code or not isinstance(code, str):
+        return None
+    code = code.strip()
+    for pattern, start_year in SEASON_FORMATS:
+        match = pattern.match(code)
+        if match:
+            return start_year(match)
+    return None
+
+def current_start_year(today=None):
+    today = today or date.today()
+    return today.year if today.month >= SEASON_START_MONTH else today.year - 1
+
+def current_season_tm_name(today=None):
+    """
+    Az aktuális szezon TM formátumban (pl. '23/24').
+    """
+    return season_names(current_start_year(today))[1]
+
+class SeasonRegistry:
+    """
+    A DimSeason sorok memóriában, kezdő év szerint. Hiányzó szezont egyszer hoz létre.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.by_start_year = {}
+        self.by_tm_name = {}
+        self._by_code = {}
+
+    def load(self, session):
+        for season in session.query(
+            DimSeason.season_id, DimSeason.name, DimSeason.season_name_TM, DimSeason.start_year, DimSeason.end_year
+        ):
+            self._add(SeasonRef(*season))
+        self.loaded = True
+
+    def _add(self, ref):
+        self.by_start_year[ref.start_year] = ref
+        self.by_tm_name[ref.season_name_TM] = ref
+        return ref
+
+    def get_or_create(self, session, start_year):
+        """
+        Szezon kezdő év alapján; ha nincs, létrehozza (commitolva).
+        Párhuzamos futásnál a másik folyamat által közben létrehozottat veszi át.
+        """
+        ref = self.by_start_year.get(start_year)
+        if ref:
+            return ref
+        name, season_name_TM = season_names(start_year)
+        season = DimSeason(name=name, season_name_TM=season_name_TM, start_year=start_year, end_year=start_year + 1)
+        session.add(season)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            season = session.query(DimSeason).filter_by(name=name).one()
+        return self._add(SeasonRef(season.season_id, name, season_name_TM, start_year, start_year + 1))
+
+    def get(self, session, code):
+        """
+        Szezon a nyers (TM / FD) kód alapján, a kódra memoizálva. None, ha a kód nem értelmezhető.
+        """
+        if code in self._by_code:
+            return self._by_code[code]
+        start_year = parse_season_code(code)
+        ref = self.get_or_create(session, start_year) if start_year is not None else None
+        self._by_code[code] = ref
+        return ref
+
+    def ensure(self, session, codes):
+        """
+        Több kód hiányzó szezonjainak létrehozása egy commitban.
+        """
+        missing = {parse_season_code(code) for code in codes} - set(self.by_start_year) - {None}
+        if not missing:
+            return
+        existing = {
+            season.start_year for season in
+            session.query(DimSeason.start_year).filter(DimSeason.start_year.in_(missing))
+        }
+        for start_year in sorted(missing - existing):
+            name, season_name_TM = season_names(start_year)
+            session.add(DimSeason(name=name, season_name_TM=season_name_TM, start_year=start_year, end_year=start_year + 1))
+        session.commit()
+        for season in session.query(
+            DimSeason.season_id, DimSeason.name, DimSeason.season_name_TM, DimSeason.start_year, DimSeason.end_year
+        ).filter(DimSeason.start_year.in_(missing)):
+            self._add(SeasonRef(*season))
+
+    def current(self, session, today=None):
+        return self.get_or_create(session, current_start_year(today))
@@ -0,0 +1,180 @@
+import os
+import socket
+import threading
+import multiprocessing
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import EtlShardLease
+
+logger = logging.getLogger(__name__)
+
+# --- SHARDOLÁS ---
+# A játékosokat tm_id alapján osztjuk fel: shard i/N = tm_id % N == i.
+# Egy gépen process pool, több gépen a DB bérlet tábla (SKIP LOCKED) osztja ki a shardokat.
+
+def parse_shard(spec):
+    """
+    '--shard i/N' értelmezése -> (i, N). Pl. '0/4' az első a négyből.
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except (ValueError, AttributeError):
+        raise ValueError(f"Érvénytelen shard megadás: {spec!r} (várt: i/N)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Érvénytelen shard: {spec!r} (0 <= i < N)")
+    return index, count
+
+def shard_filter(query, column, shard):
+    """
+    A lekérdezés szűkítése egy shardra (shard=None: nincs szűrés).
+    """
+    if shard is None:
+        return query
+    index, count = shard
+    return query.filter(column % count == index)
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# --- LOKÁLIS PROCESS POOL ---
+
+def run_process_pool(target, processes, *args):
+    """
+    `processes` darab folyamat indítása, a k. folyamat a (k, processes) shardot kapja.
+    target(shard, *args) legfelső szintű függvény kell legyen (spawn miatt).
+    Spawn: minden folyamat saját DB engine-t és sessiont hoz létre importkor.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=target, args=((k, processes),) + args, name=f"shard-{k}") for k in range(processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join(timeout=30)
+        raise
+    failed = [p.name for p in procs if p.exitcode != 0]
+    if failed:
+        logger.error(f"Hibával leállt shardok: {', '.join(failed)}")
+    return not failed
+
+# --- DB BÉRLET ALAPÚ KOORDINÁCIÓ ---
+
+def ensure_leases(session, job, shard_count):
+    """
+    A job shardjainak bérlet sorai (idempotens).
+    """
+    stmt = pg_insert(EtlShardLease).values([
+        {'job': job, 'shard': shard, 'shard_count': shard_count} for shard in range(shard_count)
+    ]).on_conflict_do_nothing(index_elements=['job', 'shard'])
+    session.execute(stmt)
+    session.commit()
+
+def claim_shard(session, job, worker, lease_seconds):
+    """
+    Egy szabad (vagy lejárt bérletű) shard lefoglalása. None, ha nincs több.
+    A SKIP LOCKED miatt két worker sosem kapja ugyanazt a shardot.
+    """
+    lease = session.query(EtlShardLease).filter(
+        EtlShardLease.job == job,
+        EtlShardLease.done_at.is_(None),
+        or_(EtlShardLease.leased_until.is_(None), EtlShardLease.leased_until < func.now())
+    ).order_by(EtlShardLease.shard).with_for_update(skip_locked=True).first()
+
+    if lease is None:
+        session.rollback()
+        return None
+
+    if lease.worker:
+        logger.warning(f"Lejárt bérlet átvétele: {job} shard {lease.shard} (előző: {lease.worker})")
+    lease.worker = worker
+    lease.leased_until = func.now() + timedelta(seconds=lease_seconds)
+    session.commit()
+    return lease
+
+def renew_lease(session, lease_id, worker, lease_seconds):
+    """
+    Bérlet meghosszabbítása. False, ha közben más worker vette át.
+    """
+    updated = session.query(EtlShardLease).filter_by(lease_id=lease_id, worker=worker).update(
+        {EtlShardLease.leased_until: func.now() + timedelta(seconds=lease_seconds)},
+        synchronize_session=False
+    )
+    session.commit()
+    return updated == 1
+
+def complete_shard(session, lease, worker):
+    """
+    A shard késznek jelölése, csak ha a bérlet még ennél a workernél van.
+    """
+    updated = session.query(EtlShardLease).filter_by(lease_id=lease.lease_id, worker=worker).update(
+        {EtlShardLease.done_at: func.now(), EtlShardLease.leased_until: None},
+        synchronize_session=False
+    )
+    session.commit()
+    return updated == 1
+
+@contextmanager
+def hold_lease(session_factory, lease, worker, lease_seconds):
+    """
+    Háttérszál, ami a shard feldolgozása alatt megújítja a bérletet.
+    Ha a folyamat meghal, a bérlet lejár és más worker átveheti.
+    A visszaadott Event jelzi, ha a bérletet közben más worker vette át:
+    a feldolgozás az elemek között ellenőrzi, és leáll.
+    """
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def heartbeat():
+        hb_session = session_factory()
+        try:
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    renewed = renew_lease(hb_session, lease.lease_id, worker, lease_seconds)
+                except Exception as e:
+                    # Átmeneti DB hiba: a következő ütemben újra próbáljuk (a bérlet még él)
+                    hb_session.rollback()
+                    logger.warning(f"Bérlet megújítás sikertelen: {lease.job} shard {lease.shard}: {e}")
+                    continue
+                if not renewed:
+                    logger.error(f"A shard bérletét más worker vette át: {lease.job} shard {lease.shard}")
+                    lost.set()
+                    return
+        finally:
+            hb_session.close()
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-{lease.shard}", daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        thread.join(timeout=5)
+
+def run_leased_shards(session, session_factory, job, shard_count, process_shard, lease_seconds=900):
+    """
+    Addig foglal és dolgoz fel shardokat, amíg van szabad.
+    process_shard((i, N), lost) végzi a tényleges munkát; a lost Event beállítása
+    után (a bérletet más worker vette át) az elemek között le kell állnia.
+    """
+    worker = worker_name()
+    ensure_leases(session, job, shard_count)
+    processed = 0
+    while True:
+        lease = claim_shard(session, job, worker, lease_seconds)
+        if lease is None:
+            break
+        logger.info(f"Shard lefoglalva: {job} {lease.shard}/{shard_count} ({worker})")
+        with hold_lease(session_factory, lease, worker, lease_seconds) as lost:
+            process_shard((lease.shard, shard_count), lost)
+        if lost.is_set() or not complete_shard(session, lease, worker):
+            logger.warning(f"A shard bérlete elveszett, a befejezést az új worker jelzi: {job} {lease.shard}/{shard_count}")
+            continue
+        processed += 1
+    logger.info(f"Nincs több szabad shard ({job}), feldolgozva: {processed}")
+    return processed
@@ -0,0 +1,56 @@
+import threading
+
+class SingleFlight:
+    """
+    Azonos kulcsú, egyszerre futó hívások összevonása (single-flight).
+    Ha egy kulcsra már fut kérés, a további hívók megvárják és megkapják
+    ugyanazt az eredményt, nem indítanak új kérést.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        """
+        Számlálók: tényleges hívások és összevont (megspórolt) hívások.
+        """
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
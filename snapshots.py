@@ -0,0 +1,122 @@
+import json
+import hashlib
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import EtlSnapshot, EtlChangeLog
+
+# --- PAYLOAD SNAPSHOTOK ÉS VÁLTOZÁSNAPLÓ ---
+# A lekért TM payloadok (klub profil, játékos profil) kanonikus JSON hash-ét
+# entitásonként eltároljuk. Ha az új válasz hash-e egyezik, a hívó kihagyja a
+# feldolgozást és a DB összehasonlítást. Eltérésnél a mező szintű különbségek
+# az etl_change_log táblába kerülnek, amiből a downstream inkrementálisan frissíthet.
+
+# A TM API minden válaszban frissíti, a tartalomhoz nem tartozik
+VOLATILE_FIELDS = {'updatedAt'}
+
+def canonical_json(payload):
+    payload = {k: v for k, v in payload.items() if k not in VOLATILE_FIELDS}
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def payload_hash(payload):
+    return hashlib.sha256(canonical_json(payload).encode('utf-8')).hexdigest()
+
+def flatten(payload, prefix=''):
+    """
+    Beágyazott dict -> {'pont.elválasztott.út': érték}. A listák egy mezőként
+    (JSON szövegként) szerepelnek.
+    """
+    fields = {}
+    for key, value in payload.items():
+        if not prefix and key in VOLATILE_FIELDS:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            fields.update(flatten(value, f"{path}."))
+        elif isinstance(value, list):
+            fields[path] = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        else:
+            fields[path] = value
+    return fields
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+def field_diff(old_payload, new_payload):
+    """
+    Két payload mező szintű különbsége: [(mező, régi, új), ...]
+    """
+    old_fields, new_fields = flatten(old_payload or {}), flatten(new_payload)
+    return [
+        (field, _as_text(old_fields.get(field)), _as_text(new_fields.get(field)))
+        for field in sorted(old_fields.keys() | new_fields.keys())
+        if old_fields.get(field) != new_fields.get(field)
+    ]
+
+class SnapshotStore:
+    """
+    A tárolt hash-ek memóriában, (entity_type, feed) szerint lustán betöltve,
+    így a változatlan payload egy dict lookup után kihagyható.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.loaded = set()
+        self.unchanged = 0
+        self.changed = 0
+
+    def load(self, session, entity_type, feed):
+        rows = session.query(EtlSnapshot.entity_key, EtlSnapshot.payload_hash).filter_by(
+            entity_type=entity_type, feed=feed
+        )
+        self.hashes.update({(entity_type, feed, key): digest for key, digest in rows})
+        self.loaded.add((entity_type, feed))
+
+    def diff(self, session, entity_type, feed, entity_key, payload):
+        """
+        None, ha a payload nem változott a legutóbbi snapshot óta. Különben a
+        snapshot felülírása és a változások naplózása (commit nélkül, a hívó
+        frissítésével egy tranzakcióban); visszaad: [(mező, régi, új), ...],
+        első snapshotnál üres lista.
+        """
+        if (entity_type, feed) not in self.loaded:
+            self.load(session, entity_type, feed)
+        entity_key = str(entity_key)
+        digest = payload_hash(payload)
+        # A memória csak a DB-ből töltődik: egy rollbackelt frissítés nem hagy hamis egyezést
+        if self.hashes.get((entity_type, feed, entity_key)) == digest:
+            self.unchanged += 1
+            return None
+
+        previous = session.query(EtlSnapshot).filter_by(
+            entity_type=entity_type, feed=feed, entity_key=entity_key
+        ).first()
+        if previous and previous.payload_hash == digest:
+            self.unchanged += 1
+            return None
+
+        now = datetime.now()
+        changes = field_diff(previous.payload, payload) if previous else []
+        session.execute(pg_insert(EtlSnapshot).values(
+            entity_type=entity_type, feed=feed, entity_key=entity_key,
+            payload_hash=digest, payload=payload, fetched_at=now
+        ).on_conflict_do_update(
+            index_elements=['entity_type', 'feed', 'entity_key'],
+            set_={'payload_hash': digest, 'payload': payload, 'fetched_at': now}
+        ))
+        if changes:
+            session.bulk_insert_mappings(EtlChangeLog, [
+                {'entity_type': entity_type, 'feed': feed, 'entity_key': entity_key,
+                 'field': field, 'old_value': old, 'new_value': new, 'changed_at': now}
+                for field, old, new in changes
+            ])
+        self.changed += 1
+        return changes
+
+def changes_since(session, since, entity_type=None):
+    """
+    A megadott időpont óta naplózott változások, időrendben.
+    """
+    query = session.query(EtlChangeLog).filter(EtlChangeLog.changed_at > since)
+    if entity_type:
+        query = query.filter_by(entity_type=entity_type)
+    return query.order_by(EtlChangeLog.change_id).all()
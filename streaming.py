@@ -0,0 +1,68 @@
+import sys
+import logging
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# --- MEMÓRIA-KORLÁTOS ITERÁCIÓ ---
+# A nagy dimenziókat (pl. dim_players) nem töltjük be egyszerre ORM objektumként:
+# kulcs szerinti (keyset) lapozással, darabonként rövid életű sessionben olvassuk,
+# így az identity map és a tranzakció sem nő a futás hosszával.
+
+KEYSET_CHUNK_SIZE = 500
+
+def iter_keyset(session_factory, build_query, key_column, chunk_size=KEYSET_CHUNK_SIZE, limit=None):
+    """
+    A build_query(session) lekérdezés sorai key_column szerint rendezve, darabonként
+    (WHERE key > utolsó kulcs ORDER BY key LIMIT n). Minden darab saját sessionben
+    fut, ami a sorok átadása előtt lezárul; oszlop lekérdezéssel nincs ORM objektum.
+    Szálbiztos forrás pipeline-hoz is (nem használ közös sessiont).
+    """
+    last_key = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        session = session_factory()
+        try:
+            query = build_query(session)
+            if last_key is not None:
+                query = query.filter(key_column > last_key)
+            rows = query.order_by(key_column).limit(size).all()
+        finally:
+            session.close()
+
+        if not rows:
+            return
+        yield from rows
+        last_key = getattr(rows[-1], key_column.key)
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+def peak_rss_mb():
+    """
+    A folyamat eddigi csúcs memóriahasználata (MB), vagy None ha nem mérhető.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linuxon KB, macOS-en bájt
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+
+def log_peak_rss(name):
+    peak = peak_rss_mb()
+    if peak is None:
+        logger.info(f"[{name}] Csúcs memória (RSS): nem mérhető ezen a platformon")
+    else:
+        logger.info(f"[{name}] Csúcs memória (RSS): {peak:.1f} MB")
+    return peak
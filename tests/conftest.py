@@ -0,0 +1,5 @@
+import os
+import sys
+
+# A modulok a repó gyökerében vannak (ahogy a benchmarks/ alatt is)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
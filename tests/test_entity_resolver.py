@@ -0,0 +1,80 @@
+import pytest
+from entity_resolver import (
+    MATCH_THRESHOLD, EntityResolver, best_match, conflicting_tokens, normalize_name, similarity, token_key
+)
+
+@pytest.mark.parametrize('name, expected', [
+    ('Manchester United FC', 'manchester united'),
+    ('Brighton & Hove Albion FC', 'brighton hove albion'),
+    ('Atlético de Madrid', 'atletico madrid'),
+    ('FC', 'fc'), # csak stop szó: megmarad
+    ('', ''),
+    (None, ''),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+def test_token_key_is_order_independent():
+    assert token_key('hotspur tottenham') == token_key('tottenham hotspur')
+
+@pytest.mark.parametrize('first, other', [
+    ('Real Madrid CF', 'Real Madrid Castilla'),
+    ('Manchester United FC', 'Manchester United FC U21'),
+    ('Brentford FC', 'Brentford FC B'),
+    ('Premier League', 'Premier League 2'),
+    ('Bayern München', 'Bayern München II'),
+    ('Arsenal FC', 'Arsenal WFC Women'),
+])
+def test_reserve_and_youth_sides_do_not_match(first, other):
+    a, b = normalize_name(first), normalize_name(other)
+    assert conflicting_tokens(a, b)
+    assert similarity(a, b) < MATCH_THRESHOLD
+
+@pytest.mark.parametrize('first, other', [
+    ('Manchester United FC', 'Manchester United'),
+    ('Wolverhampton Wanderers FC', 'Wolverhampton Wanderers'),
+    ('FC Schalke 04', 'Schalke 04'),
+])
+def test_same_club_matches(first, other):
+    assert similarity(normalize_name(first), normalize_name(other)) >= MATCH_THRESHOLD
+
+def test_similarity_bounds():
+    assert similarity('', 'arsenal') == 0.0
+    assert similarity('arsenal', 'arsenal') == 1.0
+    assert 0.0 <= similarity('arsenal', 'chelsea') < MATCH_THRESHOLD
+
+def test_best_match_prefers_first_team_over_reserve():
+    candidates = [{'id': '6767', 'name': 'Real Madrid Castilla'}, {'id': '418', 'name': 'Real Madrid'}]
+    result, score = best_match(['Real Madrid CF'], candidates)
+    assert result['id'] == '418'
+    assert score >= MATCH_THRESHOLD
+
+def test_best_match_rejects_reserve_only_results():
+    result, score = best_match(['Brentford FC'], [{'id': '1', 'name': 'Brentford FC B'}])
+    assert score < MATCH_THRESHOLD
+
+def test_best_match_without_candidates():
+    assert best_match(['Arsenal'], None) == (None, 0.0)
+
+def test_resolver_requires_exact_key():
+    resolver = EntityResolver()
+    resolver.add('team', 1, 'Real Madrid Castilla')
+    resolver.add('team', 2, 'Tottenham Hotspur')
+    resolver.add('competition', 3, 'Premier League 2')
+
+    assert resolver.resolve('team', 'Real Madrid CF') is None
+    assert resolver.resolve('competition', 'Premier League') is None
+    assert resolver.resolve('team', 'Tottenham Hotspur FC') == 2
+    assert resolver.resolve('team', 'Hotspur Tottenham') == 2
+    assert (resolver.hits, resolver.misses) == (2, 2)
+
+def test_resolver_keeps_all_candidates_for_a_key():
+    resolver = EntityResolver()
+    resolver.add('team', 1, 'Barcelona SC') # TM-ből felvett, más klub
+    resolver.add('team', 2, 'FC Barcelona')
+
+    assert normalize_name('Barcelona SC') == normalize_name('FC Barcelona')
+    assert resolver.resolve('team', 'FC Barcelona') == 1
+    assert resolver.resolve('team', 'FC Barcelona', accept=lambda team_id: team_id != 1) == 2
+    assert resolver.resolve('team', 'FC Barcelona', accept=lambda team_id: False) is None
+    assert (resolver.hits, resolver.misses) == (2, 1)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+import etl_runs
+from change_feed import change_watermark
+from etl_runs import expire_orphaned_runs, heartbeat
+from models import Base, EtlRun
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[EtlRun.__table__])
+    yield engine
+    engine.dispose()
+
+def add_run(session, run_id, status, age_minutes, heartbeat_minutes=None):
+    now = datetime.now()
+    session.add(EtlRun(
+        run_id=run_id, job='test', status=status, started_at=now - timedelta(minutes=age_minutes),
+        heartbeat_at=None if heartbeat_minutes is None else now - timedelta(minutes=heartbeat_minutes)
+    ))
+
+def test_orphaned_run_does_not_hold_back_watermark(engine):
+    with Session(engine) as session:
+        add_run(session, 1, 'finished', 120)
+        add_run(session, 2, 'running', 120, heartbeat_minutes=60) # SIGKILL után néma
+        add_run(session, 3, 'finished', 30)
+        session.commit()
+        assert change_watermark(session) == 3
+
+        add_run(session, 4, 'running', 120, heartbeat_minutes=0) # él, hosszú futás
+        session.commit()
+        assert change_watermark(session) == 3
+
+        add_run(session, 5, 'running', 1) # friss, még nincs heartbeat
+        session.commit()
+        assert change_watermark(session) == 3
+
+def test_live_run_holds_back_watermark(engine):
+    with Session(engine) as session:
+        add_run(session, 1, 'finished', 60)
+        add_run(session, 2, 'running', 60, heartbeat_minutes=1)
+        add_run(session, 3, 'finished', 30)
+        session.commit()
+        assert change_watermark(session) == 1
+
+def test_expire_orphaned_runs(engine):
+    with Session(engine) as session:
+        add_run(session, 1, 'running', 120, heartbeat_minutes=60)
+        add_run(session, 2, 'running', 120) # heartbeat nélküli régi futás
+        add_run(session, 3, 'running', 120, heartbeat_minutes=1)
+        session.commit()
+        assert expire_orphaned_runs(session) == 2
+        session.commit()
+        statuses = {run.run_id: run.status for run in session.query(EtlRun)}
+        assert statuses == {1: 'failed', 2: 'failed', 3: 'running'}
+        assert expire_orphaned_runs(session) == 0
+
+def test_heartbeat_refreshes_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(etl_runs, 'ETL_RUN_HEARTBEAT_SECONDS', 0.01)
+    # Fájl alapú DB: a heartbeat szál saját kapcsolattal írja
+    engine = create_engine(f"sqlite:///{tmp_path / 'runs.db'}")
+    Base.metadata.create_all(engine, tables=[EtlRun.__table__])
+    with Session(engine) as session:
+        add_run(session, 1, 'running', 120, heartbeat_minutes=60)
+        session.commit()
+        run = session.get(EtlRun, 1)
+        with heartbeat(session, run):
+            deadline = datetime.now() + timedelta(seconds=2)
+            while datetime.now() < deadline:
+                session.expire_all()
+                if session.get(EtlRun, 1).heartbeat_at > datetime.now() - timedelta(minutes=1):
+                    break
+        session.expire_all()
+        assert session.get(EtlRun, 1).heartbeat_at > datetime.now() - timedelta(minutes=1)
+    engine.dispose()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+import pytest
+from match_stats import (
+    ELO_START, ELO_HOME_ADVANTAGE, FORM_WINDOW, TeamState, compute_form, elo_update, goal_diff_multiplier
+)
+
+@pytest.mark.parametrize('home_goals, away_goals', [(2, 0), (1, 1), (0, 3)])
+def test_elo_update_is_zero_sum(home_goals, away_goals):
+    home, away = elo_update(1520.0, 1480.0, home_goals, away_goals)
+    assert home + away == pytest.approx(1520.0 + 1480.0)
+
+def test_elo_update_direction():
+    home_win, _ = elo_update(ELO_START, ELO_START, 1, 0)
+    draw, _ = elo_update(ELO_START, ELO_START, 0, 0)
+    home_loss, _ = elo_update(ELO_START, ELO_START, 0, 1)
+    assert home_win > ELO_START > home_loss
+    # Döntetlen: a hazai pálya előnye miatt a hazai csapat veszít pontot
+    assert draw < ELO_START
+    assert elo_update(ELO_START - ELO_HOME_ADVANTAGE, ELO_START, 0, 0)[0] == pytest.approx(ELO_START - ELO_HOME_ADVANTAGE)
+
+def test_goal_diff_multiplier():
+    assert goal_diff_multiplier(-1) == 1.0
+    assert goal_diff_multiplier(2) == 1.5
+    assert goal_diff_multiplier(-3) == pytest.approx(14 / 8)
+
+def test_form_window_crosses_season_boundary():
+    # Az előző szezon végén 8 győzelem, az új szezonban 4 vereség: a forma nem nullázódik
+    season_end, season_start = datetime(2023, 5, 1), datetime(2023, 8, 12)
+    matches = [(i, season_end + timedelta(days=i), 1, 2, 2, 0) for i in range(8)]
+    matches += [(8 + i, season_start + timedelta(days=7 * i), 1, 2, 0, 1) for i in range(4)]
+    states = {}
+    rows = [row for row in compute_form(matches, states) if row.team_id == 1]
+
+    last = rows[-1]
+    assert last.form_last_5 == 'WLLLL'
+    assert last.points_last_5 == 3
+    assert last.points_last_10 == 6 * 3 # az ablakból 6 meccs még az előző szezoné
+    assert last.goals_for_last_10 == 6 * 2
+    assert last.goals_against_last_10 == 4
+    assert len(states[1].history) == FORM_WINDOW
+
+def test_form_rows_chain_elo():
+    states = {2: TeamState(elo=1600.0)}
+    matches = [(1, datetime(2023, 8, 12), 1, 2, 1, 0), (2, datetime(2023, 8, 19), 2, 1, 1, 1)]
+    rows = list(compute_form(matches, states))
+
+    assert [(row.team_id, row.is_home) for row in rows] == [(1, True), (2, False), (2, True), (1, False)]
+    assert rows[0].elo_before == ELO_START and rows[1].elo_before == 1600.0
+    assert rows[2].elo_before == rows[1].elo_after
+    assert rows[3].elo_before == rows[0].elo_after
+    assert states[1].elo == rows[3].elo_after
@@ -0,0 +1,32 @@
+from query_api import LRUCache, cached
+
+class FakeQueries:
+    def __init__(self):
+        self.cache = LRUCache()
+        self.calls = 0
+
+    def _check_version(self):
+        pass
+
+    @cached
+    def squad(self, team_id):
+        self.calls += 1
+        return [{'team_id': team_id, 'players': ['a', 'b']}]
+
+def test_cached_result_is_not_shared_with_caller():
+    queries = FakeQueries()
+    first = queries.squad(1)
+    first[0]['players'].append('x')
+    first.append({'team_id': 2})
+
+    assert queries.squad(1) == [{'team_id': 1, 'players': ['a', 'b']}]
+    assert queries.calls == 1
+
+def test_new_version_clears_cache():
+    cache = LRUCache()
+    cache.set_version(1)
+    cache.put('key', 'value')
+    cache.set_version(1)
+    assert cache.get('key') == (True, 'value')
+    cache.set_version(2)
+    assert cache.get('key') == (False, None)
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models import Base, DimCompetition, DimTeam
+from quota import (
+    estimate_season_load, FD_HOST, TM_HOST, TEAMS_PER_COMPETITION, SQUAD_SIZE, NEW_TEAM_TM_CALLS
+)
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[DimCompetition.__table__, DimTeam.__table__])
+    with Session(engine) as session:
+        comp = DimCompetition(fd_id='PL', tm_id='GB1', name='Premier League')
+        session.add(comp)
+        session.flush()
+        session.add_all([
+            DimTeam(fd_id=fd_id, tm_id=fd_id * 10, name=f"Team {fd_id}", competition_id=comp.competition_id)
+            for fd_id in (1, 2, 3)
+        ])
+        session.commit()
+        yield session
+    engine.dispose()
+
+def test_team_count_from_fd_team_list(session):
+    estimate = estimate_season_load(session, 'PL', fd_team_ids=[1, 2, 3, 4, 5])
+    # 2 új csapat: keresés + profil, 5 keret; az aktuális szezon új játékosai profil hívás nélkül
+    assert estimate == {FD_HOST: 3, TM_HOST: 2 * NEW_TEAM_TM_CALLS + 5}
+
+def test_past_season_counts_new_player_profiles(session):
+    estimate = estimate_season_load(session, 'PL', fd_team_ids=[1, 2, 3, 4, 5], current=False)
+    assert estimate[TM_HOST] == 2 * NEW_TEAM_TM_CALLS + 5 + 2 * SQUAD_SIZE
+
+def test_default_team_count_without_fd_team_list(session):
+    estimate = estimate_season_load(session, 'PL')
+    new_teams = TEAMS_PER_COMPETITION - 3
+    assert estimate[TM_HOST] == new_teams * NEW_TEAM_TM_CALLS + TEAMS_PER_COMPETITION
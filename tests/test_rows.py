@@ -0,0 +1,18 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models import Base, FactTransfer
+from rows import bulk_insert, transfer_row
+
+def test_bulk_insert_counts_only_inserted_rows():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[FactTransfer.__table__])
+    rows = [
+        transfer_row({'date': '2023-07-01', 'fee': 100}, 1, 2, 3, 4),
+        transfer_row({'date': '2023-07-01', 'fee': 200}, 1, 2, 3, 4),
+        transfer_row({'date': '2024-01-15'}, 1, 3, 2, 4),
+    ]
+    with Session(engine) as session:
+        assert bulk_insert(session, FactTransfer, rows) == 2
+        assert bulk_insert(session, FactTransfer, rows) == 0
+        assert session.query(FactTransfer).count() == 2
+    engine.dispose()
@@ -0,0 +1,63 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models import Base, DimPlayer, DimPlayerTeamHistory, DimTeam
+from scd_history import set_player_team
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[DimTeam.__table__, DimPlayer.__table__, DimPlayerTeamHistory.__table__])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+@pytest.fixture
+def player(session):
+    player = DimPlayer(player_id=1, name='Teszt Elek')
+    session.add(player)
+    session.flush()
+    return player
+
+def history(session):
+    return [
+        (version.team_id, version.valid_from, version.valid_to)
+        for version in session.query(DimPlayerTeamHistory).order_by(DimPlayerTeamHistory.valid_from)
+    ]
+
+def test_new_version_closes_current(session, player):
+    set_player_team(session, player, 10, date(2020, 7, 1))
+    set_player_team(session, player, 20, date(2022, 7, 1))
+    assert history(session) == [(10, date(2020, 7, 1), date(2022, 7, 1)), (20, date(2022, 7, 1), None)]
+    assert player.current_team_id == 20
+
+def test_backdated_transfer_is_inserted_before_current(session, player):
+    set_player_team(session, player, 10, date(2020, 7, 1))
+    set_player_team(session, player, 20, date(2022, 7, 1))
+    set_player_team(session, player, 30, date(2021, 1, 15))
+    assert history(session) == [
+        (10, date(2020, 7, 1), date(2021, 1, 15)),
+        (30, date(2021, 1, 15), date(2022, 7, 1)),
+        (20, date(2022, 7, 1), None),
+    ]
+    assert player.current_team_id == 20
+
+def test_backdated_transfer_before_first_version(session, player):
+    set_player_team(session, player, 20, date(2022, 7, 1))
+    set_player_team(session, player, 10, date(2019, 7, 1))
+    assert history(session) == [(10, date(2019, 7, 1), date(2022, 7, 1)), (20, date(2022, 7, 1), None)]
+    assert player.current_team_id == 20
+
+def test_backdated_move_to_next_team_extends_it(session, player):
+    set_player_team(session, player, 10, date(2020, 7, 1))
+    set_player_team(session, player, 20, date(2024, 10, 1))
+    set_player_team(session, player, 20, date(2024, 8, 30))
+    assert history(session) == [(10, date(2020, 7, 1), date(2024, 8, 30)), (20, date(2024, 8, 30), None)]
+
+def test_same_day_version_is_replaced(session, player):
+    set_player_team(session, player, 10, date(2020, 7, 1))
+    set_player_team(session, player, 20, date(2020, 7, 1))
+    set_player_team(session, player, 20, date(2021, 7, 1))
+    assert history(session) == [(20, date(2020, 7, 1), None)]
+    assert player.current_team_id == 20
@@ -0,0 +1,50 @@
+import threading
+import pytest
+import sharding
+from sharding import hold_lease, parse_shard
+
+class FakeLease:
+    lease_id = 1
+    job = 'job'
+    shard = 0
+
+class FakeSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def test_parse_shard():
+    assert parse_shard('1/4') == (1, 4)
+    for spec in ('4/4', '-1/4', '0/0', 'x', None):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+def test_lost_lease_is_signalled(monkeypatch):
+    renewed = threading.Event()
+
+    def renew_lease(session, lease_id, worker, lease_seconds):
+        renewed.set()
+        return False
+
+    monkeypatch.setattr(sharding, 'renew_lease', renew_lease)
+    with hold_lease(FakeSession, FakeLease(), 'w', lease_seconds=0.03) as lost:
+        assert lost.wait(1)
+    assert renewed.is_set()
+
+def test_transient_renew_error_keeps_lease(monkeypatch):
+    calls = []
+    renewed = threading.Event()
+
+    def renew_lease(session, lease_id, worker, lease_seconds):
+        calls.append(lease_id)
+        if len(calls) == 1:
+            raise ConnectionError('db')
+        renewed.set()
+        return True
+
+    monkeypatch.setattr(sharding, 'renew_lease', renew_lease)
+    with hold_lease(FakeSession, FakeLease(), 'w', lease_seconds=0.03) as lost:
+        assert renewed.wait(1)
+    assert not lost.is_set()
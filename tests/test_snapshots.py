@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from models import Base, EtlChangeLog, EtlSnapshot
+from snapshots import SnapshotStore, field_diff, payload_hash
+
+# A JSONB oszlop SQLite-on JSON-ként jön létre (a tesztadatbázis miatt)
+@compiles(JSONB, 'sqlite')
+def _jsonb_sqlite(type_, compiler, **kw):
+    return 'JSON'
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[EtlSnapshot.__table__, EtlChangeLog.__table__])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def test_payload_hash_ignores_key_order_and_volatile_fields():
+    a = {'name': 'Arsenal', 'squad': {'size': 25, 'avgAge': 26.1}, 'updatedAt': '2024-01-01'}
+    b = {'squad': {'avgAge': 26.1, 'size': 25}, 'updatedAt': '2024-02-01', 'name': 'Arsenal'}
+    assert payload_hash(a) == payload_hash(b)
+    assert payload_hash(a) != payload_hash({**a, 'name': 'Arsenal FC'})
+
+def test_field_diff_flattens_nested_fields():
+    old = {'name': 'Arsenal', 'squad': {'size': 25}, 'league': ['PL'], 'updatedAt': 'x'}
+    new = {'name': 'Arsenal', 'squad': {'size': 26, 'avgAge': 26.1}, 'league': ['PL', 'UCL'], 'updatedAt': 'y'}
+    assert field_diff(old, new) == [
+        ('league', '["PL"]', '["PL", "UCL"]'),
+        ('squad.avgAge', None, '26.1'),
+        ('squad.size', '25', '26'),
+    ]
+    assert field_diff(None, {'name': 'Arsenal'}) == [('name', None, 'Arsenal')]
+
+def test_diff_skips_unchanged_and_logs_changes(session):
+    store = SnapshotStore()
+    assert store.diff(session, 'team', 'club_profile', 11, {'name': 'Arsenal', 'stadiumSeats': 60000}) == []
+    session.commit()
+    assert store.diff(session, 'team', 'club_profile', 11, {'stadiumSeats': 60000, 'name': 'Arsenal'}) is None
+    assert store.diff(session, 'team', 'club_profile', 11, {'name': 'Arsenal', 'stadiumSeats': 60704}) == [
+        ('stadiumSeats', '60000', '60704')
+    ]
+    session.commit()
+
+    log = session.query(EtlChangeLog).one()
+    assert (log.entity_type, log.feed, log.entity_key, log.field) == ('team', 'club_profile', '11', 'stadiumSeats')
+    snapshot = session.query(EtlSnapshot).one()
+    assert (snapshot.feed, snapshot.entity_key, snapshot.payload['stadiumSeats']) == ('club_profile', '11', 60704)
+    assert (store.changed, store.unchanged) == (2, 1)
+
+def test_diff_keys_by_feed_and_entity(session):
+    store = SnapshotStore()
+    store.diff(session, 'team', 'club_profile', 11, {'name': 'Arsenal'})
+    store.diff(session, 'team', 'club_profile', 12, {'name': 'Chelsea'})
+    session.commit()
+    assert {key for key, in session.query(EtlSnapshot.entity_key)} == {'11', '12'}
+    assert store.diff(session, 'team', 'club_profile', 12, {'name': 'Chelsea'}) is None
@@ -0,0 +1,64 @@
+from datetime import date
+from models import FactMatch, FactPlayerSeasonStat, FactTransfer
+from rows import match_row, season_stat_row, transfer_row
+from validation import validate_rows
+
+def test_unparsable_transfer_values_are_quarantined():
+    rows = [
+        transfer_row({'date': '2023-07-01', 'fee': '€1.5m', 'marketValue': 'free transfer'}, 1, 2, 3, 4),
+        transfer_row({'date': '2023-07-01', 'fee': '1,000', 'marketValue': 5000000}, 2, 2, 3, 4),
+        transfer_row({'date': 'garbage'}, 3, 2, 3, None),
+        transfer_row({}, 4, 2, 3, 4),
+    ]
+    valid, rejected = validate_rows(FactTransfer, rows)
+
+    assert [row.player_id for row in valid] == [2]
+    assert valid[0].fee_eur == 1000
+    reasons = {entry.entity_key: set(entry.reasons) for entry in rejected}
+    assert reasons == {
+        1: {'market_value_eur_range', 'fee_eur_range'},
+        3: {'season_id_not_null', 'date_recorded_range'},
+        4: {'date_recorded_not_null'},
+    }
+    assert rejected[0].row.fee_eur == '€1.5m' # a nyers érték a karantén payloadba kerül
+
+def test_season_stat_without_season_is_quarantined():
+    row = season_stat_row({'goals': '3', 'appearances': 10}, 1, 2, None, 3)
+    valid, rejected = validate_rows(FactPlayerSeasonStat, [row])
+    assert valid == []
+    assert rejected[0].reasons == ('season_id_not_null',)
+
+def test_finished_match_without_score_is_quarantined():
+    match = {'id': 7, 'utcDate': '2024-01-01T15:00:00Z', 'status': 'FINISHED', 'score': {'fullTime': {'home': None, 'away': 1}}}
+    valid, rejected = validate_rows(FactMatch, [match_row(match, 1, 1, 2, 3)])
+    assert valid == []
+    assert rejected[0].entity_key == 7
+    assert rejected[0].reasons == ('finished_score_not_null',)
+
+def test_clean_batch_passes_unchanged():
+    rows = [
+        transfer_row({'date': date(2020, 1, 1).isoformat(), 'fee': 100, 'marketValue': 200}, i, 1, 2, 3)
+        for i in range(1, 4)
+    ]
+    valid, rejected = validate_rows(FactTransfer, rows)
+    assert valid == rows
+    assert rejected == []
+
+def test_staging_rows_are_validated_by_table_name():
+    from collections import namedtuple
+    from validation import validate_table_rows
+    StgTransfer = namedtuple('StgTransfer', [
+        'player_tm_id', 'from_tm_id', 'from_name', 'to_tm_id', 'to_name',
+        'season_tm', 'date_recorded', 'market_value_eur', 'fee_eur',
+    ])
+    rows = [
+        StgTransfer(1, 10, 'A', 20, 'B', '23/24', date(2023, 7, 1), 1000, 500),
+        StgTransfer(2, 'x', 'A', 20, 'B', '23/24', date(2023, 7, 1), 1000, '€1.5m'),
+        StgTransfer(3, 10, 'A', 20, 'B', None, None, None, None),
+    ]
+    valid, rejected = validate_table_rows('stg_transfers', rows)
+    assert [row.player_tm_id for row in valid] == [1]
+    assert {entry.entity_key: entry.reasons for entry in rejected} == {
+        2: ('from_tm_id_range', 'fee_eur_range'),
+        3: ('date_recorded_not_null', 'season_tm_not_null'),
+    }
@@ -3,11 +3,17 @@ import requests
 import logging
 from datetime import date, datetime
 from sqlalchemy.orm import sessionmaker
-from config import get_db_engine, FD_API_KEY, TM_API_URL
+from config import get_db_engine, FD_API_KEY, TM_API_URL, STREAM_JSON
 from models import (
-    DimSeason, DimCompetition, DimTeam, DimPlayer, FactMatch
+    DimCompetition, DimTeam, DimPlayer, FactMatch, EtlDeadLetter
 )
-import re
+from singleflight import SingleFlight
+from json_stream import iter_json_array, CHUNK_SIZE
+from entity_resolver import EntityResolver, best_match, MATCH_THRESHOLD
+from quota import acquire, QuotaExceeded
+from season_registry import SeasonRegistry, current_start_year
+from snapshots import SnapshotStore
+from scd_history import open_versions
 
 # --- KONFIGURÁCIÓ ÉS LOGOLÁS ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,8 +30,17 @@ def get_db_session():
     return Session()
 
 def requests_get_retry(url, headers=None, retries=3, backoff=2):
-    """Biztonságos kérés újrapróbálkozással."""
+    """
+    Biztonságos kérés újrapróbálkozással. Minden próbálkozás a közös API
+    keretből foglal (quota.acquire); elfogyott napi keretnél (QuotaExceeded)
+    naplóz és None-t ad, mint a sikertelen lekérdezésnél.
+    """
     for i in range(retries):
+        try:
+            acquire(url)
+        except QuotaExceeded as e:
+            logger.error(f"{e} - kihagyva: {url}")
+            return None
         try:
             response = requests.get(url, headers=headers)
             if response.status_code in [200, 404]: # A 404 is válasz, csak nincs adat
@@ -41,79 +56,144 @@ def requests_get_retry(url, headers=None, retries=3, backoff=2):
         time.sleep(backoff)
     return None
 
-# --- DB lekérdezések ---
-def get_season_from_TMname(season_name_tm):
+def iter_json_items(url, key, headers=None, retries=3, backoff=2):
     """
-    Szezon lekérése a neve alapján (pl. '22/23' vagy '2022').
+    Egy API válasz `key` tömbjének elemeit adja vissza egyenként.
+    STREAM_JSON esetén a választ darabonként dolgozza fel (a memória a
+    válasz méretétől függetlenül közel állandó), különben resp.json()-t használ.
+    Ha az újrapróbálkozások után sincs válasz, vagy elfogyott a napi keret,
+    ConnectionError-t (QuotaExceeded) dob. A kérés nem megy át a single-flight
+    rétegen (a streamelt válasz nem osztható meg a hívók között).
     """
-    logger.info(f"Szezon lekérése TM név alapján: {season_name_tm}")
+    if not STREAM_JSON:
+        resp = requests_get_retry(url, headers=headers, retries=retries, backoff=backoff)
+        if resp is None:
+            raise ConnectionError(f"Sikertelen lekérdezés: {url}")
+        if resp.status_code == 200:
+            yield from resp.json().get(key) or []
+        return
 
-    if not season_name_tm or not isinstance(season_name_tm, str):
-        logger.error(f"Érvénytelen bemenet a szezonnévhez: {season_name_tm}")
-        return None
+    for i in range(retries):
+        acquire(url)
+        try:
+            response = requests.get(url, headers=headers, stream=True)
+        except requests.RequestException as e:
+            logger.error(f"Kivétel történt: {e}")
+            time.sleep(backoff)
+            continue
+
+        with response:
+            if response.status_code == 200:
+                # Az első elem után már nem próbálkozunk újra, különben duplikálnánk
+                yield from iter_json_array(response.iter_content(chunk_size=CHUNK_SIZE), key)
+                return
+            if response.status_code == 404:
+                return
+            logger.warning(f"Hiba ({response.status_code}) a {url}-en. Újrapróbálkozás ({i+1}/{retries})...")
 
-    season_code = season_name_tm.strip()
-    
-    start_year = None
-    end_year = None
-    name = None
+        time.sleep(backoff)
 
-    try:
-        # Ellenőrizzük az "XX/YY" formátumot (pl. '22/23' vagy '98/99')
-        if re.match(r'^\d{2}/\d{2}$', season_code):
-            
-            start_two_digits = int(season_code.split('/')[0])
-            end_two_digits = int(season_code.split('/')[1])
-            
-            # Küszöbérték logika (50 felett 19xx, alatt 20xx)
-            THRESHOLD = 50 
-            
-            if start_two_digits >= THRESHOLD:
-                start_year = 1900 + start_two_digits
-                end_year = 1900 + end_two_digits
-            else:
-                start_year = 2000 + start_two_digits
-                end_year = 2000 + end_two_digits
-            
-            name = f"{start_year}/{end_year}"
+    raise ConnectionError(f"Sikertelen lekérdezés: {url}")
 
-        # Ha nem, akkor ellenőrizzük az "XXXX" formátumot (pl. '2022')
-        elif re.match(r'^\d{4}$', season_code):
-            start_year = int(season_code)
-            end_year = start_year + 1
-            name = f"{start_year}/{end_year}" 
-        
-        # Ha sikerült azonosítani, létrehozzuk/lekérjük a szezont
-        if start_year and end_year and name:
-            season = get_or_create_season(name, start_year, end_year)
-            return season
+def record_dead_letter(entity_type, entity_key, feed, error):
+    """
+    Sikertelen entitás rögzítése a dead-letter táblába, saját sessionnel,
+    hogy a hívó tranzakciójának rollbackje ne vigye el.
+    """
+    logger.error(f"Dead-letter: {entity_type} {entity_key} ({feed}): {error}")
+    dl_session = Session()
+    try:
+        now = datetime.now()
+        entry = dl_session.query(EtlDeadLetter).filter_by(
+            entity_type=entity_type, entity_key=str(entity_key), feed=feed, resolved_at=None
+        ).first()
+        if entry:
+            entry.attempts += 1
+            entry.error = str(error)
+            entry.last_failed_at = now
         else:
-            logger.warning(f"Szezonkód nem azonosítható: {season_code}")
-            return None
-
+            dl_session.add(EtlDeadLetter(
+                entity_type=entity_type, entity_key=str(entity_key), feed=feed, error=str(error),
+                attempts=1, first_failed_at=now, last_failed_at=now
+            ))
+        dl_session.commit()
     except Exception as e:
-        logger.error(f"Hiba a szezonkód feldolgozásánál ({season_code}): {e}")
-        return None
+        dl_session.rollback()
+        logger.error(f"Dead-letter mentési hiba: {e}")
+    finally:
+        dl_session.close()
+
+# Azonos TM URL-ek párhuzamos lekérése egyetlen kérésként fut
+tm_flight = SingleFlight()
+
+def tm_get(url):
+    """
+    TM API GET a single-flight rétegen keresztül: az egyszerre futó,
+    azonos URL-re szóló kérések egy választ osztanak meg.
+    """
+    return tm_flight.do(url, requests_get_retry, url)
+
+def log_tm_flight_stats():
+    stats = tm_flight.stats()
+    logger.info(f"TM kérések: {stats['calls']}, összevont (megspórolt) kérések: {stats['coalesced']}")
+    logger.info(f"Helyi névfeloldás: {resolver.hits} találat, {resolver.misses} TM keresés")
+    logger.info(f"TM payload snapshotok: {snapshots.unchanged} változatlan (kihagyva), {snapshots.changed} változott")
+
+# Csapat és bajnokság nevek helyi feloldása (DB + alias tábla), lustán töltődik
+resolver = EntityResolver()
+
+# Szezonok kezdő év és nyers kód szerint, lustán töltődik
+seasons = SeasonRegistry()
+
+# Lekért TM payloadok hash-e, változatlan payloadnál a feldolgozás kihagyható
+snapshots = SnapshotStore()
+
+def get_resolver():
+    if not resolver.loaded:
+        resolver.load(session)
+    return resolver
+
+# --- DB lekérdezések ---
+def get_season_registry():
+    if not seasons.loaded:
+        seasons.load(session)
+    return seasons
+
+def get_season_from_TMname(season_name_tm):
+    """
+    Szezon lekérése a neve alapján (pl. '22/23' vagy '2022'), ha nincs, létrehozza.
+    A regiszter a nyers kódra memoizál, ismételt kódnál nincs DB lekérdezés.
+    """
+    season = get_season_registry().get(session, season_name_tm)
+    if season is None:
+        logger.warning(f"Szezonkód nem azonosítható: {season_name_tm}")
+    return season
 
 def get_or_create_season(name, start_year, end_year):
     """
     Megkeresi a szezont a DB-ben, ha nincs készít.
     """
-    season = session.query(DimSeason).filter_by(name=name).first()
-    if not season:
-        season_name_TM = f"{str(start_year)[-2:]}/{str(end_year)[-2:]}"
-        season = DimSeason(name=name, season_name_TM=season_name_TM, start_year=start_year, end_year=end_year)
-        session.add(season)
-        session.commit()
-        logger.info(f"Szezon létrehozva: {name}")
-    return season
+    return get_season_registry().get_or_create(session, start_year)
 
 def get_or_create_competition(fd_code, name, emblem_url):
     """
     Megkeresi a bajnokságot a DB-ben, ha nincs készít.
+    Először helyben (név index) keres, TM keresés csak ha itt nincs találat.
     """
     comp = session.query(DimCompetition).filter_by(fd_id=fd_code).first()
     if not comp:
+        # Helyi feloldás: pl. a statisztikákból TM ID alapján már felvett bajnokság
+        local_id = get_resolver().resolve('competition', name)
+        if local_id is not None:
+            exists = session.get(DimCompetition, local_id)
+            if exists and exists.fd_id is None:
+                logger.info(f"Bajnokság helyben feloldva: {exists.name}, FD infókkal kiegésztjük.")
+                exists.fd_id = fd_code
+                exists.emblem_url = emblem_url
+                resolver.remember(session, 'competition', exists.competition_id, name, 'FD')
+                session.commit()
+                return exists
+
         logger.info(f"Új bajnokság létrehozása: {name}...")
         
         comp = DimCompetition(
@@ -130,6 +210,7 @@ def get_or_create_competition(fd_code, name, emblem_url):
                 logger.info(f"Ez a bajnokság már létezik a DB-ben: {exists.name}, FD infókkal kiegésztjük.")
                 exists.fd_id = comp.fd_id
                 exists.emblem_url = comp.emblem_url
+                resolver.remember(session, 'competition', exists.competition_id, name, 'FD')
                 session.commit()
                 return exists
             
@@ -139,6 +220,7 @@ def get_or_create_competition(fd_code, name, emblem_url):
 
         session.add(comp)
         session.commit()
+        resolver.add('competition', comp.competition_id, name)
         logger.info(f"Bajnokság elmentve: {name} (TM ID: {comp.tm_id})")
         
     return comp
@@ -158,71 +240,240 @@ def get_or_create_competition_by_tm_id(tm_id, name):
         )
 
         # TM API hívás a hiányzó adatok megszerzésére
-        tm_data = fetch_tm_competition_data(name)
+        tm_data = fetch_tm_competition_data(name, tm_id)
         if tm_data:
             comp.country = tm_data.get('country')
             comp.continent = tm_data.get('continent')
 
         session.add(comp)
         session.commit()
+        resolver.add('competition', comp.competition_id, name)
         logger.info(f"Bajnokság elmentve: {name} (TM ID: {comp.tm_id})")
         
     return comp
 
-def get_or_create_player(tm_id):
+def _main_nationality(nationalities):
+    """
+    A nemzetiséglista első elemét adja vissza (TM listaként adja).
+    """
+    if nationalities and isinstance(nationalities, list) and len(nationalities) > 0:
+        return nationalities[0]
+    return None
+
+def fetch_player_fields(tm_id, squad_entry=None, need_club=False):
+    """
+    A játékos mezői: elsődlegesen a keret lista (squad_entry) adatai, és csak a
+    ténylegesen hiányzó mezőkhöz hívja a játékosonkénti TM végpontokat.
+    need_club=True: a játékos csapatát is a TM adja (a 'club' kulcson, {'id', 'name'}).
+    Csak HTTP-t hív, DB-hez nem nyúl, ezért párhuzamos workerben is futtatható.
+    None: a játékos nem hozható létre.
+    """
+    entry = squad_entry or {}
+
+    name = entry.get('name')
+    position = entry.get('position')
+    nationality = _main_nationality(entry.get('nationality'))
+    age = entry.get('age')
+    shirt_number = entry.get('shirtNumber')
+    position_name = position
+    club = None
+
+    # Profil csak akkor kell, ha a keretből hiányzik a név / pozíció, vagy a csapatot is
+    # a TM adja. A mezszám a keretből jön; ha ott nincs, csak a már lekért profilból.
+    if not name or not position or need_club:
+        player_data = fetch_tm_player_profile(tm_id)
+        if not player_data and (not name or not position):
+            record_dead_letter('player', tm_id, 'player_create', "Nincs TM profil, a játékos nem hozható létre")
+            return None
+        player_data = player_data or {}
+        name = name or player_data.get('name')
+        position_name = (player_data.get('position') or {}).get('main') or position_name
+        shirt_number = shirt_number or player_data.get('shirtNumber')
+        if need_club and (player_data.get('club') or {}).get('id'):
+            club = player_data['club']
+
+    # Keresés csak akkor kell, ha még mindig hiányzik a nemzetiség/kor/pozíció
+    if nationality is None or age is None or not position:
+        player_search_data = fetch_tm_player_search(tm_id, name)
+        if player_search_data:
+            nationality = nationality or _main_nationality(player_search_data.get('nationalities'))
+            age = age if age is not None else player_search_data.get('age')
+            position = position or player_search_data.get('position')
+            if need_club and club is None and (player_search_data.get('club') or {}).get('id'):
+                club = player_search_data['club']
+        else:
+            logger.warning(f"Keresési adat nélkül mentjük a játékost: {name} (TM_ID: {tm_id})")
+
+    return {
+        'name': name,
+        'position': position,
+        'position_name': position_name or position,
+        'nationality': nationality,
+        'age': age,
+        'shirt_number': shirt_number,
+        'club': club,
+    }
+
+def player_from_fields(tm_id, fields, team_id=None):
+    """
+    Összerakja a DimPlayer objektumot (commit nélkül) a fetch_player_fields mezőiből.
+    team_id nélkül a TM klubot csapattá oldja fel (szükség esetén felveszi, DB).
+    """
+    fields = dict(fields)
+    club = fields.pop('club', None)
+    if team_id is None and club:
+        team_id = get_or_create_team_by_tm_id(club.get('id'), club.get('name'))
+
+    if team_id is None:
+        logger.warning(f"Játékos {fields['name']} mentése csapat-hivatkozás nélkül.")
+
+    return DimPlayer(tm_id=tm_id, current_team_id=team_id, **fields)
+
+def build_player(tm_id, squad_entry=None, team_id=None, current=True):
+    """
+    Összerakja a DimPlayer objektumot (commit nélkül).
+    current=False: a keret egy korábbi szezoné, a csapata nem az aktuális
+    csapat, ezért azt a TM profil adja (játékosonként egy hívás).
+    """
+    team_id = team_id if current else None
+    fields = fetch_player_fields(tm_id, squad_entry, need_club=team_id is None)
+    if fields is None:
+        return None
+    return player_from_fields(tm_id, fields, team_id)
+
+def get_or_create_player(tm_id, squad_entry=None, team_id=None):
     """
     Megkeresi a játékost a DB-ben, ha nincs készít.
+    Ha a keret lista bejegyzése (squad_entry) adott, abból dolgozik.
     """
     player = session.query(DimPlayer).filter_by(tm_id=tm_id).first()
 
     if not player:
-        logger.info(f"Új játékos feldolgozása: (ID: {tm_id})...")    
-    
-        # TM Adatok lekérése profil és keresés alapján
-        player_data = fetch_tm_player_profile(tm_id)
-        player_search_data = fetch_tm_player_search(tm_id, player_data['name'])
+        logger.info(f"Új játékos feldolgozása: (ID: {tm_id})...")
 
-        nationalities = player_search_data.get('nationalities')
-        if nationalities and isinstance(nationalities, list) and len(nationalities) > 0:
-            main_nationality = nationalities[0]
-        else:
-            main_nationality = None
-        
-        # Megkeressük a tm_ID-hoz tartozó DimTeam ID-t
-        team_id = None
-        tm_club_id = player_search_data.get('club').get('id')
-        if tm_club_id:
-            tm_club_name = player_search_data.get('club').get('name')
-            team_id = get_or_create_team_by_tm_id(tm_club_id, tm_club_name)
-            
-        player = DimPlayer(
-            name=player_data['name'],
-            tm_id=tm_id,
-            position=player_search_data.get('position'),  
-            position_name=player_data.get('position').get('main'),
-            nationality=main_nationality,
-            age=player_search_data.get('age'),    
-            shirt_number=player_data.get('shirtNumber'),
-            current_team_id=team_id,
-        )
+        player = build_player(tm_id, squad_entry, team_id)
+        if player is None:
+            return None
 
-        if team_id is None:
-            logger.warning(f"Játékos {player_data['name']} mentése csapat-hivatkozás nélkül.")
-        
         session.add(player)
+        session.flush()
+        open_versions(session, players=[player])
         session.commit()
         logger.info(f"Új játékos commitolva: (ID: {tm_id})...")  
     
     return player
 
+def is_current_squad(season_year):
+    """
+    Az aktuális szezon kerete-e (csak ekkor a keret csapata a játékos aktuális csapata).
+    """
+    return season_year == current_start_year()
+
+def existing_player_tm_ids(db_session, tm_ids):
+    """
+    A megadott TM ID-k közül a DB-ben már létező játékosoké (egy lekérdezés).
+    """
+    if not tm_ids:
+        return set()
+    return {row.tm_id for row in db_session.query(DimPlayer.tm_id).filter(DimPlayer.tm_id.in_(tm_ids))}
+
+def fetch_squad_player_fields(squad, need_club=False, db_session=None):
+    """
+    A keret játékosainak mezői [(tm_id, mezők), ...] formában (fetch_player_fields, csak HTTP).
+    db_session megadásakor a már létező játékosok kimaradnak; párhuzamos workerből
+    saját sessionnel hívandó.
+    """
+    entries = {int(entry['id']): entry for entry in squad if entry.get('id')}
+    existing = existing_player_tm_ids(db_session, list(entries)) if db_session is not None else set()
+    squad_fields = []
+    for tm_id, entry in entries.items():
+        if tm_id in existing:
+            continue
+        fields = fetch_player_fields(tm_id, entry, need_club)
+        if fields is not None:
+            squad_fields.append((tm_id, fields))
+    return squad_fields
+
+def save_squad_players(squad_fields, team_id, current=True):
+    """
+    A keret lekért új játékosainak mentése egy commitban (csak DB). A lekérés óta
+    (pl. egy másik keretből) felvett játékosok kimaradnak.
+    """
+    existing = existing_player_tm_ids(session, [tm_id for tm_id, _ in squad_fields])
+    new_players = []
+    for tm_id, fields in squad_fields:
+        if tm_id in existing:
+            continue
+        new_players.append(player_from_fields(tm_id, fields, team_id if current else None))
+        existing.add(tm_id)
+
+    session.add_all(new_players)
+    session.flush()
+    open_versions(session, players=new_players)
+    session.commit()
+    logger.info(f"{len(new_players)} új játékos commitolva a keretből (csapat ID: {team_id}).")
+    return len(new_players)
+
+def bulk_create_players_from_squad(squad, team_id, current=True):
+    """
+    Egy csapat teljes keretét egyszerre menti: egy lekérdezéssel szűri a
+    már létező játékosokat, az újakat a keret adataiból építi és egy
+    commitban szúrja be. current=False: korábbi szezon kerete (lásd build_player).
+    """
+    need_club = (team_id if current else None) is None
+    return save_squad_players(fetch_squad_player_fields(squad, need_club, session), team_id, current)
+
+def _merge_fd_team(existing_team, fd_team_data, competition_id):
+    """
+    Egy már létező (pl. TM-ből felvett) csapatot kiegészít az FD adatokkal.
+    """
+    existing_team.fd_id = fd_team_data['id']
+    existing_team.short_name = fd_team_data.get('shortName')
+    existing_team.tla = fd_team_data.get('tla')
+    existing_team.crest_url = fd_team_data.get('crest')
+    existing_team.competition_id = competition_id
+    resolver.remember(session, 'team', existing_team.team_id, fd_team_data['name'], 'FD')
+    session.commit()
+    return existing_team
+
+def _local_team_match(fd_team_data, competition_id):
+    """
+    A helyi névtalálat csak FD ID nélküli csapatra fogadható el, és csak ha a
+    bajnokság vagy az ország egyezik, vagy a csapatnak még TM ID-ja sincs.
+    Az azonos normalizált nevű, de más klub ('FC Barcelona' / 'Barcelona SC',
+    TM-ből felvett csapat) így nem kapja meg az FD ID-t: a pontozott TM keresés dönt.
+    """
+    area = (fd_team_data.get('area') or {}).get('name')
+
+    def accept(team_id):
+        team = session.get(DimTeam, team_id)
+        if team is None or team.fd_id is not None:
+            return False
+        if team.tm_id is None or (competition_id is not None and team.competition_id == competition_id):
+            return True
+        return bool(area) and team.competition is not None and team.competition.country == area
+
+    return accept
+
 def get_or_create_team(fd_team_data, competition_id):
     """
     Ellenőrzi, hogy a csapat létezik-e. Ha nem, létrehozza FD + TM adatokból.
+    Először helyben (név index) keres, TM keresés csak ha itt nincs találat.
     """
     fd_id = fd_team_data['id']
     team = session.query(DimTeam).filter_by(fd_id=fd_id).first()
     
     if not team:
+        # Helyi feloldás: pl. átigazolásokból TM ID alapján már felvett csapat
+        local_id = get_resolver().resolve(
+            'team', fd_team_data['name'], fd_team_data.get('shortName'),
+            accept=_local_team_match(fd_team_data, competition_id)
+        )
+        if local_id is not None:
+            existing_team = session.get(DimTeam, local_id)
+            logger.info(f"Csapat helyben feloldva: {fd_team_data['name']} -> {existing_team.name}")
+            return _merge_fd_team(existing_team, fd_team_data, competition_id)
+
         logger.info(f"Új csapat feldolgozása: {fd_team_data['name']}...")
         
         # TM Adatok lekérése
@@ -243,14 +494,7 @@ def get_or_create_team(fd_team_data, competition_id):
             existing_team = session.query(DimTeam).filter_by(tm_id=team.tm_id).first()
             if existing_team:
                 logger.info(f"Ez a csapat már létezik a DB-ben: {existing_team.name}, FD infókkal kiegésztjük.")
-                existing_team.fd_id = team.fd_id
-                existing_team.short_name = team.short_name
-                existing_team.tla = team.tla
-                existing_team.crest_url = team.crest_url
-                existing_team.competition_id = team.competition_id
-                session.commit()
-
-                return existing_team
+                return _merge_fd_team(existing_team, fd_team_data, competition_id)
 
             # TM Csapat profil lekérése a hiányzó adatokért
             club_data = fetch_tm_club_profile(team.tm_id)
@@ -261,7 +505,10 @@ def get_or_create_team(fd_team_data, competition_id):
                 team.currentMarketValue = club_data.get('currentMarketValue')
             
         session.add(team)
+        session.flush()
+        open_versions(session, teams=[team])
         session.commit()
+        resolver.add('team', team.team_id, team.name, team.short_name)
         logger.info(f"Új csapat commitolva: {fd_team_data['name']}...")
     
     return team
@@ -298,8 +545,11 @@ def get_or_create_team_by_tm_id(tm_id, club_name):
 
         try:
             session.add(new_tm_team)
+            session.flush()
+            open_versions(session, teams=[new_tm_team])
             session.commit() # Commit, hogy kapjon ID-t
             team_id = new_tm_team.team_id
+            resolver.add('team', team_id, new_tm_team.name)
             logger.info(f"Új csapat felvéve (ID: {team_id}) a játékoshoz.")
         except Exception as e:
             session.rollback()
@@ -308,20 +558,26 @@ def get_or_create_team_by_tm_id(tm_id, club_name):
     return team_id
 
 # --- TM API HÍVÁSOK ---
-def fetch_tm_competition_data(comp_name):
+def fetch_tm_competition_data(comp_name, tm_id=None):
     """
     Megkeresi a bajnokságot a Transfermarkt API-n név alapján.
+    Ha a TM ID ismert, azt a találatot választjuk, különben a leghasonlóbb nevűt.
     """
     try:
         url = f"{TM_API_URL}/competitions/search/{comp_name}"
-        resp = requests_get_retry(url)
+        resp = tm_get(url)
         
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('results'):
-                result = data['results'][0] # Az első találatot elfogadjuk
-                logger.info(f"TM Bajnokság találat: {result.get('name')} (ID: {result.get('id')})")
-                return result
+        if resp is not None and resp.status_code == 200:
+            results = resp.json().get('results')
+            if results:
+                result = next((r for r in results if tm_id and r.get('id') == tm_id), None)
+                score = 1.0
+                if result is None:
+                    result, score = best_match([comp_name], results)
+                if result and score >= MATCH_THRESHOLD:
+                    logger.info(f"TM Bajnokság találat: {result.get('name')} (ID: {result.get('id')}, pont: {score:.2f})")
+                    return result
+                logger.warning(f"TM API: Nincs elég hasonló bajnokság találat: {comp_name}")
             else:
                 logger.warning(f"TM API: Nem található bajnokság ezzel a névvel: {comp_name}")
     except Exception as e:
@@ -335,12 +591,13 @@ def fetch_tm_player_search(tm_id, player_name):
     """
     try:
         url = f"{TM_API_URL}/players/search/{player_name}"
-        resp = requests_get_retry(url)
-        if resp.status_code == 200:
+        resp = tm_get(url)
+        if resp is not None and resp.status_code == 200:
             data = resp.json()
             if data.get('results'):
                 for result in data['results']:
-                    if result.get('id') == tm_id:
+                    # A TM string ID-t ad, a hívók int-et is átadhatnak
+                    if str(result.get('id')) == str(tm_id):
                         logger.info(f"TM Játékos találat: {result.get('name')} (ID: {result.get('id')})")
                         return result
                 logger.warning(f"TM API: Kereséssel talált játékos ID-ja nem egyezik: {player_name} (ID: {tm_id})")
@@ -355,8 +612,8 @@ def fetch_tm_player_profile(tm_id):
     """
     try:
         url = f"{TM_API_URL}/players/{tm_id}/profile"
-        resp = requests_get_retry(url)
-        if resp.status_code == 200:
+        resp = tm_get(url)
+        if resp is not None and resp.status_code == 200:
             data = resp.json()
             return data
             
@@ -373,7 +630,10 @@ def fetch_tm_club_profile(tm_id):
     """
     try:
         url = f"{TM_API_URL}/clubs/{tm_id}/profile"
-        resp = requests_get_retry(url)
+        resp = tm_get(url)
+        if resp is None:
+            record_dead_letter('team', tm_id, 'club_profile', f"Sikertelen lekérdezés: {url}")
+            return None
         if resp.status_code == 200:
             data = resp.json()
             return data
@@ -391,8 +651,8 @@ def fetch_tm_players_from_team(tm_team_id, season_year):
     """
     try:
         url = f"{TM_API_URL}/clubs/{tm_team_id}/players?season_id={season_year}"
-        resp = requests_get_retry(url)
-        if resp.status_code == 200:
+        resp = tm_get(url)
+        if resp is not None and resp.status_code == 200:
             data = resp.json()
             return data.get('players', [])
         logger.warning(f"TM API: Nem található csapat keret ezzel az ID-val: {tm_team_id}")
@@ -403,28 +663,21 @@ def fetch_tm_players_from_team(tm_team_id, season_year):
 def fetch_tm_team_data_search(team_name, short_name):
     """
     Megkeresi a csapatot a Transfermarkt API-n név alapján.
+    A találatokat pontozzuk a nevekhez, nem az elsőt fogadjuk el.
     """
     try:
-        url = f"{TM_API_URL}/clubs/search/{short_name}"
-        resp = requests_get_retry(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('results'):
-                result = data['results'][0]  # Az első találatot elfogadjuk
-                logger.info(f"TM Csapat találat: {result.get('name')} (ID: {result.get('id')})")
-                return result 
-            # Ha nincs talált próbáljuk meg teljes név alapján    
-            else:
-                url = f"{TM_API_URL}/clubs/search/{team_name}"
-                resp = requests_get_retry(url)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get('results'):
-                        result = data['results'][0]  # Az első találatot elfogadjuk
-                        logger.info(f"TM Csapat találat teljes név alapján: {result.get('name')} (ID: {result.get('id')})")
-                        return result 
-                    else:
-                        logger.warning(f"TM API: Nem található csapat ezzel a névvel: {team_name}")
+        names = [team_name, short_name]
+        # Először rövid név, ha nincs elég jó találat, teljes név alapján
+        for query in dict.fromkeys(n for n in (short_name, team_name) if n):
+            url = f"{TM_API_URL}/clubs/search/{query}"
+            resp = tm_get(url)
+            if resp is None or resp.status_code != 200:
+                continue
+            result, score = best_match(names, resp.json().get('results'))
+            if result and score >= MATCH_THRESHOLD:
+                logger.info(f"TM Csapat találat: {result.get('name')} (ID: {result.get('id')}, pont: {score:.2f})")
+                return result
+        logger.warning(f"TM API: Nem található csapat ezzel a névvel: {team_name}")
     except Exception as e:
         logger.error(f"TM API Team Search Error ({team_name}): {e}")
     return None
@@ -433,7 +686,10 @@ def fetch_tm_market_value(tm_id):
     """Piaci érték történet lekérése."""
     try:
         url = f"{TM_API_URL}/players/{tm_id}/market_value"
-        resp = requests_get_retry(url)
+        resp = tm_get(url)
+        if resp is None:
+            record_dead_letter('player', tm_id, 'market_value', f"Sikertelen lekérdezés: {url}")
+            return None
         if resp and resp.status_code == 200:
             return resp.json()
     except Exception as e:
@@ -444,18 +700,47 @@ def fetch_tm_transfers(tm_id):
     """Átigazolások lekérése."""
     try:
         url = f"{TM_API_URL}/players/{tm_id}/transfers"
-        resp = requests_get_retry(url)
+        resp = tm_get(url)
+        if resp is None:
+            record_dead_letter('player', tm_id, 'transfers', f"Sikertelen lekérdezés: {url}")
+            return None
         if resp and resp.status_code == 200:
             return resp.json()
     except Exception as e:
         logger.error(f"TM API Transfers Error (TM_ID: {tm_id}): {e}")
     return None
 
+def iter_tm_player_feed(tm_id, feed, key):
+    """
+    Játékos TM feed (market_value, transfers, stats) bejegyzései egyenként.
+    Sikertelen lekérésnél (HTTP hiba, elfogyott keret) kivételt dob: a hívó rögzíti
+    a dead-lettert, és a feedet nem jelöli frissnek. STREAM_JSON esetén az azonos
+    feedre egyszerre érkező kérések nem vonódnak össze (tm_get csak a nem streamelt ágon).
+    """
+    url = f"{TM_API_URL}/players/{tm_id}/{feed}"
+    try:
+        if STREAM_JSON:
+            # Streamelve nincs single-flight: a (veterán játékosoknál nagy) feedet nem
+            # gyűjtjük memóriába csak azért, hogy egy párhuzamos hívóval megosszuk
+            yield from iter_json_items(url, key)
+        else:
+            resp = tm_get(url)
+            if resp is None:
+                raise ConnectionError(f"Sikertelen lekérdezés: {url}")
+            if resp.status_code == 200:
+                yield from resp.json().get(key) or []
+    except Exception as e:
+        logger.error(f"TM API {feed} Stream Error (TM_ID: {tm_id}): {e}")
+        raise
+
 def fetch_tm_stats(tm_id):
     """Statisztikák lekérése."""
     try:
         url = f"{TM_API_URL}/players/{tm_id}/stats"
-        resp = requests_get_retry(url)
+        resp = tm_get(url)
+        if resp is None:
+            record_dead_letter('player', tm_id, 'stats', f"Sikertelen lekérdezés: {url}")
+            return None
         if resp and resp.status_code == 200:
             return resp.json()
     except Exception as e:
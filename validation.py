@@ -0,0 +1,360 @@
+import time
+import argparse
+import logging
+import operator
+import threading
+from itertools import compress, repeat
+from datetime import date, datetime, timedelta
+from typing import Callable, NamedTuple
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from config import get_db_engine
+from models import Base, EtlQuarantine, EtlQualityMetric
+from change_feed import current_run
+
+logger = logging.getLogger(__name__)
+
+# --- ADATMINŐSÉG VALIDÁLÁS (fetch és load között) ---
+# A normalizált sorokat (rows.py) betöltés előtt céltáblánként ellenőrizzük.
+# A batch-et egyszer oszlopokra bontjuk, és minden szabály egy teljes oszlopot
+# (vagy oszlop párt) vizsgál: először C szintű oszlop műveletekkel (None in,
+# map(type), min/max, halmaz tartalmazás); hibás oszlopnál a (kevés) eltérő hibás
+# értékből képzi a hibás indexeket. A hibás sorok nem töltődnek be: az etl_quarantine
+# táblába kerülnek a szabályok neveivel, a futásonkénti számokat az
+# etl_quality_metrics őrzi.
+
+INT_MAX = 2 ** 31 - 1 # Integer oszlop felső korlátja (a túlcsorduló sor az egész batch-et buktatná)
+EARLIEST_DATE = date(1900, 1, 1)
+
+MATCH_STATUSES = {
+    'SCHEDULED', 'TIMED', 'IN_PLAY', 'PAUSED', 'FINISHED',
+    'POSTPONED', 'SUSPENDED', 'CANCELLED', 'AWARDED',
+}
+
+class Rule(NamedTuple):
+    name: str
+    columns: tuple
+    check: Callable # check(*oszlopok) -> a hibás sorok indexei
+
+class RuleSet(NamedTuple):
+    key: str # a karantén entity_key oszlopa
+    rules: list
+
+class Rejected(NamedTuple):
+    table_name: str
+    entity_key: object
+    row: tuple
+    reasons: tuple
+
+# --- SZABÁLYOK ---
+
+def _indices(values, bad_values):
+    """
+    Azon sorok indexei, amelyek értéke a bad_values halmazban van.
+    """
+    return list(compress(range(len(values)), map(bad_values.__contains__, values)))
+
+def _present(values):
+    """
+    (nem None értékek, típusaik halmaza) egy map(type) menettel; None nélkül nincs másolás.
+    """
+    types = set(map(type, values))
+    if type(None) not in types:
+        return values, types
+    types.discard(type(None))
+    return list(compress(values, map(operator.is_not, values, repeat(None)))), types
+
+def not_null(column):
+    def check(values):
+        if None not in values:
+            return []
+        return list(compress(range(len(values)), map(operator.is_, values, repeat(None))))
+    return Rule(f"{column}_not_null", (column,), check)
+
+def int_between(column, low, high):
+    """
+    Egész szám low..high között. A string ('1.5m') és a bool is hibás; None megengedett.
+    """
+    def check(values):
+        present, types = _present(values)
+        if not present or (types == {int} and low <= min(present) and max(present) <= high):
+            return []
+        bad_values, ints = set(), present
+        if types != {int}:
+            is_int = list(map(operator.is_, map(type, present), repeat(int)))
+            bad_values.update(compress(present, map(operator.not_, is_int)))
+            ints = list(compress(present, is_int))
+        if ints and (min(ints) < low or max(ints) > high):
+            bad_values.update(value for value in set(ints) if not low <= value <= high)
+        return _indices(values, bad_values)
+    return Rule(f"{column}_range", (column,), check)
+
+def date_between(column, low=EARLIEST_DATE, future_days=1):
+    """
+    Dátum (vagy időbélyeg) low és a mai nap + future_days között; None megengedett.
+    """
+    def check(values):
+        high = date.today() + timedelta(days=future_days)
+        present, types = _present(values)
+        if not present:
+            return []
+        if types == {date} and low <= min(present) and max(present) <= high:
+            return []
+        if types == {datetime} and low <= min(present).date() and max(present).date() <= high:
+            return []
+        return _indices(values, {
+            value for value in set(present)
+            if not isinstance(value, date) or not low <= (value.date() if isinstance(value, datetime) else value) <= high
+        })
+    return Rule(f"{column}_range", (column,), check)
+
+def one_of(column, allowed):
+    def check(values):
+        bad_values = set(values) - allowed
+        if not bad_values:
+            return []
+        return _indices(values, bad_values)
+    return Rule(f"{column}_allowed", (column,), check)
+
+def different(column_a, column_b):
+    def check(values_a, values_b):
+        if not any(map(operator.eq, values_a, values_b)):
+            return []
+        return [i for i, (a, b) in enumerate(zip(values_a, values_b)) if a is not None and a == b]
+    return Rule(f"{column_a}_ne_{column_b}", (column_a, column_b), check)
+
+def finished_has_score():
+    def check(statuses, home_scores, away_scores):
+        if None not in home_scores and None not in away_scores:
+            return []
+        return [
+            i for i, (status, home, away) in enumerate(zip(statuses, home_scores, away_scores))
+            if status == 'FINISHED' and (home is None or away is None)
+        ]
+    return Rule('finished_score_not_null', ('status', 'home_score', 'away_score'), check)
+
+# Céltáblánként; a korlátok bőven a valós TM / FD értékek felett vannak
+RULES = {
+    'fact_market_values': RuleSet('player_id', [
+        not_null('player_id'), not_null('date_recorded'),
+        date_between('date_recorded'),
+        int_between('market_value_eur', 0, INT_MAX),
+    ]),
+    'fact_transfers': RuleSet('player_id', [
+        not_null('player_id'), not_null('date_recorded'), not_null('season_id'),
+        date_between('date_recorded'),
+        int_between('market_value_eur', 0, INT_MAX),
+        int_between('fee_eur', 0, INT_MAX),
+    ]),
+    'fact_player_season_stats': RuleSet('player_id', [
+        not_null('player_id'), not_null('season_id'), not_null('competition_id'),
+        int_between('appearances', 0, 120),
+        int_between('goals', 0, 150),
+        int_between('assists', 0, 150),
+        int_between('yellow_cards', 0, 60),
+        int_between('red_cards', 0, 20),
+        int_between('minutes_played', 0, 12000),
+    ]),
+    'fact_matches': RuleSet('fd_match_id', [
+        not_null('fd_match_id'), not_null('date'), not_null('season_id'), not_null('competition_id'),
+        not_null('home_team_id'), not_null('away_team_id'),
+        one_of('status', MATCH_STATUSES),
+        finished_has_score(),
+        int_between('home_score', 0, 50),
+        int_between('away_score', 0, 50),
+        different('home_team_id', 'away_team_id'),
+        date_between('date', future_days=400),
+    ]),
+    # Hideg betöltés: a staging sorok (cold_load.py) természetes kulcsokkal, COPY előtt.
+    # Az ID oszlopok is ellenőrzöttek: egy nem szám érték a teljes COPY-t buktatná.
+    'stg_market_values': RuleSet('player_tm_id', [
+        not_null('player_tm_id'), not_null('date_recorded'),
+        date_between('date_recorded'),
+        int_between('club_tm_id', 0, INT_MAX),
+        int_between('market_value_eur', 0, INT_MAX),
+    ]),
+    'stg_transfers': RuleSet('player_tm_id', [
+        not_null('player_tm_id'), not_null('date_recorded'), not_null('season_tm'),
+        date_between('date_recorded'),
+        int_between('from_tm_id', 0, INT_MAX),
+        int_between('to_tm_id', 0, INT_MAX),
+        int_between('market_value_eur', 0, INT_MAX),
+        int_between('fee_eur', 0, INT_MAX),
+    ]),
+    'stg_player_season_stats': RuleSet('player_tm_id', [
+        not_null('player_tm_id'), not_null('season_tm'), not_null('competition_tm_id'),
+        int_between('club_tm_id', 0, INT_MAX),
+        int_between('appearances', 0, 120),
+        int_between('goals', 0, 150),
+        int_between('assists', 0, 150),
+        int_between('yellow_cards', 0, 60),
+        int_between('red_cards', 0, 20),
+        int_between('minutes_played', 0, 12000),
+    ]),
+    'stg_players': RuleSet('tm_id', [
+        not_null('tm_id'), not_null('name'),
+        int_between('age', 0, 80),
+    ]),
+    'stg_matches': RuleSet('fd_match_id', [
+        not_null('fd_match_id'), not_null('date'), not_null('home_fd_id'), not_null('away_fd_id'),
+        one_of('status', MATCH_STATUSES),
+        finished_has_score(),
+        int_between('home_score', 0, 50),
+        int_between('away_score', 0, 50),
+        different('home_fd_id', 'away_fd_id'),
+    ]),
+}
+
+# --- METRIKÁK ---
+
+class QualityMetrics:
+    """
+    A folyamat validálási számai céltáblánként; a futás lezárásakor (finish_run)
+    az etl_quality_metrics táblába íródnak és nullázódnak.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    def record(self, table, checked, quarantined, failures, seconds):
+        with self.lock:
+            stats = self.tables.setdefault(table, {'checked': 0, 'quarantined': 0, 'failures': {}, 'seconds': 0.0})
+            stats['checked'] += checked
+            stats['quarantined'] += quarantined
+            stats['seconds'] += seconds
+            for rule, count in failures.items():
+                stats['failures'][rule] = stats['failures'].get(rule, 0) + count
+
+    def reset(self):
+        with self.lock:
+            tables, self.tables = self.tables, {}
+        return tables
+
+    def flush(self, session, run_id):
+        """
+        A futás metrikáinak mentése (commit nélkül), táblánként egy naplósor.
+        """
+        tables = self.reset()
+        for table, stats in sorted(tables.items()):
+            failures = ', '.join(f"{rule}: {count}" for rule, count in sorted(stats['failures'].items()))
+            logger.info(
+                f"Adatminőség - {table}: {stats['checked']} sor, {stats['quarantined']} karanténban"
+                f"{f' ({failures})' if failures else ''}, validálás: {stats['seconds']:.3f} s"
+            )
+            stmt = pg_insert(EtlQualityMetric).values(
+                run_id=run_id, table_name=table, rows_checked=stats['checked'],
+                rows_quarantined=stats['quarantined'], failures=stats['failures'], check_seconds=stats['seconds']
+            )
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['run_id', 'table_name'],
+                set_={
+                    'rows_checked': stmt.excluded.rows_checked,
+                    'rows_quarantined': stmt.excluded.rows_quarantined,
+                    'failures': stmt.excluded.failures,
+                    'check_seconds': stmt.excluded.check_seconds,
+                }
+            ))
+        return tables
+
+quality = QualityMetrics()
+
+# --- VALIDÁLÁS ÉS KARANTÉN ---
+
+def validate_rows(model, rows):
+    """
+    Egy batch azonos típusú sor (rows.py) ellenőrzése a céltábla szabályaival (DB nélkül,
+    pipeline szakaszként is futtatható). Visszaad: (jó sorok, [Rejected, ...]).
+    """
+    return validate_table_rows(model.__tablename__, rows)
+
+def validate_table_rows(table, rows):
+    """
+    validate_rows tábla név alapján (a staging táblákhoz nincs ORM modell).
+    """
+    rows = list(rows)
+    rule_set = RULES.get(table)
+    if not rows or rule_set is None:
+        return rows, []
+
+    t0 = time.perf_counter()
+    # Csak a szabályok által használt oszlopok, oszloponként egy C szintű map
+    fields = rows[0]._fields
+    columns = {}
+    for rule in rule_set.rules:
+        for column in rule.columns:
+            if column not in columns:
+                columns[column] = list(map(operator.itemgetter(fields.index(column)), rows))
+    reasons = {}
+    failures = {}
+    for rule in rule_set.rules:
+        failed = rule.check(*(columns[column] for column in rule.columns))
+        if failed:
+            failures[rule.name] = len(failed)
+            for i in failed:
+                reasons.setdefault(i, []).append(rule.name)
+
+    if reasons:
+        valid = list(compress(rows, map(operator.not_, map(reasons.__contains__, range(len(rows))))))
+        rejected = [
+            Rejected(table, getattr(rows[i], rule_set.key), rows[i], tuple(names))
+            for i, names in sorted(reasons.items())
+        ]
+    else:
+        valid, rejected = rows, []
+    quality.record(table, len(rows), len(rejected), failures, time.perf_counter() - t0)
+    return valid, rejected
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def quarantine(session, rejected):
+    """
+    A hibás sorok mentése a karantén táblába (commit nélkül, a betöltéssel egy tranzakcióban).
+    """
+    if not rejected:
+        return 0
+    now = datetime.now()
+    run_id = current_run()
+    for entry in rejected:
+        logger.warning(f"Karantén - {entry.table_name} {entry.entity_key}: {', '.join(entry.reasons)}")
+    session.bulk_insert_mappings(EtlQuarantine, [
+        {
+            'run_id': run_id, 'table_name': entry.table_name, 'entity_key': str(entry.entity_key),
+            'reasons': ','.join(entry.reasons), 'quarantined_at': now,
+            'payload': {field: _json_value(value) for field, value in entry.row._asdict().items()},
+        }
+        for entry in rejected
+    ])
+    return len(rejected)
+
+def validate_batch(session, model, rows):
+    """
+    Validálás és a hibás sorok karanténba helyezése; a betölthető sorokat adja vissza.
+    """
+    valid, rejected = validate_rows(model, rows)
+    quarantine(session, rejected)
+    return valid
+
+def ensure_quality_tables(engine):
+    """
+    Meglévő adatbázison létrehozza a karantén és metrika táblákat.
+    """
+    Base.metadata.create_all(engine, tables=[EtlQuarantine.__table__, EtlQualityMetric.__table__])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adatminőség: egy futás validálási metrikái és karanténba került sorai.")
+    parser.add_argument('-r', '--run', type=int, required=True, help="Az ETL futás azonosítója (run_id).")
+    parser.add_argument('-n', '--limit', type=int, default=20, help="Ennyi karantén sor kiírása.")
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    ensure_quality_tables(engine)
+    with Session(engine) as session:
+        metrics = session.query(EtlQualityMetric).filter_by(run_id=args.run).order_by(EtlQualityMetric.table_name)
+        for metric in metrics:
+            print(f"{metric.table_name:<28} {metric.rows_checked:>8} sor  {metric.rows_quarantined:>6} karanténban  "
+                  f"{metric.check_seconds:.3f} s  {metric.failures}")
+        entries = session.query(EtlQuarantine).filter_by(run_id=args.run).order_by(EtlQuarantine.quarantine_id).limit(args.limit)
+        for entry in entries:
+            print(f"  {entry.table_name} {entry.entity_key}: {entry.reasons} {entry.payload}")